@@ -0,0 +1,160 @@
+"""
+ANN Recall Benchmark
+Builds Chroma HNSW collections over synthetic clustered embeddings at several corpus
+sizes and grid points of M and ef_construction, then sweeps the per-query ef the service
+uses (RETRIEVAL_QUERY_EF / the ef field of /context). Each row reports recall@k against an
+exact NumPy search, p50/p99 query latency and build time, next to the exact search's own
+latency. Vectors are unit length like the service's embeddings, so every space ranks alike.
+
+Usage (from langgraph-service/):
+    python -m benchmarks.ann_recall                                   # default grid
+    python -m benchmarks.ann_recall --sizes 10000,100000 --m 16,32 --ef 20,50,100,200
+    python -m benchmarks.ann_recall --space cosine --output ann_recall.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from typing import List, Dict, Any
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCHMARK_DIR)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def synthetic_corpus(size: int, queries: int, dim: int, clusters: int, spread: float, seed: int):
+    """Unit vectors around random cluster centres; queries come from the same clusters"""
+    generator = np.random.default_rng(seed)
+    centres = generator.standard_normal((clusters, dim)).astype(np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        points = centres[generator.integers(0, clusters, count)]
+        points = points + spread * generator.standard_normal((count, dim)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(size), sample(queries)
+
+
+def build_collection(client, vectors: np.ndarray, metadata: Dict[str, Any]):
+    collection = client.create_collection(f"ann_bench_{uuid.uuid4().hex[:12]}", metadata=metadata)
+    batch = getattr(client, 'get_max_batch_size', lambda: getattr(client, 'max_batch_size', 5000))()
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch):
+        chunk = vectors[offset:offset + batch]
+        collection.add(ids=[str(offset + i) for i in range(len(chunk))], embeddings=chunk.tolist())
+    return collection, time.perf_counter() - start
+
+
+def measure(collection, queries: np.ndarray, truth: np.ndarray, k: int, ef: int) -> Dict[str, Any]:
+    """Recall@k and latency with the service's per-query ef (fetch max(k, ef), keep k)"""
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=max(k, ef), include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(int(i) for i in result['ids'][0][:k]) & set(expected.tolist()))
+    return {
+        'recall_at_k': round(hits / truth.size, 4),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3)
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    import chromadb
+    from src.services.ann_index import hnsw_metadata, exact_top_k
+
+    client = chromadb.EphemeralClient()
+    report: Dict[str, Any] = {
+        'space': args.space, 'dim': args.dim, 'k': args.k, 'queries': args.queries,
+        'clusters': args.clusters, 'search_ef_floor': args.search_ef, 'sizes': []
+    }
+    for size in args.sizes:
+        corpus, queries = synthetic_corpus(size, args.queries, args.dim, args.clusters, args.spread, args.seed)
+        exact_latencies = []
+        truth = np.empty((len(queries), args.k), dtype=np.int64)
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            truth[i] = exact_top_k(query[None, :], corpus, args.k, args.space)[0][0]
+            exact_latencies.append((time.perf_counter() - start) * 1000)
+        entry: Dict[str, Any] = {
+            'size': size,
+            'exact': {'p50_ms': round(percentile(exact_latencies, 50), 3),
+                      'p99_ms': round(percentile(exact_latencies, 99), 3)},
+            'rows': []
+        }
+        print(f"\n{size} vectors (exact search p99 {entry['exact']['p99_ms']:.2f} ms)")
+        print(f"{'M':>4} {'ef_con':>7} {'ef':>5} {'build_s':>8} {'recall':>7} {'p50_ms':>8} {'p99_ms':>8}")
+        for m in args.m:
+            for construction_ef in args.construction_ef:
+                collection, build_seconds = build_collection(
+                    client, corpus, hnsw_metadata(args.space, m, construction_ef, args.search_ef)
+                )
+                for ef in args.ef:
+                    row = {'m': m, 'construction_ef': construction_ef, 'ef': max(ef, args.search_ef),
+                           'build_seconds': round(build_seconds, 2), **measure(collection, queries, truth, args.k, ef)}
+                    entry['rows'].append(row)
+                    print(f"{m:>4} {construction_ef:>7} {row['ef']:>5} {row['build_seconds']:>8.2f} "
+                          f"{row['recall_at_k']:>7.3f} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f}")
+                client.delete_collection(collection.name)
+
+        # Fastest setting that reaches the target recall
+        passing = [row for row in entry['rows'] if row['recall_at_k'] >= args.target_recall]
+        entry['recommended'] = min(passing, key=lambda row: row['p99_ms']) if passing else None
+        if entry['recommended']:
+            best = entry['recommended']
+            print(f"recall >= {args.target_recall}: M={best['m']} ef_construction={best['construction_ef']} "
+                  f"ef={best['ef']} (p99 {best['p99_ms']:.2f} ms)")
+        else:
+            print(f"no setting reached recall {args.target_recall}")
+        report['sizes'].append(entry)
+    return report
+
+
+def parse_args(argv=None):
+    sys.path.insert(0, SERVICE_DIR)
+    from config import CHROMA_DISTANCE_SPACE
+
+    parser = argparse.ArgumentParser(description="HNSW recall/latency benchmark against exact search")
+    parser.add_argument("--sizes", type=int_list, default=[10000, 50000], help="Corpus sizes, comma-separated")
+    parser.add_argument("--m", type=int_list, default=[8, 16, 32], help="HNSW M values")
+    parser.add_argument("--construction-ef", type=int_list, default=[100], help="HNSW ef_construction values")
+    parser.add_argument("--ef", type=int_list, default=[10, 20, 50, 100, 200], help="Per-query ef values")
+    parser.add_argument("--search-ef", type=int, default=10,
+                        help="Collection search ef; per-query ef below it has no effect")
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"], default=CHROMA_DISTANCE_SPACE)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 produces 384 dimensions")
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--spread", type=float, default=0.35, help="Noise around cluster centres")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the full report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
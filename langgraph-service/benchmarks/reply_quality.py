@@ -0,0 +1,304 @@
+"""
+Reply Quality Benchmark
+Replays a fixed corpus of anonymized emails through the LangGraph workflow with a
+stand-in LLM, records quality/cost/latency/privacy metrics and compares them to a
+stored baseline. Exits 1 when a metric regresses past its tolerance and 2 when there
+is no baseline to compare against (pass --update-baseline to create it).
+
+Usage (from langgraph-service/):
+    python -m benchmarks.reply_quality                       # compare against baseline
+    python -m benchmarks.reply_quality --update-baseline     # accept current results
+    python -m benchmarks.reply_quality --llm record          # record real LLM responses
+    python -m benchmarks.reply_quality --llm replay          # replay recorded responses
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_CORPUS = os.path.join(BENCHMARK_DIR, "corpus", "reply_quality_corpus.jsonl")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baselines", "reply_quality_baseline.json")
+DEFAULT_RECORDING = os.path.join(BENCHMARK_DIR, "recordings", "reply_quality_llm.jsonl")
+DEFAULT_KNOWLEDGE_BASE = os.path.join(os.path.dirname(SERVICE_DIR), "NEXUS_Company_Knowledge_Base.txt")
+
+# Regression tolerances: (summary metric, direction, allowed change)
+# 'higher' metrics regress when they drop, 'lower' metrics when they rise.
+# Relative tolerances are fractions of the baseline value, absolute ones are raw deltas.
+REGRESSION_RULES = [
+    ("mean_critique_score", "higher", "absolute", 0.05),
+    ("mean_keyword_recall", "higher", "absolute", 0.05),
+    ("mean_identifier_recall", "higher", "absolute", 0),
+    ("privacy_violations", "lower", "absolute", 0),
+    ("fallback_replies", "lower", "absolute", 0),
+    ("mean_iterations", "lower", "absolute", 0.25),
+    ("total_tokens", "lower", "relative", 0.10),
+]
+LATENCY_RULE = ("p95_total_latency_ms", "lower", "relative", 0.50)
+
+PLACEHOLDER_PATTERN = re.compile(r"\[(?:NAME|EMAIL|PHONE|ORDER_ID|SERIAL_NUMBER|BILL_NUMBER|ID)\]")
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class NodeTimer:
+    """node_hook for create_email_workflow: wall time per node plus the active node name"""
+
+    def __init__(self, current_node):
+        self.current_node = current_node
+        self.timings: Dict[str, List[float]] = {}
+
+    @contextlib.contextmanager
+    def hook(self, name: str):
+        token = self.current_node.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+            self.current_node.reset(token)
+
+    def reset(self) -> None:
+        self.timings = {}
+
+
+def privacy_violations(case: Dict[str, Any], reply: str, corpus: List[Dict[str, Any]]) -> List[str]:
+    """Other customers' PII or redaction placeholders that made it into the reply"""
+    violations = []
+    reply_lower = reply.lower()
+    for other in corpus:
+        if other["sender_info"] == case["sender_info"]:
+            continue
+        for value in other.get("pii", []):
+            if value.lower() in reply_lower:
+                violations.append(f"leaked {other['id']} PII: {value}")
+        if other["sender_info"].lower() in reply_lower:
+            violations.append(f"leaked {other['id']} address")
+    violations.extend(f"placeholder in reply: {token}" for token in sorted(set(PLACEHOLDER_PATTERN.findall(reply))))
+    return violations
+
+
+def keyword_recall(case: Dict[str, Any], reply: str) -> float:
+    expected = case.get("expected_keywords", [])
+    if not expected:
+        return 1.0
+    reply_lower = reply.lower()
+    return sum(keyword.lower() in reply_lower for keyword in expected) / len(expected)
+
+
+def identifier_recall(main, case: Dict[str, Any]) -> float:
+    """Share of the identifiers in a case's history that its sender profile recorded"""
+    expected = [(kind, value) for kind, values in case.get("identifiers", {}).items() for value in values]
+    if not expected:
+        return 1.0
+    profile = main.document_processor.get_sender_profile(case["sender_info"])
+    recorded = profile["identifiers"] if profile else {}
+    return sum(value in recorded.get(kind, []) for kind, value in expected) / len(expected)
+
+
+def seed_store(main, corpus: List[Dict[str, Any]], knowledge_base: Optional[str]) -> None:
+    """Load every case's history (all customers share one store) and the knowledge base"""
+    for case in corpus:
+        for email in case.get("history", []):
+            main.document_processor.store_email_vector(
+                email_content=email["email_content"],
+                sender_info=email.get("sender_info", case["sender_info"]),
+                date_time=email["date_time"],
+                email_id=email["email_id"],
+                additional_metadata={"subject": email.get("subject", "")}
+            )
+    if knowledge_base and os.path.exists(knowledge_base):
+        with open(knowledge_base, encoding="utf-8") as f:
+            main.document_processor.process_uploaded_document(f.read(), os.path.basename(knowledge_base))
+
+
+def run_case(main, workflow, case: Dict[str, Any], corpus: List[Dict[str, Any]],
+             timer: NodeTimer, metered) -> Dict[str, Any]:
+    timer.reset()
+    metered.reset()
+    initial_state = main.build_initial_state(case["email_content"], case["sender_info"], case["subject"])
+
+    start = time.perf_counter()
+    final_state = asyncio.run(main.run_email_workflow(workflow, initial_state, thread_prefix="benchmark"))
+    total_latency_ms = (time.perf_counter() - start) * 1000
+
+    reply = final_state["final_reply"]
+    violations = privacy_violations(case, reply, corpus)
+    return {
+        "id": case["id"],
+        "iterations": final_state["iteration_count"],
+        "critique_score": final_state["critique_score"],
+        "keyword_recall": keyword_recall(case, reply),
+        "identifier_recall": identifier_recall(main, case),
+        "privacy_violations": violations,
+        "fallback_used": reply.strip() == main.FALLBACK_RESPONSE.strip(),
+        "llm_calls": sum(usage["calls"] for usage in metered.usage.values()),
+        "prompt_tokens": sum(usage["prompt_tokens"] for usage in metered.usage.values()),
+        "completion_tokens": sum(usage["completion_tokens"] for usage in metered.usage.values()),
+        "node_tokens": {node: usage["prompt_tokens"] + usage["completion_tokens"] for node, usage in metered.usage.items()},
+        "node_latency_ms": {node: sum(times) for node, times in timer.timings.items()},
+        "total_latency_ms": total_latency_ms,
+        "reply": reply
+    }
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    node_latencies: Dict[str, List[float]] = {}
+    for result in results:
+        for node, latency in result["node_latency_ms"].items():
+            node_latencies.setdefault(node, []).append(latency)
+    total_latencies = [result["total_latency_ms"] for result in results]
+    return {
+        "cases": len(results),
+        "mean_critique_score": statistics.mean(r["critique_score"] for r in results),
+        "mean_keyword_recall": statistics.mean(r["keyword_recall"] for r in results),
+        "mean_identifier_recall": statistics.mean(r["identifier_recall"] for r in results),
+        "mean_iterations": statistics.mean(r["iterations"] for r in results),
+        "privacy_violations": sum(len(r["privacy_violations"]) for r in results),
+        "fallback_replies": sum(r["fallback_used"] for r in results),
+        "llm_calls": sum(r["llm_calls"] for r in results),
+        "total_tokens": sum(r["prompt_tokens"] + r["completion_tokens"] for r in results),
+        "p50_total_latency_ms": percentile(total_latencies, 50),
+        "p95_total_latency_ms": percentile(total_latencies, 95),
+        "node_p50_latency_ms": {node: percentile(values, 50) for node, values in node_latencies.items()},
+        "node_p95_latency_ms": {node: percentile(values, 95) for node, values in node_latencies.items()},
+    }
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any], check_latency: bool) -> List[str]:
+    """Human-readable regressions of summary versus baseline"""
+    regressions = []
+    rules = REGRESSION_RULES + ([LATENCY_RULE] if check_latency else [])
+    for metric, direction, kind, tolerance in rules:
+        if metric not in baseline:
+            continue
+        current, reference = summary[metric], baseline[metric]
+        allowed = tolerance * abs(reference) if kind == "relative" else tolerance
+        change = current - reference if direction == "lower" else reference - current
+        if change > allowed + 1e-9:
+            regressions.append(f"{metric}: {reference:.4g} -> {current:.4g} (tolerance {tolerance:g} {kind})")
+    return regressions
+
+
+def build_llm(mode: str, recording_path: str, real_client):
+    from benchmarks.stand_in_llm import DeterministicLLM, RecordingLLM, ReplayLLM
+
+    if mode == "record":
+        os.makedirs(os.path.dirname(recording_path), exist_ok=True)
+        return RecordingLLM(real_client, recording_path)
+    if mode == "replay":
+        return ReplayLLM(recording_path)
+    return DeterministicLLM()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline reply quality and latency regression benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--knowledge-base", default=DEFAULT_KNOWLEDGE_BASE)
+    parser.add_argument("--llm", choices=["deterministic", "replay", "record"], default="deterministic")
+    parser.add_argument("--recording", default=DEFAULT_RECORDING)
+    parser.add_argument("--mode", choices=["reflection", "best_of_n"], default=None,
+                        help="Workflow mode (defaults to WORKFLOW_MODE)")
+    parser.add_argument("--output", help="Write the full per-case report to this JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--check-latency", action="store_true",
+                        help="Also fail on latency regressions (only meaningful on the baseline's hardware)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    # Isolated vector store and no background work; must be set before config is imported
+    chroma_dir = tempfile.mkdtemp(prefix="reply_quality_chroma_")
+    os.environ["CHROMA_PERSIST_DIR"] = chroma_dir
+    os.environ["INGEST_QUEUE_ENABLED"] = "false"
+    os.environ["EMAIL_SYNC_INTERVAL_SECONDS"] = "0"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    if args.llm != "record":
+        os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+    sys.path.insert(0, SERVICE_DIR)
+
+    try:
+        import main as service
+        from benchmarks.stand_in_llm import MeteredLLM, current_node
+
+        service.initialize_services()
+        corpus = load_corpus(args.corpus)
+        seed_store(service, corpus, args.knowledge_base)
+        # The leader's one-off profile backfill, which startup_event would otherwise schedule
+        asyncio.run(service.backfill_sender_profiles())
+
+        metered = MeteredLLM(build_llm(args.llm, args.recording, service.llm_client))
+        service.llm_client = metered
+        timer = NodeTimer(current_node)
+        workflow = service.create_email_workflow(mode=args.mode or service.WORKFLOW_MODE, node_hook=timer.hook)
+
+        results = [run_case(service, workflow, case, corpus, timer, metered) for case in corpus]
+    finally:
+        shutil.rmtree(chroma_dir, ignore_errors=True)
+
+    summary = summarize(results)
+    summary["workflow_mode"] = args.mode or service.WORKFLOW_MODE
+    summary["llm"] = args.llm
+
+    for result in results:
+        print(f"{result['id']:<24} iterations={result['iterations']} score={result['critique_score']:.2f} "
+              f"recall={result['keyword_recall']:.2f} identifiers={result['identifier_recall']:.2f} tokens={result['prompt_tokens'] + result['completion_tokens']} "
+              f"latency={result['total_latency_ms']:.0f}ms violations={len(result['privacy_violations'])}")
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 2
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("workflow_mode") != summary["workflow_mode"] or baseline.get("llm") != summary["llm"]:
+        print(f"Warning: baseline was recorded with mode={baseline.get('workflow_mode')} llm={baseline.get('llm')}")
+
+    regressions = compare(summary, baseline, args.check_latency)
+    if regressions:
+        print("REGRESSIONS:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
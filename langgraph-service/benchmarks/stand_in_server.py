@@ -0,0 +1,109 @@
+"""
+Stand-in LLM Server
+OpenAI-compatible /chat/completions endpoint backed by the deterministic stand-in LLM,
+with injectable latency, tail latency and errors. Point a provider at it to exercise
+the LLM router's hedging and circuit breakers without API calls.
+
+Usage (from langgraph-service/):
+    python -m benchmarks.stand_in_server --port 9101 --latency-ms 150 --slow-rate 0.05 --slow-ms 3000
+    LLM_PROVIDER_BASE_URLS=groq=http://127.0.0.1:9101/v1 python main.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from benchmarks.stand_in_llm import DeterministicLLM
+
+
+class StandInBehavior:
+    """Latency and failure profile; mutable so tests can degrade a running server"""
+
+    def __init__(self, latency_ms: float = 0, slow_rate: float = 0, slow_ms: float = 0,
+                 error_rate: float = 0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(delay seconds, fail) for the next request"""
+        with self._lock:
+            self.requests += 1
+            slow = self._random.random() < self.slow_rate
+            fail = self._random.random() < self.error_rate
+        return (self.slow_ms if slow else self.latency_ms) / 1000, fail
+
+
+def make_handler(llm, behavior: StandInBehavior):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            delay, fail = behavior.draw()
+            time.sleep(delay)
+            if fail or not self.path.rstrip("/").endswith("/chat/completions"):
+                self._reply(503 if fail else 404, {"error": {"message": "stand-in failure" if fail else "not found"}})
+                return
+            response = llm.chat.completions.create(
+                model=body.get("model", ""), messages=body.get("messages", []),
+                temperature=body.get("temperature", 0.7), max_tokens=body.get("max_tokens", 500)
+            )
+            self._reply(200, {
+                "model": body.get("model", ""),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": response.choices[0].message.content}}],
+                "usage": vars(response.usage)
+            })
+
+        def _reply(self, status: int, payload) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, behavior: Optional[StandInBehavior] = None,
+          llm=None) -> ThreadingHTTPServer:
+    """Start a stand-in server on a background thread; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), make_handler(llm or DeterministicLLM(), behavior or StandInBehavior()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in LLM endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--slow-rate", type=float, default=0, help="Fraction of requests that take --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    behavior = StandInBehavior(args.latency_ms, args.slow_rate, args.slow_ms, args.error_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(DeterministicLLM(), behavior))
+    print(f"Stand-in LLM listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
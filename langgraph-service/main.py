@@ -1,17 +1,21 @@
 """MailFloww LangGraph RAG Service"""
+import asyncio
+import contextlib
+import json
 import logging
-from typing import List, Dict, Any, TypedDict, Annotated
+import re
+import time
+from typing import List, Dict, Any, Optional, TypedDict, Annotated
 from datetime import datetime
-import operator
-import chromadb
-from sentence_transformers import SentenceTransformer
+import uuid
 import torch
 import uvicorn
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, FileResponse
 from pydantic import BaseModel
-from groq import Groq
 import os
+from pathlib import Path
 import config
 
 if config.LANGCHAIN_API_KEY:
@@ -26,29 +30,64 @@ else:
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
-from src.models.email_models import EmailRequest, ContextDocument, ContextEmail
-from src.services.document_processor import DocumentProcessor
+from src.models.email_models import (
+    EmailRequest, ContextDocument, ContextEmail, ContextRequest, ContextResponse,
+    BatchContextRequest, BatchContextResponse, EmbeddingMigrationRequest, DocumentImportRequest
+)
+from src.services.document_processor import (
+    DocumentProcessor, CollectionSettings, IndexSettings, SearchSettings, CompressionSettings,
+    DedupSettings, ProfileSettings, SidecarSettings
+)
 from src.services.email_fetcher import SimpleEmailFetcher
+from src.services.sync_scheduler import EmailSyncScheduler
+from src.services.ingestion_queue import IngestionQueue, IngestionWorker, QueueFullError
+from src.services.privacy_scrubber import scrub_text
+from src.services.email_threading import clean_email_body
+from src.services.vector_snapshot import SnapshotError, snapshot_path, list_snapshots
+from src.services.embedding_migration import EmbeddingMigrator, MigrationError
+from src.services.intent_router import IntentRouter
+from src.services.sidecars import acquire_leader_lock, start_sidecars, stop_sidecars
+from src.services.encode_executor import create_encode_pools
+from src.services.context_store import ContextStore
+from src.services.llm_router import LLMRouter
+from src.services.admission import AdmissionController, AdmissionRejected
+from src.services.document_extraction import DocumentIngestor, ExtractionError
+from src.services.sender_profiles import DEFAULT_DEVICE_PATTERN, profile_summary
+from src.services.request_profiler import RequestProfiler
+from src.prompts.templates import (
+    build_generation_messages, build_refinement_messages, build_critique_messages,
+    build_scoring_messages, build_batch_critique_messages, messages_length
+)
 from config import *
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+def append_processing_logs(existing: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """processing_logs reducer: each node contributes only its own entries; keep the most recent"""
+    return (existing + new)[-MAX_PROCESSING_LOGS:]
+
 # LangGraph State
 class EmailProcessingState(TypedDict):
-    """State object that flows through the LangGraph RAG workflow"""
+    """State object that flows through the LangGraph RAG workflow
+
+    Retrieved bodies live in context_store; the state (and every checkpoint) only holds
+    their content refs, pinned under request_id until the request finishes.
+    """
     # Input data
+    request_id: str
     email_content: str
     sender_info: str
     subject: str
+    tenant_id: Optional[str]
 
     # Retrieval results (Node A - RAG Retrieval)
-    retrieved_emails: List[ContextEmail]
-    retrieved_documents: List[ContextDocument]
-    personal_context: str
-    business_context: str
-    doc_context: str
+    retrieved_emails: List[Dict[str, Any]]  # {"id", "ref", "score", "duplicates"}
+    retrieved_documents: List[Dict[str, Any]]
+    personal_context: List[Dict[str, str]]  # {"label", "ref"} per prompt context line
+    business_context: List[Dict[str, str]]
+    doc_context: List[Dict[str, str]]
 
     # Generation results (Node B - LLM Generation)
     generated_response: str
@@ -61,11 +100,19 @@ class EmailProcessingState(TypedDict):
     improvement_suggestions: List[str]
     iteration_count: int
 
+    # Best-of-N results (speculative parallel drafts)
+    candidate_drafts: List[str]
+    candidate_scores: List[float]
+
+    # Intent fast path (set when a templated answer replaces generation)
+    intent: Optional[str]
+    intent_confidence: float
+
     # Final output
     final_reply: str
 
-    # Processing logs
-    processing_logs: Annotated[List[str], operator.add]
+    # Processing logs ({"node", "message", "at"}), bounded to MAX_PROCESSING_LOGS
+    processing_logs: Annotated[List[Dict[str, Any]], append_processing_logs]
 
 chroma_client = None
 embedding_model = None
@@ -74,20 +121,39 @@ docs_collection = None
 llm_client = None
 document_processor = None
 email_fetcher = None
+sync_scheduler = None
+ingestion_queue = None
+ingestion_worker = None
+embedding_migrator = None
+intent_router = None
+encode_pools = {}
+leader_lock = None
+# Leader-only one-off and periodic jobs started in startup_event, cancelled on shutdown
+background_tasks = []
+admission_controller = None
+document_ingestor = None
+request_profiler = None
+profiled_workflows = {}
 email_workflow = None
+single_draft_workflow = None
+context_store = ContextStore(max_bytes=int(CONTEXT_STORE_MAX_MB * 1024 * 1024))
 
 class GenerateReplyRequest(BaseModel):
     email_content: str
     sender_info: str
     subject: str
+    tenant_id: Optional[str] = None
+    deadline_seconds: Optional[float] = None  # defaults to REPLY_DEADLINE_SECONDS
 
 def initialize_services():
-    global chroma_client, embedding_model, email_collection, docs_collection, llm_client, document_processor, email_fetcher
+    global chroma_client, embedding_model, email_collection, docs_collection, llm_client, document_processor, email_fetcher, sync_scheduler, ingestion_queue, ingestion_worker, embedding_migrator, intent_router, encode_pools, admission_controller, document_ingestor, request_profiler
 
     try:
         logger.info("Initializing MailFloww LangGraph RAG Service...")
 
-        if USE_GPU and torch.cuda.is_available():
+        if EMBEDDING_SERVER_SOCKET:
+            logger.info(f"Embeddings served by {EMBEDDING_SERVER_SOCKET}; worker stays on CPU")
+        elif USE_GPU and torch.cuda.is_available():
             try:
                 torch.cuda.empty_cache()
                 torch.cuda.set_per_process_memory_fraction(GPU_MEMORY_FRACTION)
@@ -101,54 +167,160 @@ def initialize_services():
             else:
                 logger.info("Using CPU for computations")
 
-        # Initialize ChromaDB
-        chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
-        logger.info("ChromaDB initialized")
-
-        # Initialize embedding model with device support
-        try:
-            embedding_model = SentenceTransformer(EMBEDDING_MODEL, device=TORCH_DEVICE)
-            logger.info(f"Embedding model loaded: {EMBEDDING_MODEL} on device: {TORCH_DEVICE}")
-        except Exception as e:
-            logger.warning(f"Failed to load model on {TORCH_DEVICE}, falling back to CPU: {e}")
-            embedding_model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
-            logger.info(f"Embedding model loaded: {EMBEDDING_MODEL} on device: cpu")
-
-        # Log GPU information if available
-        if TORCH_DEVICE == "cuda" and torch.cuda.is_available():
-            try:
-                logger.info(f"GPU: {torch.cuda.get_device_name(0)}")
-                logger.info(f"GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
-            except Exception as e:
-                logger.warning(f"Failed to get GPU info: {e}")
-
-        # Initialize LLM client
-        llm_client = Groq(api_key=GROQ_API_KEY)
-        logger.info("Groq LLM client initialized")
+        # Initialize LLM client: per-node models, hedged requests and per-provider circuit breakers
+        llm_client = LLMRouter(
+            DEFAULT_LLM_PROVIDER,
+            api_keys={"groq": GROQ_API_KEY, "openai": OPENAI_API_KEY, "anthropic": ANTHROPIC_API_KEY, "google": GOOGLE_API_KEY},
+            base_urls=LLM_PROVIDER_BASE_URLS,
+            fallback_models=LLM_FALLBACK_MODELS,
+            timeout=LLM_REQUEST_TIMEOUT_SECONDS,
+            hedge_enabled=LLM_HEDGE_ENABLED,
+            hedge_percentile=LLM_HEDGE_PERCENTILE,
+            hedge_initial_delay_ms=LLM_HEDGE_INITIAL_DELAY_MS,
+            hedge_min_delay_ms=LLM_HEDGE_MIN_DELAY_MS,
+            breaker_failures=LLM_BREAKER_FAILURES,
+            breaker_cooldown_seconds=LLM_BREAKER_COOLDOWN_SECONDS,
+            max_concurrency=LLM_MAX_CONCURRENCY
+        )
+        logger.info(f"LLM router initialized: generation={LLM_GENERATION_MODEL}, critique={LLM_CRITIQUE_MODEL}, scoring={LLM_SCORING_MODEL}")
+
+        # Encodes run on bounded pools so CPU-bound work stays off the event loop
+        encode_pools = create_encode_pools(
+            ENCODE_EXECUTOR,
+            query_workers=ENCODE_QUERY_WORKERS,
+            query_torch_threads=ENCODE_QUERY_TORCH_THREADS,
+            ingest_workers=ENCODE_INGEST_WORKERS,
+            ingest_torch_threads=ENCODE_INGEST_TORCH_THREADS,
+            device=TORCH_DEVICE,
+            embedding_server_socket=EMBEDDING_SERVER_SOCKET or None
+        )
 
         # Initialize services with proper configuration
         document_processor = DocumentProcessor(
             embedding_model_name=EMBEDDING_MODEL,
             chroma_path=CHROMA_PERSIST_DIR,
-            email_collection_name=EMAIL_COLLECTION,
-            docs_collection_name=DOCS_COLLECTION,
+            collections=CollectionSettings(
+                emails=EMAIL_COLLECTION,
+                docs=DOCS_COLLECTION,
+                threads=THREADS_COLLECTION,
+                emails_cold=EMAIL_COLD_COLLECTION,
+                thread_summary_max_chars=THREAD_SUMMARY_MAX_CHARS,
+                max_open_tenants=MAX_OPEN_TENANTS
+            ),
+            index=IndexSettings(
+                distance_space=CHROMA_DISTANCE_SPACE,
+                m=HNSW_M,
+                construction_ef=HNSW_CONSTRUCTION_EF,
+                search_ef=HNSW_SEARCH_EF
+            ),
+            search=SearchSettings(
+                query_ef=RETRIEVAL_QUERY_EF,
+                mmr_fetch_factor=RETRIEVAL_MMR_FETCH_FACTOR,
+                recency_window_days=EMAIL_RECENCY_WINDOW_DAYS,
+                decay_half_life_days=EMAIL_DECAY_HALF_LIFE_DAYS,
+                decay_weight=EMAIL_DECAY_WEIGHT
+            ),
+            compression=CompressionSettings(
+                method=EMAIL_VECTOR_COMPRESSION,
+                dims=EMAIL_VECTOR_DIMS,
+                rescore_dtype=EMAIL_RESCORE_DTYPE,
+                rescore_factor=EMAIL_RESCORE_FACTOR
+            ),
+            dedup=DedupSettings(
+                threshold=NEAR_DUP_THRESHOLD,
+                num_perm=NEAR_DUP_NUM_PERM,
+                bands=NEAR_DUP_BANDS,
+                listed_ids=NEAR_DUP_LISTED_IDS
+            ),
+            profiles=ProfileSettings(
+                recent_messages=SENDER_PROFILE_RECENT_MESSAGES,
+                excerpt_chars=SENDER_PROFILE_EXCERPT_CHARS,
+                max_identifiers=SENDER_PROFILE_MAX_IDENTIFIERS,
+                device_pattern=SENDER_PROFILE_DEVICE_PATTERN or DEFAULT_DEVICE_PATTERN
+            ),
+            sidecars=SidecarSettings(
+                embedding_server_socket=EMBEDDING_SERVER_SOCKET or None,
+                chroma_server_host=CHROMA_SERVER_HOST or None,
+                chroma_server_port=CHROMA_SERVER_PORT
+            ),
+            registry_path=EMBEDDING_REGISTRY_PATH,
+            encode_pools=encode_pools,
             device=TORCH_DEVICE
         )
-        email_fetcher = SimpleEmailFetcher(document_processor=document_processor)
-        logger.info("Service components initialized")
-
-        # Create collections
-        email_collection = chroma_client.get_or_create_collection(
-            name=EMAIL_COLLECTION,
-            metadata={"description": "NEXUS customer emails"}
+        # The processor owns the only Chroma client and embedding model in this process
+        chroma_client = document_processor.chroma_client
+        embedding_model = document_processor.embedding_model
+        logger.info(f"ChromaDB and embedding model ready: {document_processor.embedding_model_name} "
+                    f"({'embedding server' if EMBEDDING_SERVER_SOCKET else document_processor.device})")
+        embedding_migrator = EmbeddingMigrator(document_processor, batch_size=EMBEDDING_MIGRATION_BATCH_SIZE)
+        # Extraction processes start on the first document upload
+        document_ingestor = DocumentIngestor(
+            document_processor,
+            workers=DOCUMENT_EXTRACT_WORKERS,
+            pdf_pages_per_task=DOCUMENT_PDF_PAGES_PER_TASK,
+            embed_batch_size=DOCUMENT_EMBED_BATCH_SIZE,
+            max_archive_bytes=DOCUMENT_MAX_ARCHIVE_MB * 1024 * 1024
         )
+        if INTENT_FAST_PATH_ENABLED:
+            intent_router = IntentRouter(
+                document_processor,
+                confidence_threshold=INTENT_CONFIDENCE_THRESHOLD,
+                margin=INTENT_MARGIN,
+                answer_ttl_seconds=INTENT_ANSWER_TTL_SECONDS,
+                min_doc_score=INTENT_MIN_DOC_SCORE
+            )
+        if ADMISSION_ENABLED:
+            admission_controller = AdmissionController(
+                max_concurrent=ADMISSION_MAX_CONCURRENT,
+                max_queue=ADMISSION_MAX_QUEUE,
+                degrade_queue_depth=ADMISSION_DEGRADE_QUEUE_DEPTH,
+                snippets_queue_depth=ADMISSION_SNIPPETS_QUEUE_DEPTH,
+                max_retrieval_only=ADMISSION_RETRIEVAL_ONLY_CONCURRENT,
+                initial_estimates={
+                    "full": REPLY_FULL_ESTIMATE_SECONDS,
+                    "single_draft": REPLY_SINGLE_DRAFT_ESTIMATE_SECONDS,
+                    "retrieval_only": REPLY_RETRIEVAL_ESTIMATE_SECONDS
+                }
+            )
+        if PROFILING_ENABLED:
+            request_profiler = RequestProfiler(
+                PROFILING_DIR,
+                interval_seconds=PROFILING_INTERVAL_MS / 1000,
+                sample_rate=PROFILING_SAMPLE_RATE,
+                max_profiles=PROFILING_MAX_PROFILES
+            )
+        if INGEST_QUEUE_ENABLED:
+            ingestion_queue = IngestionQueue(
+                db_path=INGEST_QUEUE_PATH,
+                max_depth=INGEST_QUEUE_MAX_DEPTH,
+                max_attempts=INGEST_MAX_ATTEMPTS
+            )
+            ingestion_worker = IngestionWorker(
+                ingestion_queue, document_processor,
+                batch_size=INGEST_BATCH_SIZE,
+                concurrency=INGEST_WORKERS
+            )
 
-        docs_collection = chroma_client.get_or_create_collection(
-            name=DOCS_COLLECTION,
-            metadata={"description": "NEXUS company documents"}
+        email_fetcher = SimpleEmailFetcher(
+            backend_url=BACKEND_URL,
+            document_processor=document_processor,
+            tenant_field=TENANT_FIELD or None,
+            page_size=BACKEND_PAGE_SIZE,
+            fetch_concurrency=BACKEND_FETCH_CONCURRENCY,
+            page_timeout=BACKEND_PAGE_TIMEOUT,
+            page_retries=BACKEND_PAGE_RETRIES,
+            stream_threshold_bytes=BACKEND_STREAM_THRESHOLD_BYTES,
+            ingestion_queue=ingestion_queue
         )
+        sync_scheduler = EmailSyncScheduler(email_fetcher, interval_seconds=EMAIL_SYNC_INTERVAL_SECONDS)
+        logger.info("Service components initialized")
 
-        logger.info("Collections created")
+        # The processor created the collections with the configured HNSW settings; re-passing
+        # metadata here would replace those settings on older Chroma versions
+        email_collection = document_processor.emails_collection
+        docs_collection = document_processor.docs_collection
+
+        logger.info(f"Collections ready ({document_processor.index_metadata['hnsw:space']} space)")
         logger.info("All services initialized successfully")
 
     except Exception as e:
@@ -157,14 +329,52 @@ def initialize_services():
 
 # LangGraph Node Functions
 
+FALLBACK_RESPONSE = """Dear Customer,
+
+Thank you for contacting NEXUS Support.
+(THIS IS A FALLBACK RESPONSE)
+
+We've received your inquiry and our team will respond with a detailed solution within 24 hours.
+
+For immediate assistance:
+- Phone: 1800-2809-5533
+- Live Chat: nexustech.com/support
+
+Best regards,
+NEXUS Support Team
+support@nexustech.com"""
+
 def entry_point(state: EmailProcessingState) -> EmailProcessingState:
     """Entry point - Initialize the workflow"""
     logger.info("Starting LangGraph RAG workflow")
     state["iteration_count"] = 0
     state["is_satisfactory"] = False
-    state["processing_logs"] = ["Workflow started"]
+    state["processing_logs"].append("Workflow started")
     return state
 
+CONTEXT_FALLBACKS = {
+    "personal_context": "No previous emails from this customer.",
+    "business_context": "No relevant business context found.",
+    "doc_context": "No relevant company policies found."
+}
+
+def store_body(state: EmailProcessingState, text: str) -> str:
+    """Put a retrieved body in the side store, pinned for this request; returns its ref"""
+    return context_store.put(text, owner=state["request_id"])
+
+def context_entry(state: EmailProcessingState, label: str, text: str) -> Dict[str, str]:
+    return {"label": label, "ref": store_body(state, text)}
+
+def context_text(state: EmailProcessingState, key: str) -> str:
+    """Prompt text for one context section, rebuilt from the side store"""
+    entries = state.get(key) or []
+    if not entries:
+        return CONTEXT_FALLBACKS[key]
+    bodies = context_store.get_many([entry["ref"] for entry in entries])
+    return "\n\n".join(
+        f"{entry['label']}: {body}" if entry["label"] else body for entry, body in zip(entries, bodies)
+    )
+
 def retrieval_node(state: EmailProcessingState) -> EmailProcessingState:
     """Node A - RAG Retrieval: Email vectorization + Document processing"""
     try:
@@ -174,59 +384,90 @@ def retrieval_node(state: EmailProcessingState) -> EmailProcessingState:
         logger.info("Searching existing emails and documents for context")
 
         # Use DocumentProcessor's search methods for proper email and document retrieval
-        email_search_results = document_processor.search_emails(state["email_content"], n_results=10)
-        doc_search_results = document_processor.search_documents(state["email_content"], n_results=5)
+        # All searches are scoped to the request's tenant collections and share one query embedding
+        tenant_id = state.get("tenant_id")
+        query_vector = document_processor.encode_query(state["email_content"])
+
+        profile = document_processor.get_sender_profile(state["sender_info"], tenant_id)
+
+        # Known intents are answered from cached templates and skip generation entirely; senders
+        # with stored history always get the full workflow, whose reply can use their own case
+        if intent_router is not None and not profile and not document_processor.has_sender_history(state["sender_info"], tenant_id):
+            fast_path = intent_router.route(query_vector, tenant_id)
+            if fast_path:
+                return apply_fast_path(state, fast_path)
+
+        # MMR keeps near-identical emails and boilerplate chunks from filling the top results
+        email_search_results = document_processor.search_emails(
+            state["email_content"], n_results=10, tenant_id=tenant_id, query_vector=query_vector,
+            mmr_lambda=RETRIEVAL_MMR_LAMBDA
+        )
+        doc_search_results = document_processor.search_documents(
+            state["email_content"], n_results=5, tenant_id=tenant_id, query_vector=query_vector,
+            mmr_lambda=RETRIEVAL_MMR_LAMBDA
+        )
+
+        # Known senders' personal context is one profile lookup; senders without a profile
+        # fall back to their compact thread summaries
+        thread_search_results = [] if profile else document_processor.search_threads(
+            state["email_content"], n_results=3, sender_info=state["sender_info"],
+            tenant_id=tenant_id, query_vector=query_vector
+        )
 
         # Process email results using DocumentProcessor's formatted output
         retrieved_emails = []
         personal_context = [] #Only Sender Relevant Private Context
         business_context = [] #Bussiness Context(Cross Customer Context) = All mails - Private Context
 
+        if profile:
+            personal_context.append(context_entry(state, "Sender profile", profile_summary(profile)))
+            for message in profile["recent"]:
+                label = f"Previous email ({message['subject'] or 'no subject'}, {message['date_time'] or 'unknown date'})"
+                personal_context.append(context_entry(state, label, message["excerpt"]))
+
+        for thread_result in thread_search_results:
+            subject = thread_result['metadata'].get("subject") or "no subject"
+            personal_context.append(context_entry(state, f"Previous conversation ({subject})", thread_result['content']))
+
         for email_result in email_search_results:
             email_content = email_result['content']
             email_metadata = email_result['metadata']
-            similarity_score = email_result['similarity_score']
 
-            context_email = ContextEmail( #Creating Context Mail Object from email_models.py
-                content=email_content,
-                sender=email_metadata.get("sender_info", "unknown"),
-                metadata=email_metadata,
-                similarity_score=similarity_score
-            )
-            retrieved_emails.append(context_email) #Appending that Object
+            # Only the ref goes into the state; identical bodies are stored once
+            duplicate_count = int(email_metadata.get("duplicate_count", 1))
+            retrieved_emails.append({
+                "id": email_result.get('id'),
+                "ref": store_body(state, email_content),
+                "score": email_result['similarity_score'],
+                "duplicates": duplicate_count
+            })
 
             # Privacy-first context separation
             if email_metadata.get("sender_info") == state["sender_info"]:
-                personal_context.append(f"Previous email: {email_content}")
+                if not profile and not thread_search_results:
+                    personal_context.append(context_entry(state, "Previous email", clean_email_body(email_content)))
             else:
                 # Filter out personal data for cross-customer context
-                filtered_content = email_content
-                # Remove personal identifiers but keep business context
-                business_context.append(f"Business context: {filtered_content}")
+                # Redaction runs at ingest; only emails stored before it existed are scrubbed here
+                filtered_content = email_metadata.get("scrubbed_content") or scrub_text(clean_email_body(email_content))
+                label = f"Business context ({duplicate_count} similar emails)" if duplicate_count > 1 else "Business context"
+                business_context.append(context_entry(state, label, filtered_content))
 
         # Process document results using DocumentProcessor's formatted output
         retrieved_documents = []
         doc_context = []
 
         for doc_result in doc_search_results:
-            doc_content = doc_result['content']
-            doc_metadata = doc_result['metadata']
-            similarity_score = doc_result['similarity_score']
-
-            context_doc = ContextDocument(
-                content=doc_content,
-                metadata=doc_metadata,
-                similarity_score=similarity_score
-            )
-            retrieved_documents.append(context_doc)
-            doc_context.append(f"Company policy: {doc_content}")
+            entry = context_entry(state, "Company policy", doc_result['content'])
+            retrieved_documents.append({"id": doc_result.get('id'), "ref": entry["ref"], "score": doc_result['similarity_score']})
+            doc_context.append(entry)
 
-        # Update state
+        # Update state; empty sections fall back to CONTEXT_FALLBACKS when prompts are built
         state["retrieved_emails"] = retrieved_emails
         state["retrieved_documents"] = retrieved_documents
-        state["personal_context"] = "\n\n".join(personal_context) if personal_context else "No previous emails from this customer."
-        state["business_context"] = "\n\n".join(business_context) if business_context else "No relevant business context found."
-        state["doc_context"] = "\n\n".join(doc_context) if doc_context else "No relevant company policies found."
+        state["personal_context"] = personal_context
+        state["business_context"] = business_context
+        state["doc_context"] = doc_context
 
         state["processing_logs"].append(f"Retrieved {len(retrieved_emails)} emails and {len(retrieved_documents)} documents")
         logger.info(f"RAG Retrieval completed: {len(retrieved_emails)} emails, {len(retrieved_documents)} documents")
@@ -238,69 +479,52 @@ def retrieval_node(state: EmailProcessingState) -> EmailProcessingState:
         state["processing_logs"].append(f"Retrieval error: {str(e)}")
         state["retrieved_emails"] = []
         state["retrieved_documents"] = []
-        state["personal_context"] = "Error retrieving personal context."
-        state["business_context"] = "Error retrieving business context."
-        state["doc_context"] = "Error retrieving document context."
+        state["personal_context"] = [context_entry(state, "", "Error retrieving personal context.")]
+        state["business_context"] = [context_entry(state, "", "Error retrieving business context.")]
+        state["doc_context"] = [context_entry(state, "", "Error retrieving document context.")]
         return state
 
+def apply_fast_path(state: EmailProcessingState, fast_path: Dict[str, Any]) -> EmailProcessingState:
+    """Fill the final reply from an intent's templated answer"""
+    state["retrieved_emails"] = []
+    state["doc_context"] = [context_entry(state, "Company policy", doc["content"]) for doc in fast_path["documents"]]
+    state["retrieved_documents"] = [
+        {"id": doc.get("id"), "ref": entry["ref"], "score": doc["similarity_score"]}
+        for doc, entry in zip(fast_path["documents"], state["doc_context"])
+    ]
+    state["intent"] = fast_path["intent"]
+    state["intent_confidence"] = fast_path["confidence"]
+    state["generated_response"] = fast_path["reply"]
+    state["final_reply"] = fast_path["reply"]
+    state["critique_score"] = fast_path["confidence"]
+    state["is_satisfactory"] = True
+    state["processing_logs"].append(
+        f"Intent fast path: {fast_path['intent']} (confidence {fast_path['confidence']:.2f}), LLM skipped"
+    )
+    logger.info(f"Intent fast path answered {fast_path['intent']} (confidence {fast_path['confidence']:.2f})")
+    return state
+
+def route_after_retrieval(state: EmailProcessingState) -> str:
+    return "end" if state.get("intent") else "generation"
+
+def generation_messages(state: EmailProcessingState) -> List[Dict[str, str]]:
+    """Reply-generation messages for the current state"""
+    return build_generation_messages(
+        state["email_content"], context_text(state, "personal_context"),
+        context_text(state, "business_context"), context_text(state, "doc_context")
+    )
+
 def generation_node(state: EmailProcessingState) -> EmailProcessingState:
     """Node B - LLM Generation: Generate response using retrieved context"""
     try:
         logger.info("LLM Generation: Creating response with context")
 
-        # Use the exact prompt you specified
-        prompt = f"""You are a professional customer support representative for NEXUS, a technology company that makes laptops (NexusBook) and tablets (NexusPad).
-
-CUSTOMER EMAIL TO REPLY TO (DON'T GIVE RESPONSE ABOUT ANYTHING THAT IS NOT BEING ASKED IN CUSTOMER EMAIL, EVEN IF IT IS PRESENT IN PERSONAL CONTEXT):
-{state["email_content"]}
-
-PERSONAL CONTEXT (THIS CUSTOMER'S PREVIOUS EMAILS ONLY):
-{state["personal_context"]}
-
-BUSINESS CONTEXT (GENERAL BUSINESS INTELLIGENCE - NO PERSONAL DATA):
-{state["business_context"]}
-
-COMPANY POLICY INFORMATION:
-{state["doc_context"]}
-
-Please write a professional, helpful, and contextually appropriate reply to the customer email.
-
-CRITICAL PRIVACY AND CONTEXT GUIDELINES:
-
-PERSONAL DATA PROTECTION (NEVER SHARE ACROSS CUSTOMERS):
-- Serial numbers, bill numbers, order IDs
-- Customer names, email addresses, phone numbers
-- Purchase dates, payment information
-- Device-specific details from other customers
-- Any personally identifiable information
-
-BUSINESS CONTEXT SHARING (ALLOWED ACROSS CUSTOMERS):
-- Product launch dates and announcements
-- Partnership information and collaborations
-- General product availability and restocking (You Can Include Specific Dates, Times)
-- New features, designs, or special editions
-- Company policies and procedures
-
-RULES:
-1. NEVER reveal personal data from other customers' emails
-2. DO use business intelligence from any relevant email to help current customer
-3. DO NOT create fake data or placeholder values
-4. If customer asks for their personal info, only use it if it's in THEIR previous emails
-5. Use cross-customer business context to provide better service (launch dates, partnerships, etc.)
-6. Be professional and helpful while maintaining strict privacy
-
-EXAMPLES:
-GOOD: "We have a special edition launch planned for January 27th" (from partnership email)
-BAD: "Customer John's serial number is..." (personal data from another customer)
-GOOD: "Based on our partnership discussions, new accessories are coming soon"
-BAD: "Bill number 30022023KL1931VET shows..." (another customer's order details)
-
-Write the reply as if you are a Company customer support representative:"""
+        messages = generation_messages(state)
 
         # Call Groq LLM
         response = llm_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+            model=LLM_GENERATION_MODEL,
+            messages=messages,
             temperature=0.7,
             max_tokens=500
         )
@@ -309,10 +533,10 @@ Write the reply as if you are a Company customer support representative:"""
 
         # Store generation metadata
         generation_metadata = {
-            "model": LLM_MODEL,
+            "model": LLM_GENERATION_MODEL,
             "temperature": 0.7,
             "max_tokens": 500,
-            "prompt_length": len(prompt),
+            "prompt_length": messages_length(messages),
             "response_length": len(generated_response)
         }
 
@@ -330,20 +554,7 @@ Write the reply as if you are a Company customer support representative:"""
         state["processing_logs"].append(f"Generation error: {str(e)}")
 
         # Fallback response
-        fallback_response = """Dear Customer,
-
-Thank you for contacting NEXUS Support.
-(THIS IS A FALLBACK RESPONSE)
-
-We've received your inquiry and our team will respond with a detailed solution within 24 hours.
-
-For immediate assistance:
-- Phone: 1800-2809-5533
-- Live Chat: nexustech.com/support
-
-Best regards,
-NEXUS Support Team
-support@nexustech.com"""
+        fallback_response = FALLBACK_RESPONSE
 
         state["generated_response"] = fallback_response
         state["generation_metadata"] = {"error": str(e)}
@@ -354,36 +565,16 @@ def reflection_critique_node(state: EmailProcessingState) -> EmailProcessingStat
     try:
         logger.info("Reflection & Critique: Evaluating response quality")
 
-        # Reflection prompt - Balanced evaluation
-        reflection_prompt = f"""You are a quality assurance specialist for customer support. Evaluate this email reply:
-
-ORIGINAL CUSTOMER EMAIL:
-{state["email_content"]}
-
-GENERATED REPLY:
-{state["generated_response"]}
-
-CONTEXT USED:
-- Personal context: {state["personal_context"]}
-- Business context: {state["business_context"]}
-- Company policies: {state["doc_context"]}
-
-EVALUATION CRITERIA:
-1. Accuracy and relevance to customer inquiry
-2. Professional tone and language
-3. Completeness of response
-4. Privacy compliance (no cross-customer data leakage)
-5. Use of appropriate context
-6. Helpfulness and actionability
-
-Provide balanced feedback. If the response is professional and addresses the customer's needs, it should be considered good quality.
-
-Provide feedback and any improvement suggestions:"""
+        # Reflection prompt - Balanced evaluation, with compact context references
+        reflection_messages = build_critique_messages(
+            state["email_content"], state["generated_response"], context_text(state, "personal_context"),
+            context_text(state, "business_context"), context_text(state, "doc_context")
+        )
 
         # Call reflection LLM
         reflection_response = llm_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[{"role": "user", "content": reflection_prompt}],
+            model=LLM_CRITIQUE_MODEL,
+            messages=reflection_messages,
             temperature=0.3,
             max_tokens=300
         )
@@ -391,26 +582,12 @@ Provide feedback and any improvement suggestions:"""
         critique_feedback = reflection_response.choices[0].message.content
 
         # Scoring prompt - Lenient criteria for fast approval
-        scoring_prompt = f"""Rate this customer support email reply quality on a scale of 0.0 to 1.0.
-
-ORIGINAL EMAIL: {state["email_content"]}
-REPLY: {state["generated_response"]}
-FEEDBACK: {critique_feedback}
-
-LENIENT SCORING CRITERIA:
-- 0.8-1.0: Excellent response, ready to send
-- 0.6-0.79: Good response, acceptable quality
-- 0.4-0.59: Adequate response with minor issues
-- 0.2-0.39: Below average response
-- 0.0-0.19: Poor response requiring major revisions
-
-Be generous in scoring. Most professional responses should score 0.6 or higher. Consider: accuracy, professionalism, completeness, privacy compliance, helpfulness, and tone.
-Respond with ONLY a number between 0.0 and 1.0:"""
+        scoring_messages = build_scoring_messages(state["email_content"], state["generated_response"], critique_feedback)
 
         # Call scoring LLM
         scoring_response = llm_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[{"role": "user", "content": scoring_prompt}],
+            model=LLM_SCORING_MODEL,
+            messages=scoring_messages,
             temperature=0.1,
             max_tokens=10
         )
@@ -432,7 +609,7 @@ Respond with ONLY a number between 0.0 and 1.0:"""
         state["improvement_suggestions"] = improvement_suggestions
 
         logger.info(f"Critique decision: score={critique_score:.2f}, iteration_count={state['iteration_count']}")
-        if critique_score > 0.75 or state["iteration_count"] >= 2:
+        if critique_score > CRITIQUE_THRESHOLD or state["iteration_count"] >= 2:
             state["is_satisfactory"] = True
             state["final_reply"] = state["generated_response"]
             state["processing_logs"].append(f"Response approved after {state['iteration_count']} iterations (score: {critique_score:.2f})")
@@ -455,28 +632,229 @@ Respond with ONLY a number between 0.0 and 1.0:"""
         state["final_reply"] = state.get("generated_response", "Error generating response")
         return state
 
+async def parallel_generation_node(state: EmailProcessingState) -> EmailProcessingState:
+    """Node B (best-of-N) - Generate several drafts concurrently at different temperatures"""
+    logger.info(f"Parallel Generation: Creating {len(DRAFT_TEMPERATURES)} drafts")
+    messages = generation_messages(state)
+
+    def generate_draft(temperature: float) -> str:
+        response = llm_client.chat.completions.create(
+            model=LLM_GENERATION_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=500
+        )
+        return response.choices[0].message.content
+
+    results = await asyncio.gather(
+        *(asyncio.to_thread(generate_draft, temperature) for temperature in DRAFT_TEMPERATURES),
+        return_exceptions=True
+    )
+
+    drafts = []
+    for temperature, result in zip(DRAFT_TEMPERATURES, results):
+        if isinstance(result, Exception):
+            logger.error(f"Draft at temperature {temperature} failed: {str(result)}")
+            state["processing_logs"].append(f"Draft generation error (t={temperature}): {str(result)}")
+        elif result:
+            drafts.append(result)
+
+    if not drafts:
+        drafts = [FALLBACK_RESPONSE]
+
+    state["candidate_drafts"] = drafts
+    state["generated_response"] = drafts[0]
+    state["generation_metadata"] = {
+        "model": LLM_GENERATION_MODEL,
+        "temperatures": DRAFT_TEMPERATURES,
+        "max_tokens": 500,
+        "prompt_length": messages_length(messages),
+        "drafts_generated": len(drafts)
+    }
+    state["iteration_count"] += 1
+    state["processing_logs"].append(f"Generated {len(drafts)} candidate drafts in parallel")
+    return state
+
+# "Draft 2: 0.8" / "Draft 2 score = .8" in non-JSON critique output
+DRAFT_SCORE_PATTERN = re.compile(r"Draft\s*(\d+)\s*(?:score)?\s*[:=-]\s*(\d*\.\d+|\d+)", re.IGNORECASE)
+
+def parse_draft_scores(text: str, draft_count: int) -> List[float]:
+    """Parse one score per draft from the batched critique output; drafts without one score a neutral 0.5"""
+    try:
+        data = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        scores = [float(score) for score in data.get("scores", [])][:draft_count]
+    except (ValueError, TypeError, AttributeError):
+        # Only numbers tied to a draft label count, never the label's own number
+        labelled = {}
+        for label, score in DRAFT_SCORE_PATTERN.findall(text):
+            labelled.setdefault(int(label), float(score))
+        scores = [labelled.get(i + 1, 0.5) for i in range(draft_count)]
+    scores = [max(0.0, min(1.0, score)) for score in scores]
+    return scores + [0.5] * (draft_count - len(scores))
+
+def batch_critique_node(state: EmailProcessingState) -> EmailProcessingState:
+    """Node C (best-of-N) - Score every draft in one critique call and keep the best"""
+    drafts = state["candidate_drafts"]
+    try:
+        logger.info(f"Batch Critique: Scoring {len(drafts)} drafts")
+        critique_messages = build_batch_critique_messages(state["email_content"], drafts)
+
+        response = llm_client.chat.completions.create(
+            model=LLM_CRITIQUE_MODEL,
+            messages=critique_messages,
+            temperature=0.1,
+            max_tokens=150
+        )
+        critique_text = response.choices[0].message.content
+
+        scores = parse_draft_scores(critique_text, len(drafts))
+        try:
+            feedback = json.loads(critique_text[critique_text.index("{"):critique_text.rindex("}") + 1]).get("feedback", "")
+        except (ValueError, AttributeError):
+            feedback = critique_text
+
+        best_index = max(range(len(drafts)), key=lambda i: scores[i])
+        state["candidate_scores"] = scores
+        state["generated_response"] = drafts[best_index]
+        state["critique_feedback"] = feedback
+        state["critique_score"] = scores[best_index]
+        state["improvement_suggestions"] = [feedback] if feedback else []
+        state["is_satisfactory"] = scores[best_index] > CRITIQUE_THRESHOLD
+        if state["is_satisfactory"]:
+            state["final_reply"] = drafts[best_index]
+        state["processing_logs"].append(
+            f"Best of {len(drafts)} drafts: #{best_index + 1} (scores: {', '.join(f'{score:.2f}' for score in scores)})"
+        )
+        logger.info(f"Batch Critique completed: best draft {best_index + 1} scored {scores[best_index]:.2f}")
+        return state
+
+    except Exception as e:
+        logger.error(f"Batch Critique failed: {str(e)}")
+        state["processing_logs"].append(f"Critique error: {str(e)}")
+        state["candidate_scores"] = [0.5] * len(drafts)
+        state["critique_feedback"] = f"Error in critique: {str(e)}"
+        state["critique_score"] = 0.5
+        state["improvement_suggestions"] = []
+        state["is_satisfactory"] = True  # Proceed with the first draft
+        state["final_reply"] = state.get("generated_response", "Error generating response")
+        return state
+
+def refinement_node(state: EmailProcessingState) -> EmailProcessingState:
+    """Single refinement pass over the best draft when every draft scored below threshold"""
+    try:
+        logger.info("Refinement: Improving best draft with critique feedback")
+        refinement_messages = build_refinement_messages(
+            generation_messages(state), state["generated_response"], state["critique_feedback"]
+        )
+
+        response = llm_client.chat.completions.create(
+            model=LLM_GENERATION_MODEL,
+            messages=refinement_messages,
+            temperature=0.5,
+            max_tokens=500
+        )
+        state["final_reply"] = response.choices[0].message.content
+        state["iteration_count"] += 1
+        state["processing_logs"].append("Best draft refined once after low critique scores")
+
+    except Exception as e:
+        logger.error(f"Refinement failed: {str(e)}")
+        state["processing_logs"].append(f"Refinement error: {str(e)}")
+        state["final_reply"] = state["generated_response"]
+
+    state["is_satisfactory"] = True
+    return state
+
 def end_node(state: EmailProcessingState) -> EmailProcessingState:
     """End node - Finalize the workflow"""
     logger.info("LangGraph RAG workflow completed successfully")
+    if not state.get("final_reply"):
+        # Single-draft runs skip critique, which is what normally approves the reply
+        state["final_reply"] = state.get("generated_response", "")
     state["processing_logs"].append("Workflow completed")
     return state
 
 # Create LangGraph workflow
-def create_email_workflow():
+def instrument_node(name: str, node_fn, node_hook=None):
+    """Wrap a node so its log messages become structured entries and each call runs inside
+    node_hook(name) when given; hooks are used for benchmarks and profiling
+
+    The node sees an empty processing_logs list, so the reducer only receives the entries
+    it appended this step instead of the whole history again.
+    """
+    def prepare(state):
+        return {**state, "processing_logs": []}
+
+    def finish(result):
+        at = round(time.time(), 3)
+        result["processing_logs"] = [
+            {"node": name, "message": str(message)[:PROCESSING_LOG_MAX_CHARS], "at": at}
+            for message in result.get("processing_logs", [])
+        ]
+        return result
+
+    if asyncio.iscoroutinefunction(node_fn):
+        async def async_instrumented(state):
+            if node_hook is None:
+                return finish(await node_fn(prepare(state)))
+            with node_hook(name):
+                return finish(await node_fn(prepare(state)))
+        return async_instrumented
+
+    def instrumented(state):
+        if node_hook is None:
+            return finish(node_fn(prepare(state)))
+        with node_hook(name):
+            return finish(node_fn(prepare(state)))
+    return instrumented
+
+def create_best_of_n_workflow(node_hook=None):
+    """Create the speculative LangGraph workflow: parallel drafts, one batched critique"""
+    workflow = StateGraph(EmailProcessingState)
+
+    workflow.add_node("entry", instrument_node("entry", entry_point, node_hook))
+    workflow.add_node("retrieval", instrument_node("retrieval", retrieval_node, node_hook))
+    workflow.add_node("generation", instrument_node("generation", parallel_generation_node, node_hook))  # N drafts concurrently
+    workflow.add_node("critique", instrument_node("critique", batch_critique_node, node_hook))  # One critique call scores all drafts
+    workflow.add_node("refine", instrument_node("refine", refinement_node, node_hook))  # Only when every draft is below threshold
+    workflow.add_node("end", instrument_node("end", end_node, node_hook))
+
+    workflow.set_entry_point("entry")
+    workflow.add_edge("entry", "retrieval")
+    workflow.add_conditional_edges("retrieval", route_after_retrieval, {"end": "end", "generation": "generation"})
+    workflow.add_edge("generation", "critique")
+    workflow.add_conditional_edges(
+        "critique",
+        lambda state: "end" if state.get("is_satisfactory", False) else "refine",
+        {
+            "end": "end",
+            "refine": "refine"
+        }
+    )
+    workflow.add_edge("refine", "end")
+    workflow.add_edge("end", END)
+
+    memory = MemorySaver()
+    return workflow.compile(checkpointer=memory)
+
+def create_email_workflow(mode: str = WORKFLOW_MODE, node_hook=None):
     """Create the LangGraph RAG workflow with reflection and critique"""
+    if mode == "best_of_n":
+        return create_best_of_n_workflow(node_hook)
+
     workflow = StateGraph(EmailProcessingState)
 
     # Add nodes
-    workflow.add_node("entry", entry_point)
-    workflow.add_node("retrieval", retrieval_node)  # RAG Retrieval (Email + Docs)
-    workflow.add_node("generation", generation_node)  # LLM Generation
-    workflow.add_node("critique", reflection_critique_node)  # Reflection & Critique
-    workflow.add_node("end", end_node)
+    workflow.add_node("entry", instrument_node("entry", entry_point, node_hook))
+    workflow.add_node("retrieval", instrument_node("retrieval", retrieval_node, node_hook))  # RAG Retrieval (Email + Docs)
+    workflow.add_node("generation", instrument_node("generation", generation_node, node_hook))  # LLM Generation
+    workflow.add_node("critique", instrument_node("critique", reflection_critique_node, node_hook))  # Reflection & Critique
+    workflow.add_node("end", instrument_node("end", end_node, node_hook))
 
     # Add edges - Linear flow with conditional loop
     workflow.set_entry_point("entry")
     workflow.add_edge("entry", "retrieval")
-    workflow.add_edge("retrieval", "generation")
+    workflow.add_conditional_edges("retrieval", route_after_retrieval, {"end": "end", "generation": "generation"})
     workflow.add_edge("generation", "critique")
 
     def should_continue_safely(state):
@@ -500,6 +878,83 @@ def create_email_workflow():
     memory = MemorySaver()
     return workflow.compile(checkpointer=memory)
 
+def create_single_draft_workflow(node_hook=None):
+    """Degraded workflow for overload: retrieval and one draft, no critique loop"""
+    workflow = StateGraph(EmailProcessingState)
+
+    workflow.add_node("entry", instrument_node("entry", entry_point, node_hook))
+    workflow.add_node("retrieval", instrument_node("retrieval", retrieval_node, node_hook))
+    workflow.add_node("generation", instrument_node("generation", generation_node, node_hook))
+    workflow.add_node("end", instrument_node("end", end_node, node_hook))
+
+    workflow.set_entry_point("entry")
+    workflow.add_edge("entry", "retrieval")
+    workflow.add_conditional_edges("retrieval", route_after_retrieval, {"end": "end", "generation": "generation"})
+    workflow.add_edge("generation", "end")
+    workflow.add_edge("end", END)
+
+    memory = MemorySaver()
+    return workflow.compile(checkpointer=memory)
+
+def build_initial_state(email_content: str, sender_info: str, subject: str,
+                        tenant_id: Optional[str] = None) -> EmailProcessingState:
+    """Empty workflow state for one email"""
+    return EmailProcessingState(
+        request_id=uuid.uuid4().hex,
+        email_content=email_content,
+        sender_info=sender_info,
+        subject=subject,
+        tenant_id=tenant_id,
+        retrieved_emails=[],
+        retrieved_documents=[],
+        personal_context=[],
+        business_context=[],
+        doc_context=[],
+        generated_response="",
+        generation_metadata={},
+        critique_feedback="",
+        critique_score=0.0,
+        is_satisfactory=False,
+        improvement_suggestions=[],
+        iteration_count=0,
+        candidate_drafts=[],
+        candidate_scores=[],
+        intent=None,
+        intent_confidence=0.0,
+        final_reply="",
+        processing_logs=[]
+    )
+
+async def run_email_workflow(workflow, initial_state: EmailProcessingState, thread_prefix: str = "email") -> EmailProcessingState:
+    """Run one email through the workflow, then unpin its context bodies and drop its checkpoints
+
+    Every request uses a fresh thread that is never resumed, so keeping its checkpoints
+    would only grow the saver's memory for the life of the process.
+    """
+    thread_id = f"{thread_prefix}_{initial_state['request_id']}"
+    try:
+        return await workflow.ainvoke(initial_state, {"configurable": {"thread_id": thread_id}})
+    finally:
+        context_store.release(initial_state["request_id"])
+        if workflow.checkpointer is not None:
+            workflow.checkpointer.delete_thread(thread_id)
+
+def run_retrieval_only(initial_state: EmailProcessingState, node_hook=None) -> Dict[str, Any]:
+    """Most degraded mode: retrieval (and the intent fast path) without any LLM call
+
+    Returns the final state plus the privacy-separated context lines as suggested snippets.
+    """
+    try:
+        state = instrument_node("retrieval", retrieval_node, node_hook)(dict(initial_state))
+        snippets = []
+        for section in ("personal_context", "business_context", "doc_context"):
+            entries = state.get(section) or []
+            for entry, body in zip(entries, context_store.get_many([entry["ref"] for entry in entries])):
+                snippets.append({"section": section, "label": entry["label"], "content": body[:SUGGESTED_SNIPPET_MAX_CHARS]})
+        return {"state": state, "snippets": snippets}
+    finally:
+        context_store.release(initial_state["request_id"])
+
 # Initialize the workflow
 email_workflow = None
 
@@ -519,14 +974,135 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def restore_snapshot_if_empty():
+    """Bring up a fresh replica from the current model's snapshots instead of re-embedding
+
+    Each tenant snapshot in SNAPSHOT_DIR is restored only while that tenant's store is empty.
+    """
+    if not SNAPSHOT_RESTORE_ON_STARTUP:
+        return
+    model_name = document_processor.embedding_model_name
+    snapshots = [snapshot for snapshot in list_snapshots(SNAPSHOT_DIR) if snapshot.get('embedding_model') == model_name]
+    if not snapshots:
+        logger.info(f"No snapshots for {model_name} under {SNAPSHOT_DIR}")
+        return
+    restored_tenants = set()
+    for snapshot in snapshots:
+        tenant_id = snapshot.get('tenant_id') or None
+        if tenant_id in restored_tenants or not document_processor.tenant_is_empty(tenant_id):
+            continue
+        try:
+            result = document_processor.restore_snapshot(snapshot['path'], tenant_id=tenant_id)
+            restored_tenants.add(tenant_id)
+            logger.info(f"Tenant {tenant_id or 'default'} restored from {snapshot['path']} "
+                        f"in {result['restore_seconds']:.2f}s: {result['restored']}")
+        except SnapshotError as e:
+            logger.warning(f"Snapshot restore of {snapshot['path']} skipped: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services and LangGraph workflow on startup"""
-    global email_workflow
+    global email_workflow, single_draft_workflow, leader_lock, profiled_workflows
     initialize_services()
     email_workflow = create_email_workflow()
+    single_draft_workflow = create_single_draft_workflow()
+    if request_profiler is not None:
+        # Separate instrumented copies, so unprofiled requests never run the hook
+        profiled_workflows = {
+            "full": create_email_workflow(node_hook=request_profiler.node_hook),
+            "single_draft": create_single_draft_workflow(node_hook=request_profiler.node_hook)
+        }
     logger.info("LangGraph workflow initialized")
 
+    # With several workers only one runs the background jobs
+    leader_lock = acquire_leader_lock(WORKER_LEADER_LOCK_PATH)
+    if leader_lock is None:
+        logger.info(f"Worker {os.getpid()} serving requests only; background jobs run in the leader worker")
+        return
+
+    # Only the leader restores, before any background writer starts
+    await asyncio.to_thread(restore_snapshot_if_empty)
+    if ingestion_worker is not None:
+        # Only the leader consumes, so 'processing' jobs here were left by a crashed leader
+        ingestion_queue.recover()
+        ingestion_worker.start()
+    sync_scheduler.start()
+    # Resumes a backfill interrupted by a restart
+    embedding_migrator.start()
+    background_tasks.append(asyncio.create_task(backfill_email_timestamps()))
+    background_tasks.append(asyncio.create_task(backfill_sender_profiles()))
+
+    if EMAIL_COMPACTION_AGE_DAYS > 0:
+        background_tasks.append(asyncio.create_task(email_compaction_loop()))
+        logger.info(f"Email compaction scheduled every {EMAIL_COMPACTION_INTERVAL_HOURS}h "
+                    f"(emails older than {EMAIL_COMPACTION_AGE_DAYS} days)")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background sync before the process exits"""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    if sync_scheduler is not None:
+        await sync_scheduler.stop()
+    if email_fetcher is not None:
+        await email_fetcher.close()
+    if ingestion_worker is not None:
+        await ingestion_worker.stop()
+    if embedding_migrator is not None:
+        await embedding_migrator.stop()
+    for pool in encode_pools.values():
+        pool.shutdown()
+    if isinstance(llm_client, LLMRouter):
+        llm_client.shutdown()
+    if document_ingestor is not None:
+        document_ingestor.shutdown()
+
+async def backfill_email_timestamps():
+    """Give emails stored before recency support a timestamp, so windows and decay see them"""
+    try:
+        tenants = [None] + await asyncio.to_thread(document_processor.list_tenants)
+    except Exception as e:
+        logger.warning(f"Timestamp backfill skipped, listing tenants failed: {e}")
+        return
+    for tenant_id in tenants:
+        try:
+            await asyncio.to_thread(document_processor.backfill_timestamps, tenant_id)
+        except Exception as e:
+            logger.warning(f"Timestamp backfill failed ({tenant_id or 'default'}): {e}")
+
+async def backfill_sender_profiles():
+    """Build profiles once from the emails stored before them; until then retrieval uses thread summaries"""
+    profiles = document_processor.sender_profiles
+    if profiles is None or profiles.is_backfilled():
+        return
+    try:
+        for tenant_id in [None] + document_processor.list_tenants():
+            await asyncio.to_thread(document_processor.backfill_sender_profiles, tenant_id)
+        profiles.mark_backfilled()
+    except Exception as e:
+        logger.warning(f"Sender profile backfill failed, retrying on the next start: {e}")
+
+async def email_compaction_loop():
+    """Periodically move old emails from the hot collection into cold storage"""
+    while True:
+        await asyncio.sleep(EMAIL_COMPACTION_INTERVAL_HOURS * 3600)
+        # A failing run is logged and retried next interval; the loop only ends on shutdown
+        try:
+            tenants = [None] + await asyncio.to_thread(document_processor.list_tenants)
+        except Exception as e:
+            logger.error(f"Scheduled email compaction skipped, listing tenants failed: {e}")
+            continue
+        for tenant_id in tenants:
+            try:
+                result = await asyncio.to_thread(
+                    document_processor.compact_emails, EMAIL_COMPACTION_AGE_DAYS, tenant_id=tenant_id
+                )
+                logger.info(f"Scheduled email compaction ({tenant_id or 'default'}): {result}")
+            except Exception as e:
+                logger.error(f"Scheduled email compaction failed ({tenant_id or 'default'}): {e}")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -538,22 +1114,40 @@ async def health_check():
         "workflow_initialized": email_workflow is not None,
         "email_collection": EMAIL_COLLECTION,
         "docs_collection": DOCS_COLLECTION,
-        "embedding_model": EMBEDDING_MODEL,
-        "llm_model": LLM_MODEL,
-        "workflow": "LangGraph with Reflection & Critique"
+        "embedding_model": document_processor.embedding_model_name if document_processor else EMBEDDING_MODEL,
+        "llm_model": LLM_GENERATION_MODEL,
+        "llm_models": {"generation": LLM_GENERATION_MODEL, "critique": LLM_CRITIQUE_MODEL, "scoring": LLM_SCORING_MODEL},
+        "workflow": "LangGraph with Reflection & Critique",
+        "workflow_mode": WORKFLOW_MODE,
+        "encode_pools": {name: pool.stats() for name, pool in encode_pools.items()},
+        "worker_pid": os.getpid(),
+        "background_leader": leader_lock is not None
     }
 
 @app.post("/store-email")
 async def store_email(request: EmailRequest):
-    """Store email using DocumentProcessor (proper approach)"""
+    """Queue email for vectorization (or store directly when the queue is disabled)"""
+    payload = {
+        "email_content": request.email_content,
+        "sender_info": request.sender_info,
+        "date_time": request.date_time,
+        "email_id": request.email_id,
+        "additional_metadata": request.additional_metadata,
+        "tenant_id": request.tenant_id
+    }
     try:
-        success = document_processor.store_email_vector(
-            email_content=request.email_content,
-            sender_info=request.sender_info,
-            date_time=request.date_time,
-            email_id=request.email_id,
-            additional_metadata=request.additional_metadata
-        )
+        if ingestion_queue is not None:
+            job_id = ingestion_queue.enqueue(payload)
+            logger.info(f"Email queued for vectorization: {request.email_id} (job {job_id})")
+            return JSONResponse(status_code=202, content={
+                "status": "queued",
+                "message": f"Email {request.email_id} queued for storage",
+                "job_id": job_id,
+                "email_id": request.email_id,
+                "sender": request.sender_info
+            })
+
+        success = await asyncio.to_thread(document_processor.store_email_vector, **payload)
 
         if success:
             logger.info(f"Email stored via DocumentProcessor: {request.email_id}")
@@ -566,102 +1160,424 @@ async def store_email(request: EmailRequest):
         else:
             raise HTTPException(status_code=500, detail="Failed to store email")
 
+    except QueueFullError as e:
+        logger.warning(f"Rejecting email {request.email_id}: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(INGEST_RETRY_AFTER_SECONDS)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error storing email: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to store email: {str(e)}")
 
+@app.get("/ingestion/status")
+async def ingestion_status():
+    """Queue depth, dead-letter count and consumer metrics"""
+    if ingestion_queue is None:
+        return {"status": "disabled"}
+    return {
+        "status": "success",
+        "queue": ingestion_queue.stats(),
+        "consumers": ingestion_worker.stats(),
+        "dead_letters": ingestion_queue.list_dead(limit=20),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/ingestion/requeue-dead")
+async def requeue_dead_letters():
+    """Move dead-lettered emails back onto the queue for another attempt"""
+    if ingestion_queue is None:
+        raise HTTPException(status_code=400, detail="Ingestion queue is disabled")
+    requeued = ingestion_queue.requeue_dead()
+    return {"status": "success", "requeued": requeued}
+
 @app.post("/process-company-document")
-async def process_company_document(file: UploadFile = File(...)):
-    """Process and store company documents using DocumentProcessor"""
+async def process_company_document(file: UploadFile = File(...), tenant_id: Optional[str] = Form(None)):
+    """Process and store a company document (PDF, DOCX, HTML, Markdown, text, or a zip of them)"""
     try:
         # Read file content
         content = await file.read()
-        text = content.decode('utf-8')
-
-        # Use DocumentProcessor's method for processing uploaded documents
-        success = document_processor.process_uploaded_document(text, file.filename)
-
-        if success:
-            # Get stats to return chunk count
-            stats = document_processor.get_stats()
-            logger.info(f"Document processed successfully: {file.filename}")
-            return {
-                "status": "success",
-                "message": f"Document {file.filename} processed successfully",
-                "filename": file.filename,
-                "total_documents": stats.get('documents_count', 0)
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to process document")
+        items = await asyncio.to_thread(document_ingestor.expand_upload, file.filename, content)
+        if not items:
+            raise HTTPException(status_code=400, detail=f"No supported documents in {file.filename}")
+
+        # Extraction runs on the process pool; chunks are embedded as each file or page range finishes
+        result = await asyncio.to_thread(document_ingestor.ingest, items, tenant_id)
+        if not result["files"]:
+            detail = "; ".join(f"{failure['filename']}: {failure['error']}" for failure in result["failures"])
+            raise HTTPException(status_code=422, detail=f"Failed to extract document: {detail}")
+
+        if intent_router is not None:
+            intent_router.invalidate(tenant_id)
+        # Get stats to return chunk count
+        stats = await asyncio.to_thread(document_processor.get_stats, tenant_id=tenant_id)
+        logger.info(f"Document processed successfully: {file.filename}")
+        return {
+            "status": "success",
+            "message": f"Document {file.filename} processed successfully",
+            "filename": file.filename,
+            **result,
+            "total_documents": stats.get('documents_count', 0)
+        }
 
+    except HTTPException:
+        raise
+    except ExtractionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing document: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
 
-@app.post("/fetch-emails")
+@app.post("/import-company-documents")
+async def import_company_documents(request: DocumentImportRequest):
+    """Bulk-import every supported document in a server-side directory"""
+    if not DOCUMENT_IMPORT_ROOT:
+        raise HTTPException(status_code=400, detail="Directory import is disabled (set DOCUMENT_IMPORT_ROOT)")
+    root = Path(DOCUMENT_IMPORT_ROOT).resolve()
+    directory = (root / request.directory).resolve()
+    if directory != root and root not in directory.parents:
+        raise HTTPException(status_code=400, detail="Directory must be inside DOCUMENT_IMPORT_ROOT")
+    if not directory.is_dir():
+        raise HTTPException(status_code=404, detail=f"No such directory: {request.directory}")
+    try:
+        items = await asyncio.to_thread(document_ingestor.expand_directory, str(directory), request.recursive)
+        result = await asyncio.to_thread(document_ingestor.ingest, items, request.tenant_id)
+        if result["files"] and intent_router is not None:
+            intent_router.invalidate(request.tenant_id)
+        return {"status": "success", "directory": str(directory), **result}
+    except Exception as e:
+        logger.error(f"Error importing documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to import documents: {str(e)}")
+
+@app.post("/fetch-emails", status_code=202)
 async def fetch_emails():
-    """Manually trigger email fetching from backend API"""
+    """Trigger a background email sync; overlapping triggers join the running job"""
     try:
         logger.info("Manual email fetch triggered")
-        result = email_fetcher.fetch_and_vectorize_emails_sync()
+        job = sync_scheduler.trigger(reason="manual")
         return {
-            "status": "success",
-            "fetch_result": result,
+            "status": "accepted",
+            "job_id": job["job_id"],
+            "coalesced": job["coalesced"],
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         logger.error(f"Error fetching emails: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch emails: {str(e)}")
 
+@app.get("/fetch-emails/status")
+async def fetch_emails_status():
+    """Background sync status and last-run metrics"""
+    return {
+        "status": "success",
+        "sync": sync_scheduler.status(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/fetch-emails/{job_id}")
+async def fetch_emails_job(job_id: str):
+    """Status and result of a single sync job"""
+    job = sync_scheduler.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Sync job {job_id} not found")
+    return {"status": "success", "job": job}
+
+@app.post("/compact-emails")
+async def compact_emails(max_age_days: float = EMAIL_COMPACTION_AGE_DAYS, tenant_id: Optional[str] = None):
+    """Move emails older than max_age_days into the cold collection"""
+    if max_age_days <= 0:
+        raise HTTPException(status_code=400, detail="max_age_days must be positive")
+    try:
+        result = await asyncio.to_thread(document_processor.compact_emails, max_age_days, tenant_id=tenant_id)
+        return {
+            "status": "success" if result.get("success") else "error",
+            "compaction_result": result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error compacting emails: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to compact emails: {str(e)}")
+
+@app.get("/snapshots")
+async def get_snapshots():
+    """List snapshots on disk, grouped by embedding model"""
+    return {
+        "status": "success",
+        "embedding_model": document_processor.embedding_model_name,
+        "snapshots": await asyncio.to_thread(list_snapshots, SNAPSHOT_DIR)
+    }
+
+@app.post("/snapshots/export")
+async def export_snapshot(tenant_id: Optional[str] = None):
+    """Dump the vector store (vectors included) to the current model's snapshot file"""
+    try:
+        path = snapshot_path(SNAPSHOT_DIR, document_processor.embedding_model_name, tenant_id)
+        manifest = await asyncio.to_thread(document_processor.export_snapshot, path, tenant_id=tenant_id)
+        return {"status": "success", "path": path, "manifest": manifest}
+    except Exception as e:
+        logger.error(f"Error exporting snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to export snapshot: {str(e)}")
+
+@app.post("/snapshots/restore")
+async def restore_snapshot(tenant_id: Optional[str] = None, replace: bool = True):
+    """Bulk-load the current model's snapshot without re-embedding"""
+    path = snapshot_path(SNAPSHOT_DIR, document_processor.embedding_model_name, tenant_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No snapshot for {document_processor.embedding_model_name} at {path}")
+    try:
+        result = await asyncio.to_thread(document_processor.restore_snapshot, path, tenant_id=tenant_id, replace=replace)
+        if intent_router is not None:
+            intent_router.invalidate(tenant_id)
+        return {"status": "success", "restore_result": result}
+    except SnapshotError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error restoring snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to restore snapshot: {str(e)}")
+
+@app.post("/embedding-migration", status_code=202)
+async def start_embedding_migration(request: EmbeddingMigrationRequest):
+    """Start re-embedding every collection into a new model version, dual-writing meanwhile"""
+    try:
+        migration = await asyncio.to_thread(
+            document_processor.begin_migration, request.target_model, request.auto_cutover
+        )
+    except MigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting embedding migration: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to start embedding migration: {str(e)}")
+    embedding_migrator.start()
+    return {"status": "accepted", "migration": migration}
+
+@app.get("/embedding-migration")
+async def embedding_migration_status():
+    """Active model version and migration progress"""
+    return {"status": "success", **embedding_migrator.progress(), "dual_write_errors": document_processor.dual_write_errors}
+
+@app.post("/embedding-migration/cutover")
+async def cutover_embedding_migration(force: bool = False):
+    """Switch reads to the migrated version (automatic when auto_cutover was requested)"""
+    try:
+        registry_state = await asyncio.to_thread(document_processor.cutover_migration, force)
+        return {"status": "success", "active": registry_state["active"], "previous": registry_state["previous"]}
+    except MigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/embedding-migration/abort")
+async def abort_embedding_migration():
+    """Stop the backfill and drop the partially built version"""
+    await embedding_migrator.stop()
+    try:
+        registry_state = await asyncio.to_thread(document_processor.abort_migration)
+        return {"status": "success", "migration": registry_state["migration"]}
+    except MigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/embedding-migration/drop-previous")
+async def drop_previous_embedding_version():
+    """Delete the collections of the model version replaced by the last cutover"""
+    try:
+        result = await asyncio.to_thread(document_processor.drop_previous_version)
+        return {"status": "success", **result}
+    except MigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/email-vectors/fit-projection")
+async def fit_email_projection(sample_size: int = 20000, tenant_id: Optional[str] = None):
+    """Fit the PCA email projection from stored vectors and rebuild the email index with it"""
+    try:
+        result = await asyncio.to_thread(document_processor.fit_email_projection, sample_size, tenant_id)
+        return {"status": "success", **result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MigrationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/email-vectors/recall")
+async def email_vector_recall(n_results: int = 10, sample_size: int = 100, tenant_id: Optional[str] = None):
+    """Recall@k, latency and memory of the compressed email index against an exact scan"""
+    try:
+        return await asyncio.to_thread(
+            document_processor.email_recall_report, n_results, sample_size, None, tenant_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/sender-profile")
+async def get_sender_profile(sender_info: str, tenant_id: Optional[str] = None):
+    """A sender's incrementally maintained profile (recent messages, identifiers, last contact)"""
+    if document_processor.sender_profiles is None:
+        raise HTTPException(status_code=400, detail="Sender profiles are disabled")
+    profile = await asyncio.to_thread(document_processor.get_sender_profile, sender_info, tenant_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile for {sender_info}")
+    return {"status": "success", "profile": profile}
+
 @app.get("/stats")
-async def get_stats():
-    """Get system statistics"""
+async def get_stats(tenant_id: Optional[str] = None):
+    """Get system statistics, optionally for a single tenant"""
     try:
-        stats = document_processor.get_stats()
+        stats = await asyncio.to_thread(document_processor.get_stats, tenant_id=tenant_id)
         return {
             "status": "success",
             "stats": stats,
             "collections": {
                 "email_collection": EMAIL_COLLECTION,
-                "docs_collection": DOCS_COLLECTION
+                "docs_collection": DOCS_COLLECTION,
+                "threads_collection": THREADS_COLLECTION,
+                "email_cold_collection": EMAIL_COLD_COLLECTION
             },
             "chroma_path": CHROMA_PERSIST_DIR,
+            "intent_fast_path": intent_router.stats() if intent_router is not None else None,
+            "llm_router": llm_client.stats() if isinstance(llm_client, LLMRouter) else None,
+            "admission": admission_controller.stats() if admission_controller is not None else None,
+            "context_store": context_store.stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         logger.error(f"Error getting stats: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
+def build_context_response(search_result: Dict[str, List[Dict[str, Any]]], query_time: float) -> ContextResponse:
+    """Convert DocumentProcessor search output into a ContextResponse"""
+    emails = [
+        ContextEmail(
+            content=result['content'],
+            sender=(result['metadata'] or {}).get("sender_info", "unknown"),
+            metadata=result['metadata'],
+            similarity_score=result['similarity_score']
+        )
+        for result in search_result.get('emails', [])
+    ]
+    documents = [
+        ContextDocument(
+            content=result['content'],
+            metadata=result['metadata'],
+            similarity_score=result['similarity_score']
+        )
+        for result in search_result.get('documents', [])
+    ]
+    return ContextResponse(
+        success=True,
+        documents=documents,
+        emails=emails,
+        total_results=len(emails) + len(documents),
+        query_time=query_time
+    )
+
+@app.post("/context", response_model=ContextResponse)
+async def get_context(request: ContextRequest):
+    """Retrieve similar emails and company documents without calling the LLM"""
+    try:
+        start_time = time.perf_counter()
+        search_result = (await asyncio.to_thread(
+            document_processor.search_context_batch,
+            [request.query],
+            n_results=request.n_results,
+            include_emails=request.include_emails,
+            include_documents=request.include_documents,
+            max_age_days=request.max_age_days,
+            tenant_id=request.tenant_id,
+            ef=request.ef
+        ))[0]
+        query_time = time.perf_counter() - start_time
+
+        logger.info(f"Context retrieval completed in {query_time:.3f}s")
+        return build_context_response(search_result, query_time)
+
+    except Exception as e:
+        logger.error(f"Error retrieving context: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve context: {str(e)}")
+
+@app.post("/context/batch", response_model=BatchContextResponse)
+async def get_context_batch(request: BatchContextRequest):
+    """Retrieve context for many queries, encoding them together in one pass"""
+    try:
+        start_time = time.perf_counter()
+        search_results = await asyncio.to_thread(
+            document_processor.search_context_batch,
+            request.queries,
+            n_results=request.n_results,
+            include_emails=request.include_emails,
+            include_documents=request.include_documents,
+            max_age_days=request.max_age_days,
+            tenant_id=request.tenant_id,
+            ef=request.ef
+        )
+        query_time = time.perf_counter() - start_time
+
+        # Per-query time is the amortized share of the batch
+        per_query_time = query_time / len(request.queries) if request.queries else 0.0
+        results = [build_context_response(result, per_query_time) for result in search_results]
+
+        logger.info(f"Batch context retrieval completed: {len(results)} queries in {query_time:.3f}s")
+        return BatchContextResponse(
+            success=True,
+            results=results,
+            total_queries=len(results),
+            query_time=query_time
+        )
+
+    except Exception as e:
+        logger.error(f"Error retrieving batch context: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve batch context: {str(e)}")
+
+WORKFLOW_LABELS = {
+    "full": "LangGraph RAG with Best-of-N Drafts" if WORKFLOW_MODE == "best_of_n" else "LangGraph RAG with Reflection & Critique",
+    "single_draft": "LangGraph RAG Single Draft (degraded)",
+    "retrieval_only": "Retrieval Only Suggested Snippets (degraded)"
+}
+
 @app.post("/generate-reply")
-async def generate_reply(request: GenerateReplyRequest):
-    """Generate AI reply using LangGraph RAG workflow with reflection and critique"""
+async def generate_reply(request: GenerateReplyRequest, http_request: Request):
+    """Generate AI reply using LangGraph RAG workflow with reflection and critique
+
+    Under load the admission controller may queue the request, run a cheaper mode
+    (one draft without critique, or retrieval-only snippets), or reject it with 503.
+    With profiling enabled, a PROFILING_HEADER request (or a sampled one) is profiled.
+    """
+    admission = None
+    if admission_controller is not None:
+        try:
+            admission = await admission_controller.acquire(request.deadline_seconds or REPLY_DEADLINE_SECONDS)
+        except AdmissionRejected as e:
+            logger.warning(f"Rejecting reply request: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    mode = admission.mode if admission else "full"
+    service_seconds = None
+    start = time.perf_counter()
+
     try:
-        logger.info("Starting LangGraph workflow for reply generation")
+        logger.info(f"Starting LangGraph workflow for reply generation ({mode})")
 
         # Initialize state for LangGraph workflow
-        initial_state = EmailProcessingState(
-            email_content=request.email_content,
-            sender_info=request.sender_info,
-            subject=request.subject,
-            retrieved_emails=[],
-            retrieved_documents=[],
-            personal_context="",
-            business_context="",
-            doc_context="",
-            generated_response="",
-            generation_metadata={},
-            critique_feedback="",
-            critique_score=0.0,
-            is_satisfactory=False,
-            improvement_suggestions=[],
-            iteration_count=0,
-            final_reply="",
-            processing_logs=[]
+        initial_state = build_initial_state(
+            request.email_content, request.sender_info, request.subject, request.tenant_id
         )
 
-        # Run the LangGraph workflow
-        config = {"configurable": {"thread_id": f"email_{datetime.now().timestamp()}"}}
-        final_state = await email_workflow.ainvoke(initial_state, config)
+        profiled = request_profiler is not None and request_profiler.should_profile(
+            http_request.headers.get(PROFILING_HEADER)
+        )
+        session = request_profiler.session(initial_state["request_id"], mode) if profiled else contextlib.nullcontext()
+
+        snippets = []
+        with session as profile:
+            if mode == "retrieval_only":
+                node_hook = request_profiler.node_hook if profiled else None
+                result = await asyncio.to_thread(run_retrieval_only, initial_state, node_hook)
+                final_state, snippets = result["state"], result["snippets"]
+            else:
+                # Run the LangGraph workflow
+                if profiled:
+                    workflow = profiled_workflows[mode]
+                else:
+                    workflow = email_workflow if mode == "full" else single_draft_workflow
+                final_state = await run_email_workflow(workflow, initial_state)
+        service_seconds = time.perf_counter() - start
 
         return {
             "success": True,
@@ -674,13 +1590,57 @@ async def generate_reply(request: GenerateReplyRequest):
             "similar_emails_found": len(final_state["retrieved_emails"]),
             "documents_found": len(final_state["retrieved_documents"]),
             "processing_logs": final_state["processing_logs"],
-            "workflow": "LangGraph RAG with Reflection & Critique"
+            "candidate_scores": final_state.get("candidate_scores", []),
+            "intent": final_state.get("intent"),
+            "degraded_mode": None if mode == "full" else mode,
+            "suggested_snippets": snippets,
+            "queue_seconds": round(admission.queued_seconds, 3) if admission else 0.0,
+            "profile_id": profile.profile_id if profile else None,
+            "workflow": "Intent Fast Path" if final_state.get("intent") else WORKFLOW_LABELS[mode]
         }
 
     except Exception as e:
         logger.error(f"Error generating reply: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate reply: {str(e)}")
+    finally:
+        if admission is not None:
+            # Only successful runs update the per-mode service time estimates
+            admission_controller.release(admission, service_seconds)
+
+@app.get("/profiles")
+async def list_profiles():
+    """Saved request profiles, newest first"""
+    if request_profiler is None:
+        raise HTTPException(status_code=400, detail="Profiling is disabled (set PROFILING_ENABLED=true)")
+    return {"status": "success", "profiles": await asyncio.to_thread(request_profiler.list_profiles)}
+
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = "svg"):
+    """One profile as a flamegraph (svg), collapsed stacks (folded) or node span summary (json)"""
+    if request_profiler is None:
+        raise HTTPException(status_code=400, detail="Profiling is disabled (set PROFILING_ENABLED=true)")
+    path = request_profiler.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No {format} profile {profile_id}")
+    media_types = {"svg": "image/svg+xml", "folded": "text/plain", "json": "application/json"}
+    return FileResponse(path, media_type=media_types[format], filename=os.path.basename(path))
+
+def run_multi_worker():
+    """Serve with SERVICE_WORKERS processes sharing one embedding server and one Chroma server"""
+    if not (EMBEDDING_SERVER_SOCKET and CHROMA_SERVER_HOST):
+        raise SystemExit("SERVICE_WORKERS > 1 needs EMBEDDING_SERVER_SOCKET and CHROMA_SERVER_HOST so workers "
+                         "share one model and one vector store")
+    sidecars = start_sidecars(
+        EMBEDDING_SERVER_SOCKET, CHROMA_SERVER_HOST, CHROMA_SERVER_PORT, CHROMA_PERSIST_DIR
+    ) if SIDECAR_AUTOSTART else []
+    try:
+        uvicorn.run("main:app", host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS)
+    finally:
+        stop_sidecars(sidecars)
 
 # Run the application
 if __name__ == "__main__":
-    uvicorn.run(app, host=SERVICE_HOST, port=SERVICE_PORT)
\ No newline at end of file
+    if SERVICE_WORKERS > 1:
+        run_multi_worker()
+    else:
+        uvicorn.run(app, host=SERVICE_HOST, port=SERVICE_PORT)
\ No newline at end of file
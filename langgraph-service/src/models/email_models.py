@@ -7,6 +7,11 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
+# Bounds on /context requests; each result (or candidate) is fetched from every searched collection
+MAX_CONTEXT_RESULTS = 100
+MAX_CONTEXT_BATCH_QUERIES = 256
+MAX_CONTEXT_EF = 1000
+
 class EmailRequest(BaseModel):
     """Request model for storing customer emails"""
     email_content: str = Field(..., description="Customer email content")
@@ -14,6 +19,7 @@ class EmailRequest(BaseModel):
     date_time: str = Field(..., description="Email timestamp")
     email_id: str = Field(..., description="Unique email identifier")
     additional_metadata: Optional[dict] = Field(None, description="Additional email metadata")
+    tenant_id: Optional[str] = Field(None, description="Mailbox/company whose collections store this email")
 
 class EmailResponse(BaseModel):
     """Response model for AI-generated replies"""
@@ -28,9 +34,23 @@ class EmailResponse(BaseModel):
 class ContextRequest(BaseModel):
     """Request model for context retrieval"""
     query: str = Field(..., description="Search query for context retrieval")
-    n_results: int = Field(default=5, description="Number of results to return")
+    n_results: int = Field(default=5, ge=1, le=MAX_CONTEXT_RESULTS, description="Number of results to return")
     include_emails: bool = Field(default=True, description="Include similar emails in results")
     include_documents: bool = Field(default=True, description="Include company documents in results")
+    max_age_days: Optional[float] = Field(None, description="Only search emails newer than this many days")
+    tenant_id: Optional[str] = Field(None, description="Mailbox/company whose collections are searched")
+    ef: Optional[int] = Field(None, ge=0, le=MAX_CONTEXT_EF, description="HNSW candidates explored per query (overrides RETRIEVAL_QUERY_EF)")
+
+class EmbeddingMigrationRequest(BaseModel):
+    """Request model for switching the embedding model"""
+    target_model: str = Field(..., description="SentenceTransformer model to re-embed into")
+    auto_cutover: bool = Field(default=True, description="Switch reads over as soon as the backfill completes")
+
+class DocumentImportRequest(BaseModel):
+    """Request model for bulk-importing a directory of company documents"""
+    directory: str = Field(..., description="Directory under DOCUMENT_IMPORT_ROOT (absolute or relative to it)")
+    recursive: bool = Field(default=True, description="Include files in subdirectories")
+    tenant_id: Optional[str] = Field(None, description="Mailbox/company whose document collection receives the chunks")
 
 class ContextDocument(BaseModel):
     """Document result from context retrieval"""
@@ -52,3 +72,21 @@ class ContextResponse(BaseModel):
     emails: Optional[List[ContextEmail]] = Field(None, description="Retrieved similar emails")
     total_results: int = Field(..., description="Total number of results found")
     query_time: float = Field(..., description="Query execution time in seconds")
+
+class BatchContextRequest(BaseModel):
+    """Request model for batched context retrieval"""
+    queries: List[str] = Field(..., max_length=MAX_CONTEXT_BATCH_QUERIES,
+                               description="Search queries, encoded together in one pass")
+    n_results: int = Field(default=5, ge=1, le=MAX_CONTEXT_RESULTS, description="Number of results to return per query")
+    include_emails: bool = Field(default=True, description="Include similar emails in results")
+    include_documents: bool = Field(default=True, description="Include company documents in results")
+    max_age_days: Optional[float] = Field(None, description="Only search emails newer than this many days")
+    tenant_id: Optional[str] = Field(None, description="Mailbox/company whose collections are searched")
+    ef: Optional[int] = Field(None, ge=0, le=MAX_CONTEXT_EF, description="HNSW candidates explored per query (overrides RETRIEVAL_QUERY_EF)")
+
+class BatchContextResponse(BaseModel):
+    """Response model for batched context retrieval"""
+    success: bool = Field(..., description="Whether batch retrieval was successful")
+    results: List[ContextResponse] = Field(..., description="Per-query results, in request order")
+    total_queries: int = Field(..., description="Number of queries processed")
+    query_time: float = Field(..., description="Total batch execution time in seconds")
@@ -0,0 +1 @@
+# Prompt Templates Package
@@ -0,0 +1,71 @@
+"""
+Intent Catalog for the NEXUS fast path
+Common questions answered from company documents without the LLM. Each intent lists
+example phrasings for the classifier, the document query its answer is grounded in,
+and the keywords that select which document lines go into the reply. Only general
+policy questions belong here; anything about a customer's own order, device or repair
+needs their history and goes through the full workflow.
+"""
+
+from typing import List, Dict, Any
+
+INTENT_DEFINITIONS: List[Dict[str, Any]] = [
+    {
+        "name": "warranty",
+        "topic": "our warranty coverage",
+        "examples": [
+            "How long is the warranty on my laptop?",
+            "What does the warranty cover?",
+            "How long is the warranty on the NexusTab tablet?",
+            "Can I buy an extended warranty?",
+            "Does the warranty cover hardware defects?"
+        ],
+        "doc_query": "standard warranty coverage period and extended warranty options",
+        "keywords": ["warranty", "coverage", "extended", "limited"]
+    },
+    {
+        "name": "returns_policy",
+        "topic": "our return policy",
+        "examples": [
+            "What is your return policy?",
+            "How many days do I have to return my order?",
+            "Is there a restocking fee for returns?",
+            "Who pays for return shipping?"
+        ],
+        "doc_query": "return policy return window restocking fee return shipping",
+        "keywords": ["return", "refund", "restocking fee", "window"]
+    },
+    {
+        "name": "restock_date",
+        "topic": "product availability",
+        "examples": [
+            "When will this item be back in stock?",
+            "When are you restocking the NexusBook?",
+            "The product is out of stock, when will it be available again?",
+            "Do you have a restock date for the tablet?",
+            "When can I order again, it says sold out"
+        ],
+        "doc_query": "expected restock date product availability out of stock",
+        "keywords": ["restock", "stock", "availability", "available"]
+    }
+]
+
+FAST_PATH_REPLY_TEMPLATE = """Dear Customer,
+
+Thank you for contacting NEXUS Support about {topic}.
+
+{facts}
+
+If this doesn't answer your question, just reply to this email and our team will follow up within 24 hours.
+
+Best regards,
+NEXUS Support Team
+support@nexustech.com"""
+
+
+def render_fast_path_reply(topic: str, facts: List[str]) -> str:
+    """Templated reply listing the document facts behind an intent"""
+    intro = "Here is the relevant information from our policies:"
+    return FAST_PATH_REPLY_TEMPLATE.format(
+        topic=topic, facts="\n".join([intro] + [f"- {fact}" for fact in facts])
+    )
@@ -0,0 +1,172 @@
+"""
+Prompt Templates for NEXUS Customer Support
+Static system prefixes are module constants so every request sends byte-identical
+leading tokens (enabling provider-side prefix caching); only the user message varies.
+"""
+
+from typing import List, Dict
+
+Messages = List[Dict[str, str]]
+
+GENERATION_SYSTEM_PROMPT = """You are a professional customer support representative for NEXUS, a technology company that makes laptops (NexusBook) and tablets (NexusPad).
+
+Write a professional, helpful, and contextually appropriate reply to the customer email in the user message. Don't respond about anything that is not being asked in the customer email, even if it is present in personal context.
+
+CRITICAL PRIVACY AND CONTEXT GUIDELINES:
+
+PERSONAL DATA PROTECTION (NEVER SHARE ACROSS CUSTOMERS):
+- Serial numbers, bill numbers, order IDs
+- Customer names, email addresses, phone numbers
+- Purchase dates, payment information
+- Device-specific details from other customers
+- Any personally identifiable information
+
+BUSINESS CONTEXT SHARING (ALLOWED ACROSS CUSTOMERS):
+- Product launch dates and announcements
+- Partnership information and collaborations
+- General product availability and restocking (You Can Include Specific Dates, Times)
+- New features, designs, or special editions
+- Company policies and procedures
+
+RULES:
+1. NEVER reveal personal data from other customers' emails
+2. DO use business intelligence from any relevant email to help current customer
+3. DO NOT create fake data or placeholder values; bracketed tokens such as [NAME] or [ORDER_ID] mark redacted data and must never appear in the reply
+4. If customer asks for their personal info, only use it if it's in THEIR previous emails
+5. Use cross-customer business context to provide better service (launch dates, partnerships, etc.)
+6. Be professional and helpful while maintaining strict privacy
+
+EXAMPLES:
+GOOD: "We have a special edition launch planned for January 27th" (from partnership email)
+BAD: "Customer John's serial number is..." (personal data from another customer)
+GOOD: "Based on our partnership discussions, new accessories are coming soon"
+BAD: "Bill number 30022023KL1931VET shows..." (another customer's order details)
+
+Write the reply as if you are a Company customer support representative."""
+
+CRITIQUE_SYSTEM_PROMPT = """You are a quality assurance specialist for customer support. Evaluate the email reply in the user message.
+
+EVALUATION CRITERIA:
+1. Accuracy and relevance to customer inquiry
+2. Professional tone and language
+3. Completeness of response
+4. Privacy compliance (no cross-customer data leakage)
+5. Use of appropriate context
+6. Helpfulness and actionability
+
+Provide balanced feedback. If the response is professional and addresses the customer's needs, it should be considered good quality. Provide feedback and any improvement suggestions."""
+
+SCORING_SYSTEM_PROMPT = """Rate the quality of the customer support email reply in the user message on a scale of 0.0 to 1.0.
+
+LENIENT SCORING CRITERIA:
+- 0.8-1.0: Excellent response, ready to send
+- 0.6-0.79: Good response, acceptable quality
+- 0.4-0.59: Adequate response with minor issues
+- 0.2-0.39: Below average response
+- 0.0-0.19: Poor response requiring major revisions
+
+Be generous in scoring. Most professional responses should score 0.6 or higher. Consider: accuracy, professionalism, completeness, privacy compliance, helpfulness, and tone.
+Respond with ONLY a number between 0.0 and 1.0."""
+
+BATCH_CRITIQUE_SYSTEM_PROMPT = """You are a quality assurance specialist for customer support. Score each draft reply to the customer email in the user message.
+
+SCORING CRITERIA: accuracy and relevance, professional tone, completeness, privacy compliance (no cross-customer data leakage), helpfulness.
+- 0.8-1.0: Excellent response, ready to send
+- 0.6-0.79: Good response, acceptable quality
+- 0.4-0.59: Adequate response with minor issues
+- 0.0-0.39: Poor response requiring major revisions
+
+Respond with ONLY a JSON object: {"scores": [one number between 0.0 and 1.0 per draft, in order], "feedback": "one or two sentences on how the best draft could improve"}"""
+
+# Critique prompts reference context by short excerpts instead of replaying it
+CONTEXT_REFERENCE_CHARS = 120
+CONTEXT_REFERENCE_MAX_ITEMS = 5
+
+
+def compact_context_references(context: str, label: str,
+                               max_items: int = CONTEXT_REFERENCE_MAX_ITEMS,
+                               max_chars: int = CONTEXT_REFERENCE_CHARS) -> str:
+    """Short labelled excerpts ([P1] ..., [P2] ...) of a joined context string"""
+    entries = [entry.strip() for entry in context.split("\n\n") if entry.strip()]
+    if not entries:
+        return "none"
+    lines = []
+    for i, entry in enumerate(entries[:max_items], 1):
+        excerpt = " ".join(entry.split())
+        if len(excerpt) > max_chars:
+            excerpt = excerpt[:max_chars].rstrip() + "..."
+        lines.append(f"[{label}{i}] {excerpt}")
+    if len(entries) > max_items:
+        lines.append(f"(+{len(entries) - max_items} more)")
+    return "\n".join(lines)
+
+
+def build_generation_messages(email_content: str, personal_context: str,
+                              business_context: str, doc_context: str) -> Messages:
+    """System prefix plus the per-request context and customer email"""
+    user_prompt = f"""PERSONAL CONTEXT (THIS CUSTOMER'S PREVIOUS EMAILS ONLY):
+{personal_context}
+
+BUSINESS CONTEXT (GENERAL BUSINESS INTELLIGENCE - NO PERSONAL DATA):
+{business_context}
+
+COMPANY POLICY INFORMATION:
+{doc_context}
+
+CUSTOMER EMAIL TO REPLY TO:
+{email_content}"""
+    return [
+        {"role": "system", "content": GENERATION_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def build_refinement_messages(generation_messages: Messages, previous_draft: str, feedback: str) -> Messages:
+    """Continue the generation conversation so its cached prefix is reused"""
+    return generation_messages + [
+        {"role": "assistant", "content": previous_draft},
+        {"role": "user", "content": f"Reviewer feedback on that reply:\n{feedback}\n\n"
+                                    "Rewrite the reply, addressing the feedback while following all of the rules:"}
+    ]
+
+
+def build_critique_messages(email_content: str, reply: str, personal_context: str,
+                            business_context: str, doc_context: str) -> Messages:
+    """Critique request with compact context references"""
+    user_prompt = f"""ORIGINAL CUSTOMER EMAIL:
+{email_content}
+
+GENERATED REPLY:
+{reply}
+
+CONTEXT AVAILABLE TO THE WRITER (excerpts):
+Personal:
+{compact_context_references(personal_context, "P")}
+Business:
+{compact_context_references(business_context, "B")}
+Policies:
+{compact_context_references(doc_context, "D")}"""
+    return [
+        {"role": "system", "content": CRITIQUE_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def build_scoring_messages(email_content: str, reply: str, feedback: str) -> Messages:
+    return [
+        {"role": "system", "content": SCORING_SYSTEM_PROMPT},
+        {"role": "user", "content": f"ORIGINAL EMAIL: {email_content}\nREPLY: {reply}\nFEEDBACK: {feedback}"}
+    ]
+
+
+def build_batch_critique_messages(email_content: str, drafts: List[str]) -> Messages:
+    numbered_drafts = "\n\n".join(f"DRAFT {i + 1}:\n{draft}" for i, draft in enumerate(drafts))
+    return [
+        {"role": "system", "content": BATCH_CRITIQUE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"ORIGINAL CUSTOMER EMAIL:\n{email_content}\n\n{numbered_drafts}"}
+    ]
+
+
+def messages_length(messages: Messages) -> int:
+    """Total characters across all message contents"""
+    return sum(len(message["content"]) for message in messages)
@@ -0,0 +1,186 @@
+"""
+Admission Control
+Bounds how many reply workflows run at once and decides, per request, how much of the
+workflow it can afford. Waiting requests are served earliest deadline first; each
+admitted request gets the richest mode that fits its remaining deadline and the current
+queue depth, so overload degrades replies instead of timing everyone out.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Richest first; retrieval_only never calls the LLM
+REPLY_MODES = ('full', 'single_draft', 'retrieval_only')
+
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full; retry_after is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """One admitted request: its mode and the slot it holds ('reply' or 'retrieval')"""
+
+    def __init__(self, mode: str, slot: str, deadline: float, queued_seconds: float, reason: str):
+        self.mode = mode
+        self.slot = slot
+        self.deadline = deadline
+        self.queued_seconds = queued_seconds
+        self.reason = reason
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+class AdmissionController:
+    """Concurrency slots plus an earliest-deadline-first wait queue
+
+    A request that cannot get a slot before only retrieval fits its deadline leaves the
+    queue and is answered in retrieval_only mode on one of max_retrieval_only separate
+    slots, so expired requests cannot pile up unbounded. Requests arriving to a full queue,
+    or expiring while every retrieval slot is busy, are rejected with a Retry-After estimate.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 32, degrade_queue_depth: int = 8,
+                 snippets_queue_depth: int = 24, initial_estimates: Optional[Dict[str, float]] = None,
+                 min_samples: int = 10, max_retrieval_only: int = 2):
+        self.max_concurrent = max_concurrent
+        self.max_retrieval_only = max_retrieval_only
+        self.max_queue = max_queue
+        self.degrade_queue_depth = degrade_queue_depth
+        self.snippets_queue_depth = snippets_queue_depth
+        self.initial_estimates = {'full': 20.0, 'single_draft': 6.0, 'retrieval_only': 1.0, **(initial_estimates or {})}
+        self.min_samples = min_samples
+
+        self._active = 0
+        self._retrieval_active = 0
+        self._waiters: List[Tuple[float, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {mode: deque(maxlen=200) for mode in REPLY_MODES}
+        self.counters = {'admitted': 0, 'rejected': 0, 'expired_in_queue': 0, **{mode: 0 for mode in REPLY_MODES}}
+
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def estimate(self, mode: str) -> float:
+        """p95 service time of a mode, or its initial estimate until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._latencies[mode])
+        if len(samples) < self.min_samples:
+            return self.initial_estimates[mode]
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def record(self, mode: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies[mode].append(seconds)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained through the slots"""
+        per_request = self.estimate('single_draft')
+        return max(1, math.ceil((self.queue_depth() + 1) * per_request / self.max_concurrent))
+
+    def select_mode(self, remaining: float, queue_depth: int) -> Tuple[str, str]:
+        """Richest mode allowed by queue depth whose p95 fits the remaining deadline"""
+        if queue_depth >= self.snippets_queue_depth:
+            return 'retrieval_only', f"queue depth {queue_depth}"
+        if queue_depth < self.degrade_queue_depth and self.estimate('full') <= remaining:
+            return 'full', ""
+        if self.estimate('single_draft') <= remaining:
+            return 'single_draft', f"queue depth {queue_depth}" if queue_depth >= self.degrade_queue_depth else f"{remaining:.1f}s left"
+        return 'retrieval_only', f"{remaining:.1f}s left"
+
+    def _admit(self, deadline: float, slot: str, arrived: float) -> Admission:
+        depth = self.queue_depth()
+        if slot == 'reply':
+            mode, reason = self.select_mode(deadline - time.monotonic(), depth)
+        else:
+            mode, reason = 'retrieval_only', "deadline expired in queue"
+        self.counters['admitted'] += 1
+        self.counters[mode] += 1
+        if mode != 'full':
+            logger.info(f"Degraded reply ({mode}): {reason}, queue depth {depth}")
+        return Admission(mode, slot, deadline, time.monotonic() - arrived, reason)
+
+    async def acquire(self, deadline_seconds: float) -> Admission:
+        """Wait for a reply slot (or give up in time for a retrieval-only answer on a retrieval slot)"""
+        arrived = time.monotonic()
+        deadline = arrived + deadline_seconds
+        if self._active < self.max_concurrent and not self.queue_depth():
+            self._active += 1
+            return self._admit(deadline, 'reply', arrived)
+
+        if self.queue_depth() >= self.max_queue:
+            self.counters['rejected'] += 1
+            raise AdmissionRejected(
+                f"Reply queue is full ({self.max_queue} waiting)", self.retry_after()
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (deadline, next(self._sequence), future))
+        # Leave the queue while there is still time to answer from retrieval alone
+        wait_budget = max(0.0, deadline - arrived - self.estimate('retrieval_only'))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=wait_budget)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return self._admit(deadline, 'reply', arrived)
+            future.cancel()
+            self.counters['expired_in_queue'] += 1
+            if self._retrieval_active >= self.max_retrieval_only:
+                self.counters['rejected'] += 1
+                raise AdmissionRejected(
+                    f"Deadline expired in the reply queue and all {self.max_retrieval_only} retrieval-only slots are busy",
+                    self.retry_after()
+                )
+            self._retrieval_active += 1
+            return self._admit(deadline, 'retrieval', arrived)
+        except asyncio.CancelledError:
+            # Client went away: hand back a slot that was granted in the meantime
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            else:
+                future.cancel()
+            raise
+        return self._admit(deadline, 'reply', arrived)
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot passes straight to the earliest-deadline waiter
+                future.set_result(True)
+                return
+        self._active -= 1
+
+    def release(self, admission: Admission, service_seconds: Optional[float] = None) -> None:
+        if service_seconds is not None:
+            self.record(admission.mode, service_seconds)
+        if admission.slot == 'reply':
+            self._release_slot()
+        else:
+            self._retrieval_active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            'active': self._active,
+            'queued': self.queue_depth(),
+            'max_concurrent': self.max_concurrent,
+            'retrieval_only_active': self._retrieval_active,
+            'max_retrieval_only': self.max_retrieval_only,
+            'max_queue': self.max_queue,
+            'estimates_seconds': {mode: round(self.estimate(mode), 3) for mode in REPLY_MODES}
+        }
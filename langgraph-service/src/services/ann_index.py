@@ -0,0 +1,114 @@
+"""
+ANN Index Settings
+HNSW parameters and distance space for Chroma collections, the conversion of each space's
+distances into one similarity scale, and the exact NumPy search used as ground truth.
+
+Chroma fixes a collection's space, M and ef_construction when it is created, so settings
+only apply to new collections (new tenants, new embedding versions). Chroma has no
+per-query ef; hnswlib searches with max(ef, k) candidates, so asking for ef results and
+keeping the top k is the per-query override.
+"""
+
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+DISTANCE_SPACES = ('l2', 'cosine', 'ip')
+
+
+def hnsw_metadata(space: str = 'l2', m: int = 16, construction_ef: int = 100, search_ef: int = 100,
+                  num_threads: int = 0) -> Dict[str, Any]:
+    """Collection metadata that configures the HNSW index at creation"""
+    if space not in DISTANCE_SPACES:
+        raise ValueError(f"Unknown distance space {space!r}, expected one of {DISTANCE_SPACES}")
+    metadata = {
+        'hnsw:space': space,
+        'hnsw:M': m,
+        'hnsw:construction_ef': construction_ef,
+        'hnsw:search_ef': search_ef
+    }
+    if num_threads > 0:
+        metadata['hnsw:num_threads'] = num_threads
+    return metadata
+
+
+def open_collection(chroma_client, name: str, metadata: Optional[Dict[str, Any]] = None):
+    """Existing collection as created, or a new one with metadata
+
+    get_or_create_collection would rewrite an existing collection's metadata on some
+    Chroma versions without rebuilding its index, so settings are only passed on creation.
+    """
+    try:
+        return chroma_client.get_collection(name)
+    except Exception:
+        pass
+    try:
+        return chroma_client.create_collection(name, metadata=metadata or None)
+    except Exception:
+        # Created concurrently by another worker
+        return chroma_client.get_collection(name)
+
+
+def collection_space(collection) -> str:
+    """Distance space a collection was created with (Chroma's default is l2)"""
+    metadata = getattr(collection, 'metadata', None) or {}
+    space = metadata.get('hnsw:space')
+    if space is None:
+        configuration = getattr(collection, 'configuration', None) or {}
+        space = (configuration.get('hnsw') or {}).get('space') if isinstance(configuration, dict) else None
+    return space or 'l2'
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """One similarity scale for every space: cosine similarity for unit-length vectors
+
+    l2 distances are squared (2 - 2cos for unit vectors), cosine distances are 1 - cos and
+    ip distances are 1 - dot.
+    """
+    if space == 'l2':
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def vector_similarity(query: np.ndarray, vectors: np.ndarray, space: str) -> np.ndarray:
+    """Similarities of vectors to query on the distance_to_similarity scale"""
+    query = np.asarray(query, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if space == 'l2':
+        return 1 - np.sum((vectors - query) ** 2, axis=-1) / 2
+    if space == 'cosine':
+        norms = np.linalg.norm(vectors, axis=-1) * np.linalg.norm(query)
+        return (vectors @ query) / np.where(norms == 0, 1, norms)
+    return vectors @ query
+
+
+def exact_top_k(queries: np.ndarray, vectors: np.ndarray, k: int, space: str,
+                block_size: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force (indices, similarities) of the k most similar vectors per query, in blocks"""
+    queries = np.asarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+    best_index = np.empty((len(queries), 0), dtype=np.int64)
+    best_score = np.empty((len(queries), 0), dtype=np.float32)
+    if space == 'cosine':
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        if space == 'l2':
+            # -||q - v||^2 / 2 up to a per-query constant, which does not change the ranking
+            scores = queries @ block.T - 0.5 * np.sum(block ** 2, axis=1)[None, :]
+        elif space == 'cosine':
+            scores = queries @ (block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)).T
+        else:
+            scores = queries @ block.T
+        index = np.concatenate([best_index, np.arange(start, start + len(block))[None, :].repeat(len(queries), 0)], axis=1)
+        score = np.concatenate([best_score, scores], axis=1)
+        top = np.argpartition(-score, min(k, score.shape[1]) - 1, axis=1)[:, :k]
+        best_index = np.take_along_axis(index, top, axis=1)
+        best_score = np.take_along_axis(score, top, axis=1)
+    order = np.argsort(-best_score, axis=1)
+    best_index = np.take_along_axis(best_index, order, axis=1)
+    best_score = np.take_along_axis(best_score, order, axis=1)
+    if space == 'l2':
+        # Back to the similarity scale: 1 - ||q - v||^2 / 2
+        best_score = 1 - (np.sum(queries ** 2, axis=1, keepdims=True) / 2 - best_score)
+    return best_index, best_score
@@ -0,0 +1,96 @@
+"""
+Context Store
+Content-addressed side store for the text bodies the reply workflow retrieves. Workflow
+state (and therefore every LangGraph checkpoint) carries short refs instead of email and
+document bodies; identical bodies retrieved by concurrent requests are stored once.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+
+def content_ref(text: str) -> str:
+    """Stable ref for a body: truncated SHA-256 of its UTF-8 bytes"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:24]
+
+
+class ContextStore:
+    """Bodies keyed by content hash, pinned by the requests that hold their refs
+
+    A request pins every body it puts under its owner id and releases them all at once
+    when it finishes. Unpinned bodies are kept for reuse until the store exceeds
+    max_bytes, then evicted least recently used first; pinned bodies are never evicted.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bodies: "OrderedDict[str, str]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._owners: Dict[str, List[str]] = {}
+        self._bytes = 0
+        self.counters = {'puts': 0, 'deduplicated': 0, 'evicted': 0}
+
+    def put(self, text: str, owner: Optional[str] = None) -> str:
+        ref = content_ref(text)
+        with self._lock:
+            self.counters['puts'] += 1
+            if ref in self._bodies:
+                self.counters['deduplicated'] += 1
+                self._bodies.move_to_end(ref)
+            else:
+                self._bodies[ref] = text
+                self._bytes += len(text.encode('utf-8'))
+            if owner is not None:
+                self._pins[ref] = self._pins.get(ref, 0) + 1
+                self._owners.setdefault(owner, []).append(ref)
+            self._evict()
+        return ref
+
+    def get(self, ref: str) -> str:
+        with self._lock:
+            body = self._bodies.get(ref)
+            if body is None:
+                raise KeyError(f"Context body {ref} is not in the store")
+            self._bodies.move_to_end(ref)
+            return body
+
+    def get_many(self, refs: List[str]) -> List[str]:
+        return [self.get(ref) for ref in refs]
+
+    def release(self, owner: str) -> int:
+        """Unpin everything owner put; returns the number of pins dropped"""
+        with self._lock:
+            refs = self._owners.pop(owner, [])
+            for ref in refs:
+                remaining = self._pins.get(ref, 0) - 1
+                if remaining > 0:
+                    self._pins[ref] = remaining
+                else:
+                    self._pins.pop(ref, None)
+            self._evict()
+        return len(refs)
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        for ref in list(self._bodies):
+            if self._bytes <= self.max_bytes:
+                break
+            if ref in self._pins:
+                continue
+            self._bytes -= len(self._bodies.pop(ref).encode('utf-8'))
+            self.counters['evicted'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                'bodies': len(self._bodies),
+                'pinned': len(self._pins),
+                'active_requests': len(self._owners),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,380 @@
+"""
+Document Extraction
+Turns policy files (PDF, DOCX, HTML, Markdown, plain text, or zip/directory bundles of
+them) into page-numbered text on a process pool, and streams the results into the
+chunker and batch embedder as each file or PDF page range finishes.
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from html.parser import HTMLParser
+from pathlib import Path, PurePosixPath
+from typing import List, Dict, Any, Optional, Tuple, Union
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = {
+    '.pdf': 'pdf', '.docx': 'docx', '.html': 'html', '.htm': 'html',
+    '.md': 'markdown', '.markdown': 'markdown', '.txt': 'text', '.text': 'text'
+}
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# A task's source is a file path (read by the worker) or the file's bytes
+Source = Union[str, bytes]
+
+
+class ExtractionError(Exception):
+    """Raised when a file's format is unsupported or its text cannot be extracted"""
+
+
+def detect_format(filename: str, head: bytes) -> str:
+    """Format from the file's leading bytes, falling back to its extension"""
+    if head.startswith(b'%PDF'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return 'docx' if Path(filename).suffix.lower() == '.docx' else 'zip'
+    sniff = head[:512].lstrip().lower()
+    if sniff.startswith(b'<!doctype html') or sniff.startswith(b'<html'):
+        return 'html'
+    return SUPPORTED_EXTENSIONS.get(Path(filename).suffix.lower(), 'text')
+
+
+def _read(source: Source) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _decode(data: bytes) -> str:
+    return data.decode('utf-8-sig', errors='replace')
+
+
+def _pdf_reader(data: bytes):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError("PDF extraction needs the pypdf package (pip install pypdf)")
+    return PdfReader(io.BytesIO(data))
+
+
+def pdf_page_count(source: Source) -> int:
+    return len(_pdf_reader(_read(source)).pages)
+
+
+def extract_pdf_pages(source: Source, first_page: int, last_page: int) -> List[Tuple[int, str]]:
+    """(1-based page number, text) for pages first_page..last_page inclusive"""
+    reader = _pdf_reader(_read(source))
+    return [(number, reader.pages[number - 1].extract_text() or '') for number in range(first_page, last_page + 1)]
+
+
+def extract_docx(data: bytes) -> List[Tuple[Optional[int], str]]:
+    """Paragraph text per page, using the page breaks Word recorded in the file"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            root = ElementTree.fromstring(archive.read('word/document.xml'))
+    except (KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        raise ExtractionError(f"Not a readable DOCX file: {e}")
+
+    pages: List[List[str]] = [[]]
+    for paragraph in root.iter(f'{WORD_NAMESPACE}p'):
+        parts = []
+        for element in paragraph.iter():
+            if element.tag == f'{WORD_NAMESPACE}t' and element.text:
+                parts.append(element.text)
+            elif element.tag == f'{WORD_NAMESPACE}tab':
+                parts.append('\t')
+            elif (element.tag == f'{WORD_NAMESPACE}br' and element.get(f'{WORD_NAMESPACE}type') == 'page') \
+                    or element.tag == f'{WORD_NAMESPACE}lastRenderedPageBreak':
+                if parts or pages[-1]:
+                    pages[-1].append(''.join(parts))
+                    parts = []
+                    pages.append([])
+        if parts:
+            pages[-1].append(''.join(parts))
+    # Page numbers only mean something when Word recorded page breaks
+    if len(pages) == 1:
+        return [(None, '\n\n'.join(pages[0]))]
+    return [(number, '\n\n'.join(lines)) for number, lines in enumerate(pages, start=1)]
+
+
+class _HTMLText(HTMLParser):
+    BLOCK_TAGS = {'p', 'div', 'section', 'article', 'li', 'tr', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+                  'table', 'ul', 'ol', 'blockquote', 'pre', 'header', 'footer'}
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'head'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def extract_html(data: bytes) -> str:
+    parser = _HTMLText()
+    parser.feed(_decode(data))
+    parser.close()
+    paragraphs = [re.sub(r'[ \t\r\f\v]+', ' ', block).strip() for block in ''.join(parser.parts).split('\n\n')]
+    return '\n\n'.join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def extract_markdown(data: bytes) -> str:
+    """Markdown with the markup removed but headings and paragraphs kept as blocks"""
+    text = _decode(data)
+    text = re.sub(r'```.*?\n(.*?)```', r'\1', text, flags=re.DOTALL)
+    text = re.sub(r'!\[([^\]]*)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'\[([^\]]+)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'^\s{0,3}#{1,6}\s*', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s{0,3}>\s?', '', text, flags=re.MULTILINE)
+    text = re.sub(r'(\*\*|__|`)', '', text)
+    return text
+
+
+def extract_file(source: Source, fmt: str) -> List[Tuple[Optional[int], str]]:
+    """(page number or None, text) sections for a whole non-PDF file"""
+    data = _read(source)
+    if fmt == 'docx':
+        return extract_docx(data)
+    if fmt == 'html':
+        return [(None, extract_html(data))]
+    if fmt == 'markdown':
+        return [(None, extract_markdown(data))]
+    if fmt == 'text':
+        return [(None, _decode(data))]
+    raise ExtractionError(f"Unsupported document format: {fmt}")
+
+
+def extract_document(source: Source, fmt: str) -> List[Tuple[Optional[int], str]]:
+    """All sections of one file in the calling process (PDFs page by page)"""
+    if fmt == 'pdf':
+        return extract_pdf_pages(source, 1, pdf_page_count(source))
+    return extract_file(source, fmt)
+
+
+def chunk_sections(source_name: str, filename: str, sections: List[Tuple[Optional[int], str]]
+                   ) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """Paragraph chunks with ids and metadata; paged chunks carry their page number"""
+    chunks, ids, metadatas = [], [], []
+    paged = any(page is not None for page, _ in sections)
+    for page, text in sections:
+        paragraphs = [chunk.strip() for chunk in text.split('\n\n') if chunk.strip()]
+        for i, paragraph in enumerate(paragraphs):
+            chunks.append(paragraph)
+            metadata = {"source": source_name, "chunk_id": i, "filename": filename, "chunk_index": i}
+            if page is not None:
+                metadata["page"] = page
+                ids.append(f"{source_name}_p{page}_chunk_{i}")
+            else:
+                ids.append(f"{source_name}_chunk_{i}")
+            metadatas.append(metadata)
+    if not paged:
+        for metadata in metadatas:
+            metadata["total_chunks"] = len(chunks)
+    return chunks, ids, metadatas
+
+
+class DocumentIngestor:
+    """Extracts documents on a process pool and embeds their chunks in batches as results arrive"""
+
+    def __init__(self, document_processor, workers: int = 0, pdf_pages_per_task: int = 8,
+                 embed_batch_size: int = 64, max_archive_bytes: int = 512 * 1024 * 1024):
+        self.document_processor = document_processor
+        self.workers = workers or os.cpu_count() or 1
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self.embed_batch_size = embed_batch_size
+        self.max_archive_bytes = max_archive_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    @staticmethod
+    def _source_name(name: str) -> str:
+        """Chunk id prefix: the relative path with its extension, so faq.md and faq.html don't collide"""
+        return str(PurePosixPath(name.replace('\\', '/')))
+
+    def expand_upload(self, filename: str, data: bytes) -> List[Tuple[str, Source, str]]:
+        """(name, source, format) items for an uploaded file; zip bundles expand to their members"""
+        fmt = detect_format(filename, data[:1024])
+        if fmt != 'zip':
+            return [(filename, data, fmt)]
+        items, total = [], 0
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith('__MACOSX/') or PurePosixPath(name).name.startswith('.'):
+                    continue
+                if Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                    continue
+                total += info.file_size
+                if total > self.max_archive_bytes:
+                    raise ExtractionError(f"Archive expands beyond {self.max_archive_bytes // (1024 * 1024)}MB")
+                member = archive.read(info)
+                items.append((name, member, detect_format(name, member[:1024])))
+        return items
+
+    def expand_directory(self, directory: str, recursive: bool = True) -> List[Tuple[str, Source, str]]:
+        """(relative name, path, format) items for the supported files under a directory"""
+        root = Path(directory)
+        paths = root.rglob('*') if recursive else root.glob('*')
+        items = []
+        for path in sorted(paths):
+            if not path.is_file() or path.name.startswith('.') or path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            with open(path, 'rb') as f:
+                head = f.read(1024)
+            items.append((path.relative_to(root).as_posix(), str(path), detect_format(path.name, head)))
+        return items
+
+    def ingest(self, items: List[Tuple[str, Source, str]], tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Extract every item in parallel and store its chunks; returns per-run totals and failures
+
+        A file that fails part-way (e.g. one PDF page range) is reported as failed and any of
+        its chunks already stored are removed again, so no document is left half-ingested.
+        """
+        start = time.perf_counter()
+        pool = self._pool()
+        failures: List[Dict[str, str]] = []
+        futures = {}
+        spilled: List[str] = []
+        try:
+            # PDFs fan out by page range so one large file still uses every worker; uploaded
+            # bytes are spilled to a temp file so each range task only receives its path
+            page_counts = {}
+            for name, source, fmt in items:
+                if fmt == 'pdf':
+                    if isinstance(source, bytes):
+                        source = self._spill(source, spilled)
+                    page_counts[pool.submit(pdf_page_count, source)] = (name, source)
+                elif fmt in ('docx', 'html', 'markdown', 'text'):
+                    futures[pool.submit(extract_file, source, fmt)] = name
+                else:
+                    failures.append({"filename": name, "error": f"Unsupported document format: {fmt}"})
+            for future in as_completed(page_counts):
+                name, source = page_counts[future]
+                try:
+                    count = future.result()
+                except Exception as e:
+                    failures.append({"filename": name, "error": str(e)})
+                    continue
+                for first in range(1, count + 1, self.pdf_pages_per_task):
+                    last = min(count, first + self.pdf_pages_per_task - 1)
+                    futures[pool.submit(extract_pdf_pages, source, first, last)] = name
+            return self._store_results(futures, failures, tenant_id, start)
+        finally:
+            for path in spilled:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _spill(data: bytes, spilled: List[str]) -> str:
+        fd, path = tempfile.mkstemp(prefix='upload_', suffix='.pdf')
+        spilled.append(path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _store_results(self, futures: Dict[Any, str], failures: List[Dict[str, str]],
+                       tenant_id: Optional[str], start: float) -> Dict[str, Any]:
+        """Chunk and batch-embed extraction results as they finish"""
+        batch: Tuple[List[str], List[str], List[Dict[str, Any]]] = ([], [], [])
+        file_chunks: Dict[str, int] = {}
+        file_pages: Dict[str, int] = {}
+        stored = set()
+        failed_names = {failure["filename"] for failure in failures}
+
+        def flush() -> None:
+            if not batch[0]:
+                return
+            names = {metadata["filename"] for metadata in batch[2]}
+            # A failed write may have stored part of the batch, so its files are rolled back too
+            stored.update(names)
+            try:
+                self.document_processor.add_document_chunks(tenant_id, *batch)
+            except Exception as e:
+                logger.error(f"Storing a batch of {len(batch[0])} chunks failed: {e}")
+                for name in sorted(names - failed_names):
+                    failed_names.add(name)
+                    failures.append({"filename": name, "error": f"Storing chunks failed: {e}"})
+            for part in batch:
+                part.clear()
+
+        def discard(name: str) -> None:
+            keep = [i for i, metadata in enumerate(batch[2]) if metadata["filename"] != name]
+            for part in batch:
+                part[:] = [part[i] for i in keep]
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                sections = future.result()
+            except Exception as e:
+                if name not in failed_names:
+                    failed_names.add(name)
+                    failures.append({"filename": name, "error": str(e)})
+                    discard(name)
+                continue
+            if name in failed_names:
+                continue
+            file_pages[name] = file_pages.get(name, 0) + sum(1 for page, _ in sections if page is not None)
+            chunked = chunk_sections(self._source_name(name), name, sections)
+            file_chunks[name] = file_chunks.get(name, 0) + len(chunked[0])
+            for part, values in zip(batch, chunked):
+                part.extend(values)
+            if len(batch[0]) >= self.embed_batch_size:
+                flush()
+        flush()
+
+        for failure in failures:
+            if failure["filename"] in stored:
+                try:
+                    self.document_processor.delete_document_chunks(tenant_id, failure["filename"])
+                    failure["error"] += "; chunks already stored for this file were removed"
+                except Exception as e:
+                    failure["error"] += f"; removing chunks already stored for this file failed: {e}"
+
+        files = [name for name in file_chunks if name not in failed_names]
+        chunks = sum(file_chunks[name] for name in files)
+        pages = sum(file_pages[name] for name in files)
+        seconds = time.perf_counter() - start
+        logger.info(f"Ingested {len(files)} documents ({chunks} chunks, {pages} pages) in {seconds:.2f}s "
+                    f"with {self.workers} extraction workers")
+        return {
+            "files": len(files),
+            "chunks": chunks,
+            "pages": pages,
+            "failures": failures,
+            "seconds": round(seconds, 3)
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -3,41 +3,309 @@ This is Document Processor
 Handles document processing and email vectorization efficiently
 """
 
+import copy
+import json
 import logging
+import math
 import os
-from typing import List, Dict, Any, Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import chromadb
 from sentence_transformers import SentenceTransformer
 import torch
+import numpy as np
+
+from src.services.email_threading import clean_email_body, resolve_thread_id
+from src.services.privacy_scrubber import scrub_text, sender_name_hints
+from src.services import vector_snapshot
+from src.services.embedding_migration import (
+    EmbeddingRegistry, MigrationError, MIGRATION_ORDER, versioned_collection_name
+)
+from src.services.vector_compression import VectorCompressor, RescoreVectorStore
+from src.services.embedding_server import RemoteEmbeddingModel
+from src.services.encode_executor import EncodePool, PooledEmbeddingModel
+from src.services.document_extraction import chunk_sections, detect_format, extract_document
+from src.services.near_duplicates import NearDuplicateIndex, DuplicateMatch, mmr_select
+from src.services.sender_profiles import SenderProfileStore, DEFAULT_DEVICE_PATTERN
+from src.services.ann_index import (
+    hnsw_metadata, open_collection, collection_space, distance_to_similarity, vector_similarity, exact_top_k
+)
 
 logger = logging.getLogger(__name__)
 
+TENANT_SEPARATOR = "__"
+# Characters a tenant suffix keeps as-is; any other byte is escaped as ".xx"
+TENANT_SAFE_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789_-')
+TENANT_ESCAPE_PATTERN = re.compile(r'\.([0-9a-f]{2})')
+# Upper bound on recall report queries; each one costs two index queries plus a rescore
+MAX_RECALL_SAMPLE_SIZE = 1000
+
+
+def tenant_suffix(tenant_id: str) -> str:
+    """Collection-name-safe, reversible form of a tenant id
+
+    Lowercase ids of letters, digits, '_' and '-' map to themselves; everything else (capitals,
+    dots, spaces, a trailing '_' or '-', which Chroma names cannot end with) is hex-escaped, so
+    distinct ids never share collections.
+    """
+    if not tenant_id:
+        raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+    parts = []
+    for i, char in enumerate(tenant_id):
+        last = i == len(tenant_id) - 1
+        if char in TENANT_SAFE_CHARS and not (last and char in '_-'):
+            parts.append(char)
+        else:
+            parts.append(''.join(f".{byte:02x}" for byte in char.encode('utf-8')))
+    return ''.join(parts)
+
+
+def tenant_from_suffix(suffix: str) -> str:
+    """Tenant id a tenant_suffix came from"""
+    raw = bytearray()
+    position = 0
+    for match in TENANT_ESCAPE_PATTERN.finditer(suffix):
+        raw += suffix[position:match.start()].encode('utf-8')
+        raw.append(int(match.group(1), 16))
+        position = match.end()
+    raw += suffix[position:].encode('utf-8')
+    return raw.decode('utf-8')
+
+
+class TenantCollections:
+    """Collection handles for one tenant (or the default, untenanted namespace)"""
+
+    def __init__(self, chroma_client, tenant_id: Optional[str], docs_name: str, emails_name: str,
+                 threads_name: str, emails_cold_name: str, index_metadata: Optional[Dict[str, Any]] = None):
+        self.tenant_id = tenant_id
+        self.docs = open_collection(chroma_client, docs_name, index_metadata)
+        self.emails = open_collection(chroma_client, emails_name, index_metadata)
+        # One rolling summary record per conversation thread
+        self.threads = open_collection(chroma_client, threads_name, index_metadata)
+        # Old emails are compacted out of the hot index into this collection
+        self.emails_cold = open_collection(chroma_client, emails_cold_name, index_metadata)
+        # Existing collections keep the space they were created with
+        self.spaces = {collection.name: collection_space(collection)
+                       for collection in (self.docs, self.emails, self.threads, self.emails_cold)}
+
+    def space(self, collection) -> str:
+        return self.spaces.get(collection.name, 'l2')
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            'documents_count': self.docs.count(),
+            'emails_count': self.emails.count(),
+            'threads_count': self.threads.count(),
+            'cold_emails_count': self.emails_cold.count()
+        }
+
+
+class EmbeddingSlot:
+    """An embedding model together with the collection version holding its vectors"""
+
+    def __init__(self, model_name: str, version: int, model, compressor: Optional[VectorCompressor] = None):
+        self.model_name = model_name
+        self.version = version
+        self.model = model
+        # How email vectors of this version are reduced for the index
+        self.compressor = compressor or VectorCompressor()
+
+
+class QueryVector:
+    """A query embedded once by one slot, reusable across that slot's searches"""
+
+    def __init__(self, slot: EmbeddingSlot, embedding: np.ndarray):
+        self.slot = slot
+        self.embedding = embedding
+
+
+@dataclass(frozen=True)
+class CollectionSettings:
+    """Base collection names (tenants get suffixed copies) and limits on open tenants and summaries"""
+    emails: str = "nexus_emails"
+    docs: str = "nexus_documents"
+    threads: str = "nexus_threads"
+    emails_cold: str = "nexus_emails_cold"
+    thread_summary_max_chars: int = 4000
+    max_open_tenants: int = 32
+
+
+@dataclass(frozen=True)
+class IndexSettings:
+    """HNSW settings applied when a collection is created; existing collections keep theirs"""
+    distance_space: str = "l2"
+    m: int = 16
+    construction_ef: int = 100
+    search_ef: int = 100
+
+
+@dataclass(frozen=True)
+class SearchSettings:
+    """Query-time defaults: per-query ef (0 keeps the index's), MMR over-fetch and email recency (0 disables)"""
+    query_ef: int = 0
+    mmr_fetch_factor: int = 3
+    recency_window_days: float = 0
+    decay_half_life_days: float = 0
+    decay_weight: float = 0.3
+
+
+@dataclass(frozen=True)
+class CompressionSettings:
+    """Email index layout for new versions ('none', 'truncate' or 'pca') and the full vectors kept to rescore"""
+    method: str = "none"
+    dims: int = 256
+    rescore_dtype: str = "float16"
+    rescore_factor: int = 4
+
+
+@dataclass(frozen=True)
+class DedupSettings:
+    """Near-duplicate collapsing; threshold is an estimated Jaccard similarity (0 disables)"""
+    threshold: float = 0
+    num_perm: int = 128
+    bands: int = 32
+    listed_ids: int = 50
+
+
+@dataclass(frozen=True)
+class ProfileSettings:
+    """Per-sender profiles; recent_messages 0 disables them"""
+    recent_messages: int = 0
+    excerpt_chars: int = 600
+    max_identifiers: int = 20
+    device_pattern: str = DEFAULT_DEVICE_PATTERN
+
+
+@dataclass(frozen=True)
+class SidecarSettings:
+    """Shared embedding and Chroma servers of a multi-worker deployment (None runs both in-process)"""
+    embedding_server_socket: Optional[str] = None
+    chroma_server_host: Optional[str] = None
+    chroma_server_port: int = 8000
+
+
 class DocumentProcessor:
     """Document processor for company documents and emails"""
     
     def __init__(self, embedding_model_name: str = "all-MiniLM-L6-v2",
                  chroma_path: str = "./nexus_chroma_db",
-                 email_collection_name: str = "nexus_emails",
-                 docs_collection_name: str = "nexus_documents",
+                 collections: Optional[CollectionSettings] = None,
+                 index: Optional[IndexSettings] = None,
+                 search: Optional[SearchSettings] = None,
+                 compression: Optional[CompressionSettings] = None,
+                 dedup: Optional[DedupSettings] = None,
+                 profiles: Optional[ProfileSettings] = None,
+                 sidecars: Optional[SidecarSettings] = None,
+                 registry_path: Optional[str] = None,
+                 encode_pools: Optional[Dict[str, EncodePool]] = None,
                  device: str = "cuda"):
-        """Initialize with embedding model and collection names"""
-        self.embedding_model_name = embedding_model_name
-        # Determine device (fallback to CPU if CUDA not available)
-        if device == "cuda" and torch.cuda.is_available():
+        """Initialize with embedding model and collection names
+
+        Each settings group defaults to its dataclass defaults when omitted.
+
+        With a registry_path, the model serving reads is the registry's active version
+        (embedding_model_name only seeds a new registry) and model migrations are enabled.
+
+        A compression method stores email vectors reduced to compression.dims in the index
+        and keeps full vectors (as rescore_dtype) on disk to rescore a shortlist
+        rescore_factor times the requested size.
+
+        In multi-worker deployments, the sidecars point at the shared embedding and Chroma
+        servers so each worker holds neither model weights nor the index; chroma_path still
+        holds the registry-adjacent local files (rescore vectors, projections).
+
+        encode_pools ('query' and 'ingest', see encode_executor) move encodes onto bounded
+        thread or process pools; without them encodes run on the calling thread.
+
+        With dedup enabled, incoming emails that near-duplicate an earlier one collapse into
+        that representative before anything is embedded; the representative's metadata keeps
+        duplicate_count and the latest dedup.listed_ids duplicate_ids. Searches given an
+        mmr_lambda over-fetch search.mmr_fetch_factor times the requested results and
+        diversify them with MMR.
+
+        With profiles enabled, a per-sender profile (recent messages, identifiers, last
+        interaction, centroid of the active version) is updated on every stored email, so
+        personal context is a key lookup (see get_sender_profile).
+        """
+        collections = collections or CollectionSettings()
+        index = index or IndexSettings()
+        search = search or SearchSettings()
+        compression = compression or CompressionSettings()
+        dedup = dedup or DedupSettings()
+        profiles = profiles or ProfileSettings()
+        sidecars = sidecars or SidecarSettings()
+
+        self.embedding_server_socket = sidecars.embedding_server_socket
+        self.encode_pools = encode_pools or {}
+        # Determine device (fallback to CPU if CUDA not available); the embedding server owns the GPU
+        if sidecars.embedding_server_socket:
+            self.device = "cpu"
+        elif device == "cuda" and torch.cuda.is_available():
             self.device = "cuda"
         else:
             self.device = "cpu"
             if device == "cuda":
                 logger.warning("CUDA requested but not available, falling back to CPU")
 
-        # Initialize embedding model with device support
-        try:
-            self.embedding_model = SentenceTransformer(embedding_model_name, device=self.device)
-        except Exception as e:
-            logger.warning(f"Failed to initialize model on {self.device}, falling back to CPU: {e}")
-            self.device = "cpu"
-            self.embedding_model = SentenceTransformer(embedding_model_name, device="cpu")
+        self.chroma_path = chroma_path
+        self.index_metadata = hnsw_metadata(index.distance_space, index.m, index.construction_ef, index.search_ef)
+        self.query_ef = search.query_ef
+        if sidecars.chroma_server_host:
+            self.chroma_client = chromadb.HttpClient(host=sidecars.chroma_server_host, port=sidecars.chroma_server_port)
+        else:
+            self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+
+        # Email index layout for new versions; an existing version keeps the layout it was built with
+        self.email_index_layout = VectorCompressor(compression.method, compression.dims).layout
+        self.email_rescore_factor = compression.rescore_factor
+
+        # Reads use the active model version; a migration target also receives every write
+        if registry_path:
+            existing_emails = open_collection(self.chroma_client, collections.emails, self.index_metadata).count()
+            self.embedding_registry = EmbeddingRegistry(
+                registry_path, embedding_model_name,
+                initial_email_index='none' if existing_emails else self.email_index_layout
+            )
+        else:
+            self.embedding_registry = None
+        active = self.embedding_registry.active if self.embedding_registry else \
+            {'model': embedding_model_name, 'version': 0, 'email_index': self.email_index_layout}
+        if active['model'] != embedding_model_name or active.get('email_index', 'none') != self.email_index_layout:
+            logger.warning(f"Serving {active['model']} ({active.get('email_index', 'none')} email index, version "
+                           f"{active['version']}) from the embedding registry; configured {embedding_model_name} "
+                           f"({self.email_index_layout}) needs a migration to take effect")
+        self.active_slot = self._make_slot(active['model'], active['version'], active.get('email_index', 'none'))
+        self.target_slot: Optional[EmbeddingSlot] = None
+        migration = self.embedding_registry.migration if self.embedding_registry else None
+        if migration and migration['status'] in ('running', 'ready'):
+            self.target_slot = self._make_slot(
+                migration['target_model'], migration['target_version'], migration.get('target_email_index', 'none')
+            )
+        self.rescore_store = RescoreVectorStore(
+            os.path.join(chroma_path, "email_rescore_vectors.db"), compression.rescore_dtype
+        )
+        self._migration_lock = threading.Lock()
+        self._registry_checked_at = time.monotonic()
+        self._projection_fitted_at = active.get('projection_fitted_at')
+        self.dual_write_errors = 0
+        self.near_duplicates = NearDuplicateIndex(
+            os.path.join(chroma_path, "near_duplicates.db"), threshold=dedup.threshold,
+            num_perm=dedup.num_perm, bands=dedup.bands
+        ) if dedup.threshold > 0 else None
+        self.near_duplicate_listed_ids = dedup.listed_ids
+        self.mmr_fetch_factor = search.mmr_fetch_factor
+        self.sender_profiles = SenderProfileStore(
+            os.path.join(chroma_path, "sender_profiles.db"), recent_messages=profiles.recent_messages,
+            excerpt_chars=profiles.excerpt_chars, max_identifiers=profiles.max_identifiers,
+            device_pattern=profiles.device_pattern
+        ) if profiles.recent_messages > 0 else None
 
         # Set GPU memory management if using CUDA
         if self.device == "cuda":
@@ -48,40 +316,260 @@ class DocumentProcessor:
             except Exception as e:
                 logger.warning(f"GPU memory management failed: {e}")
 
-        self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+        # Base collection names; tenants get their own suffixed copies
+        self.collection_names = {
+            'docs': collections.docs,
+            'emails': collections.emails,
+            'threads': collections.threads,
+            'emails_cold': collections.emails_cold
+        }
+        self.thread_summary_max_chars = collections.thread_summary_max_chars
 
-        # Create collections with configurable names
-        self.docs_collection = self.chroma_client.get_or_create_collection(docs_collection_name)
-        self.emails_collection = self.chroma_client.get_or_create_collection(email_collection_name)
+        # Default collections per model version; tenant collections are opened
+        # lazily and kept in a bounded LRU keyed by (version, tenant)
+        self.max_open_tenants = collections.max_open_tenants
+        self._default_collections: Dict[int, TenantCollections] = {}
+        self._tenant_collections: "OrderedDict[tuple, TenantCollections]" = OrderedDict()
+        self._tenant_lock = threading.Lock()
+        self.get_collections(None)
 
-        logger.info(f"DocumentProcessor initialized with {embedding_model_name}")
+        # Recency defaults for email search (0 disables)
+        self.recency_window_days = search.recency_window_days
+        self.decay_half_life_days = search.decay_half_life_days
+        self.decay_weight = search.decay_weight
+
+        logger.info(f"DocumentProcessor initialized with {self.embedding_model_name} (version {self.active_slot.version})")
         logger.info(f"Using device: {self.device}")
         if self.device == "cuda":
             logger.info(f"GPU: {torch.cuda.get_device_name(0)}")
             logger.info(f"GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
-        logger.info(f"Using ChromaDB path: {chroma_path}")
-        logger.info(f"Email collection: {email_collection_name}, Docs collection: {docs_collection_name}")
+        if sidecars.chroma_server_host:
+            logger.info(f"Using ChromaDB server: {sidecars.chroma_server_host}:{sidecars.chroma_server_port}")
+        else:
+            logger.info(f"Using ChromaDB path: {chroma_path}")
+        logger.info(f"Email collection: {collections.emails}, Docs collection: {collections.docs}, "
+                    f"Threads collection: {collections.threads}")
     
-    def document_chunker(self, document_path: str) -> bool:
+    def _load_model(self, model_name: str) -> SentenceTransformer:
+        """Load an embedding model on the configured device, falling back to CPU"""
+        ingest_pool = self.encode_pools.get('ingest')
+        if ingest_pool is not None and ingest_pool.mode == 'process':
+            return PooledEmbeddingModel(ingest_pool, model_name)
+        if self.embedding_server_socket:
+            return RemoteEmbeddingModel(self.embedding_server_socket, model_name)
+        try:
+            return SentenceTransformer(model_name, device=self.device)
+        except Exception as e:
+            logger.warning(f"Failed to initialize model on {self.device}, falling back to CPU: {e}")
+            self.device = "cpu"
+            return SentenceTransformer(model_name, device="cpu")
+
+    def _encode(self, slot: EmbeddingSlot, texts: List[str], pool: str = 'ingest') -> np.ndarray:
+        """Encode on the named pool ('query' or 'ingest'), or inline when pools are disabled"""
+        encode_pool = self.encode_pools.get(pool)
+        if encode_pool is None:
+            return slot.model.encode(texts)
+        return encode_pool.encode(slot.model_name, texts, model=slot.model)
+
+    def _make_slot(self, model_name: str, version: int, email_index: str) -> EmbeddingSlot:
+        # PCA projections are fitted per version since they depend on the model's vector space
+        compressor = VectorCompressor.from_layout(
+            email_index, projection_path=os.path.join(self.chroma_path, f"email_projection_v{version}.npz")
+        )
+        return EmbeddingSlot(model_name, version, self._load_model(model_name), compressor)
+
+    @property
+    def embedding_model(self) -> SentenceTransformer:
+        return self.active_slot.model
+
+    @property
+    def embedding_model_name(self) -> str:
+        return self.active_slot.model_name
+
+    @property
+    def default_collections(self) -> TenantCollections:
+        return self.get_collections(None)
+
+    @property
+    def docs_collection(self):
+        return self.default_collections.docs
+
+    @property
+    def emails_collection(self):
+        return self.default_collections.emails
+
+    @property
+    def threads_collection(self):
+        return self.default_collections.threads
+
+    @property
+    def emails_cold_collection(self):
+        return self.default_collections.emails_cold
+
+    def sync_registry(self, max_age_seconds: float = 1.0) -> None:
+        """Adopt migrations, cutovers and projection refits made by another worker process
+
+        Checks the registry file's mtime at most once per max_age_seconds.
+        """
+        registry = self.embedding_registry
+        now = time.monotonic()
+        if registry is None or now - self._registry_checked_at < max_age_seconds:
+            return
+        self._registry_checked_at = now
+        with self._migration_lock:
+            if not registry.reload_if_changed():
+                return
+            active, migration = registry.active, registry.migration
+            slots = {slot.version: slot for slot in (self.active_slot, self.target_slot) if slot is not None}
+
+            previous = self.active_slot
+            if active['version'] in slots:
+                self.active_slot = slots[active['version']]
+                if active.get('projection_fitted_at') != self._projection_fitted_at:
+                    self.active_slot.compressor = VectorCompressor.from_layout(
+                        active.get('email_index', 'none'), self.active_slot.compressor.projection_path
+                    )
+            else:
+                self.active_slot = self._make_slot(active['model'], active['version'], active.get('email_index', 'none'))
+
+            if migration and migration['status'] in ('running', 'ready'):
+                if migration['target_version'] in slots:
+                    self.target_slot = slots[migration['target_version']]
+                else:
+                    self.target_slot = self._make_slot(
+                        migration['target_model'], migration['target_version'],
+                        migration.get('target_email_index', 'none')
+                    )
+            else:
+                self.target_slot = None
+            self._projection_fitted_at = active.get('projection_fitted_at')
+
+            if previous.version not in (self.active_slot.version, getattr(self.target_slot, 'version', None)):
+                self._forget_version(previous.version)
+            logger.info(f"Embedding registry reloaded: serving {self.active_slot.model_name} "
+                        f"(version {self.active_slot.version})")
+
+    def _write_slots(self) -> List[EmbeddingSlot]:
+        """Slots every write goes to: the active version plus any migration target"""
+        self.sync_registry()
+        target = self.target_slot
+        return [self.active_slot] if target is None else [self.active_slot, target]
+
+    def _versioned_names(self, slot: EmbeddingSlot) -> Dict[str, str]:
+        return {key: versioned_collection_name(name, slot.version) for key, name in self.collection_names.items()}
+
+    @staticmethod
+    def _tenant_suffix(tenant_id: str) -> str:
+        return tenant_suffix(tenant_id)
+
+    def _scope(self, tenant_id: Optional[str]) -> str:
+        """Key of a tenant in the side stores, matching its collections"""
+        return self._tenant_suffix(tenant_id) if tenant_id else ''
+
+    def _tenant_names(self, tenant_id: Optional[str], slot: Optional[EmbeddingSlot] = None) -> Dict[str, str]:
+        names = self._versioned_names(slot or self.active_slot)
+        if tenant_id:
+            suffix = self._tenant_suffix(tenant_id)
+            names = {key: f"{name}{TENANT_SEPARATOR}{suffix}" for key, name in names.items()}
+        return names
+
+    def _open_collections(self, tenant_id: Optional[str], slot: Optional[EmbeddingSlot] = None) -> TenantCollections:
+        names = self._tenant_names(tenant_id, slot)
+        return TenantCollections(
+            self.chroma_client, tenant_id,
+            docs_name=names['docs'],
+            emails_name=names['emails'],
+            threads_name=names['threads'],
+            emails_cold_name=names['emails_cold'],
+            index_metadata=self.index_metadata
+        )
+
+    def get_collections(self, tenant_id: Optional[str] = None,
+                        slot: Optional[EmbeddingSlot] = None) -> TenantCollections:
+        """Return a tenant's collection handles for a model version (default: active), opening them on first use"""
+        slot = slot or self.active_slot
+        if not tenant_id:
+            collections = self._default_collections.get(slot.version)
+            if collections is None:
+                with self._tenant_lock:
+                    collections = self._default_collections.setdefault(slot.version, self._open_collections(None, slot))
+            return collections
+
+        key = (slot.version, self._tenant_suffix(tenant_id))
+        with self._tenant_lock:
+            collections = self._tenant_collections.get(key)
+            if collections is not None:
+                self._tenant_collections.move_to_end(key)
+                return collections
+
+            collections = self._open_collections(tenant_id, slot)
+            self._tenant_collections[key] = collections
+            if len(self._tenant_collections) > self.max_open_tenants:
+                (evicted_version, evicted), _ = self._tenant_collections.popitem(last=False)
+                logger.info(f"Closed collection handles for tenant {evicted} (version {evicted_version})")
+            logger.info(f"Opened collections for tenant {key[1]} (version {key[0]})")
+            return collections
+
+    def find_collections(self, tenant_id: Optional[str] = None,
+                         slot: Optional[EmbeddingSlot] = None) -> Optional[TenantCollections]:
+        """get_collections for read paths: None for a tenant with no collections, which are not created"""
+        slot = slot or self.active_slot
+        if not tenant_id:
+            return self.get_collections(None, slot)
+        with self._tenant_lock:
+            collections = self._tenant_collections.get((slot.version, self._tenant_suffix(tenant_id)))
+        if collections is not None:
+            return self.get_collections(tenant_id, slot)
+        # A tenant's collections are created together, so its email collection stands for all four
+        try:
+            self.chroma_client.get_collection(self._tenant_names(tenant_id, slot)['emails'])
+        except Exception:
+            return None
+        return self.get_collections(tenant_id, slot)
+
+    def list_tenants(self, slot: Optional[EmbeddingSlot] = None) -> List[str]:
+        """Ids of the tenants that have an email or document collection on disk"""
+        names = self._versioned_names(slot or self.active_slot)
+        base_names = (names['emails'], names['docs'])
+        tenants = set()
+        for collection in self.chroma_client.list_collections():
+            name = getattr(collection, 'name', collection)
+            for base in base_names:
+                prefix = f"{base}{TENANT_SEPARATOR}"
+                if name.startswith(prefix):
+                    tenants.add(tenant_from_suffix(name[len(prefix):]))
+        return sorted(tenants)
+
+    def _existing_counts(self, tenant_id: Optional[str]) -> Dict[str, int]:
+        """TenantCollections.counts() for collections that exist, without creating any"""
+        names = self._tenant_names(tenant_id)
+        keys = {'docs': 'documents_count', 'emails': 'emails_count', 'threads': 'threads_count',
+                'emails_cold': 'cold_emails_count'}
+        counts = {}
+        for key, count_key in keys.items():
+            try:
+                counts[count_key] = self.chroma_client.get_collection(names[key]).count()
+            except Exception:
+                counts[count_key] = 0
+        return counts
+
+    def tenant_is_empty(self, tenant_id: Optional[str] = None) -> bool:
+        """True when a tenant has no stored emails or documents; no collections are created"""
+        counts = self._existing_counts(tenant_id)
+        return not (counts['emails_count'] or counts['documents_count'])
+
+    def document_chunker(self, document_path: str, tenant_id: Optional[str] = None) -> bool:
         """Process document and store in vector database"""
         try:
-            with open(document_path, 'r', encoding='utf-8') as file:
+            with open(document_path, 'rb') as file:
                 content = file.read()
-            
-            # Simple chunking by paragraphs
-            chunks = [chunk.strip() for chunk in content.split('\n\n') if chunk.strip()]
-            
-            # Generate embeddings and store
-            for i, chunk in enumerate(chunks):
 
-                embedding = self.embedding_model.encode([chunk])
+            # Paragraph chunks, keeping page numbers for paged formats
+            sections = extract_document(content, detect_format(document_path, content[:1024]))
+            chunks, ids, metadatas = chunk_sections(Path(document_path).stem, Path(document_path).name, sections)
 
-                self.docs_collection.add(
-                    ids=[f"{Path(document_path).stem}_chunk_{i}"],
-                    embeddings=embedding.tolist(),
-                    documents=[chunk],
-                    metadatas=[{"source": Path(document_path).stem, "chunk_id": i}]
-                )
+            # Generate embeddings and store
+            self._store_document_chunks(tenant_id, chunks, ids, metadatas)
             
             logger.info(f"Processed {len(chunks)} chunks from {document_path}")
             return True
@@ -89,63 +577,510 @@ class DocumentProcessor:
         except Exception as e:
             logger.error(f"Failed to process document: {str(e)}")
             return False
+
+    def add_document_chunks(self, tenant_id: Optional[str], chunks: List[str], ids: List[str],
+                            metadatas: List[Dict[str, Any]]) -> None:
+        """Store pre-chunked document text (bulk ingestion flushes its batches here)"""
+        self._store_document_chunks(tenant_id, chunks, ids, metadatas)
+
+    def _store_document_chunks(self, tenant_id: Optional[str], chunks: List[str], ids: List[str],
+                               metadatas: List[Dict[str, Any]]) -> None:
+        """Embed and add document chunks to the active version (and any migration target)"""
+        if not chunks:
+            return
+        self.sync_registry()
+
+        def write(slot: EmbeddingSlot) -> None:
+            self.get_collections(tenant_id, slot).docs.add(
+                ids=ids,
+                embeddings=self._encode(slot, chunks).tolist(),
+                documents=chunks,
+                metadatas=metadatas
+            )
+
+        write(self.active_slot)
+        if self.target_slot is not None:
+            self._mirror_write(write, self.target_slot)
+
+    def delete_document_chunks(self, tenant_id: Optional[str], filename: str) -> None:
+        """Remove every chunk of one document file from the active version (and any migration target)"""
+        self.sync_registry()
+
+        def delete(slot: EmbeddingSlot) -> None:
+            self.get_collections(tenant_id, slot).docs.delete(where={"filename": filename})
+
+        delete(self.active_slot)
+        if self.target_slot is not None:
+            self._mirror_write(delete, self.target_slot)
+
+    def _mirror_write(self, write_fn, slot: EmbeddingSlot, *args, **kwargs) -> None:
+        """Apply a write to the migration target; a failure there never fails the primary write"""
+        try:
+            write_fn(slot, *args, **kwargs)
+        except Exception as e:
+            self.dual_write_errors += 1
+            logger.warning(f"Dual-write to {slot.model_name} (version {slot.version}) failed: {e}")
     
 
     def store_email_vector(self, email_content: str, sender_info: str, date_time: str, 
-                          email_id: str, additional_metadata: Optional[Dict] = None) -> bool:
-        """Store email with vector embedding"""
-        try:
-            # Generate embedding
-            embedding = self.embedding_model.encode([email_content])
-            
-            # Prepare metadata
-            metadata = {
-                'sender_info': sender_info,
-                'date_time': date_time,
-                'email_id': email_id,
-                'content_type': 'email'
-            }
-            if additional_metadata:
-                metadata.update(additional_metadata)
-            
-            # Store in emails collection
-            self.emails_collection.add(
-                ids=[f"email_{email_id}"],
-                embeddings=embedding.tolist(),
-                documents=[email_content],
-                metadatas=[metadata]
-            )
-            
-            logger.info(f"Stored email vector for {email_id}")
-            return True
+                          email_id: str, additional_metadata: Optional[Dict] = None,
+                          tenant_id: Optional[str] = None) -> bool:
+        """Store email with vector embedding and fold it into its thread summary and sender profile
 
+        Near-duplicates of a stored email are not embedded; they are counted on that representative.
+        """
+        self.sync_registry()
+        try:
+            duplicate = self._match_near_duplicate(email_content, email_id, tenant_id)
+            slot = self.active_slot
+            is_new, vector = self._store_email(slot, email_content, sender_info, date_time, email_id,
+                                               additional_metadata, tenant_id, duplicate)
         except Exception as e:
             logger.error(f"Failed to store email: {str(e)}")
             return False
+
+        if is_new:
+            self._record_sender_profile(slot, email_content, sender_info, date_time, email_id,
+                                        additional_metadata, tenant_id, vector)
+
+        if self.target_slot is not None:
+            self._mirror_write(self._store_email, self.target_slot, email_content, sender_info, date_time,
+                               email_id, additional_metadata, tenant_id, duplicate)
+        return True
+
+    def store_email_vectors(self, emails: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Batch form of store_email_vector: one encode pass and one index write per tenant
+
+        Each item holds store_email_vector's keyword arguments; returns per-item errors in order,
+        None for each email that was stored.
+        """
+        self.sync_registry()
+        slot = self.active_slot
+        errors: List[Optional[str]] = [None] * len(emails)
+        duplicates: Dict[int, DuplicateMatch] = {}
+        by_tenant: "OrderedDict[Optional[str], List[int]]" = OrderedDict()
+        pending: Dict[Optional[str], set] = {}
+        for i, email in enumerate(emails):
+            tenant_id = email.get('tenant_id')
+            try:
+                duplicate = self._match_near_duplicate(email['email_content'], email['email_id'], tenant_id,
+                                                       pending.get(tenant_id))
+            except Exception as e:
+                logger.error(f"Failed to store email {email.get('email_id')}: {e}")
+                errors[i] = str(e)
+                continue
+            if duplicate is not None:
+                duplicates[i] = duplicate
+            else:
+                by_tenant.setdefault(tenant_id, []).append(i)
+                pending.setdefault(tenant_id, set()).add(f"email_{email['email_id']}")
+
+        outcomes: Dict[int, Tuple[bool, Optional[np.ndarray]]] = {}
+        for tenant_id, indices in by_tenant.items():
+            batch = [emails[i] for i in indices]
+            try:
+                outcomes.update(zip(indices, self._store_email_batch(slot, tenant_id, batch)))
+            except Exception as e:
+                logger.error(f"Failed to store {len(batch)} emails for {tenant_id or 'default'}: {e}")
+                for i in indices:
+                    errors[i] = str(e)
+                continue
+            if self.target_slot is not None:
+                self._mirror_write(self._store_email_batch, self.target_slot, tenant_id, batch)
+        for i, duplicate in duplicates.items():
+            email = emails[i]
+            args = (email['email_content'], email['sender_info'], email['date_time'], email['email_id'],
+                    email.get('additional_metadata'), email.get('tenant_id'), duplicate)
+            try:
+                outcomes[i] = self._store_email(slot, *args)
+            except Exception as e:
+                logger.error(f"Failed to store email {email['email_id']}: {e}")
+                errors[i] = str(e)
+                continue
+            if self.target_slot is not None:
+                self._mirror_write(self._store_email, self.target_slot, *args)
+
+        for i, (is_new, vector) in outcomes.items():
+            if is_new:
+                email = emails[i]
+                self._record_sender_profile(slot, email['email_content'], email['sender_info'], email['date_time'],
+                                            email['email_id'], email.get('additional_metadata'),
+                                            email.get('tenant_id'), vector)
+        return errors
+
+    def _record_sender_profile(self, slot: EmbeddingSlot, email_content: str, sender_info: str, date_time: str,
+                               email_id: str, additional_metadata: Optional[Dict], tenant_id: Optional[str],
+                               vector: Optional[np.ndarray]) -> None:
+        if self.sender_profiles is None:
+            return
+        try:
+            self.sender_profiles.record(
+                self._scope(tenant_id), sender_info, f"email_{email_id}", clean_email_body(email_content),
+                parse_timestamp(date_time) or 0.0, date_time, (additional_metadata or {}).get('subject', ''),
+                vector, slot.version
+            )
+        except Exception as e:
+            logger.warning(f"Sender profile update failed for {email_id}: {e}")
+
+    def get_sender_profile(self, sender_info: str, tenant_id: Optional[str] = None,
+                           include_centroid: bool = False) -> Optional[Dict[str, Any]]:
+        """A sender's incrementally maintained profile
+
+        None when profiles are off, the sender is unknown, or profiles are still being backfilled
+        from stored emails (see backfill_sender_profiles).
+        """
+        if self.sender_profiles is None or not self.sender_profiles.is_backfilled():
+            return None
+        return self.sender_profiles.get(self._scope(tenant_id), sender_info, include_centroid)
+
+    def has_sender_history(self, sender_info: str, tenant_id: Optional[str] = None) -> bool:
+        """Whether a sender has a stored conversation thread in the tenant's active store"""
+        collections = self.find_collections(tenant_id)
+        if collections is None:
+            return False
+        return bool(collections.threads.get(where={'sender_info': sender_info}, limit=1, include=[])['ids'])
+
+    def _match_near_duplicate(self, email_content: str, email_id: str, tenant_id: Optional[str],
+                              pending_ids: Optional[set] = None) -> Optional[DuplicateMatch]:
+        """Representative this email collapses into, if the near-duplicate index has one
+
+        pending_ids are emails of the same batch that will be stored before this one collapses.
+        """
+        if self.near_duplicates is None:
+            return None
+        scope = self._scope(tenant_id)
+        doc_id = f"email_{email_id}"
+        duplicate = self.near_duplicates.assign(scope, doc_id, clean_email_body(email_content))
+        if duplicate is None or duplicate.representative == doc_id:
+            return None
+        if pending_ids and duplicate.representative in pending_ids:
+            return duplicate
+        if not self.get_collections(tenant_id).emails.get(ids=[duplicate.representative])['ids']:
+            # Representative was compacted to cold storage or dropped: this email takes its place
+            self.near_duplicates.promote(scope, duplicate.representative, doc_id, duplicate.signature)
+            return None
+        return duplicate
+
+    def _store_email(self, slot: EmbeddingSlot, email_content: str, sender_info: str, date_time: str,
+                     email_id: str, additional_metadata: Optional[Dict], tenant_id: Optional[str],
+                     duplicate: Optional[DuplicateMatch] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """Embed and store one email in a model version's collections
+
+        Returns whether the message is new to this version and its full-dimension vector.
+        """
+        collections = self.get_collections(tenant_id, slot)
+        if duplicate is not None:
+            return self._collapse_duplicate(slot, collections, duplicate, email_content, sender_info, date_time,
+                                            email_id, additional_metadata, tenant_id)
+        additional_metadata = dict(additional_metadata or {})
+        doc_id = f"email_{email_id}"
+        already_stored = bool(collections.emails.get(ids=[doc_id])['ids'])
+
+        # Embed only the newly written text, not quoted history or signatures; the raw body is the document
+        cleaned_content = clean_email_body(email_content)
+        thread_id = self._resolve_thread_id(collections, additional_metadata, sender_info)
+
+        # Generate embedding
+        embedding = self._encode(slot, [cleaned_content])
+        index_embedding = self._index_email_vectors(slot, collections, [doc_id], embedding)
+        metadata = self._email_metadata(email_content, cleaned_content, sender_info, date_time, email_id,
+                                        additional_metadata, thread_id)
+        
+        # Store in emails collection
+        collections.emails.add(
+            ids=[doc_id],
+            embeddings=index_embedding.tolist(),
+            documents=[email_content],
+            metadatas=[metadata]
+        )
+
+        if not already_stored:
+            self._update_thread_summary(collections, thread_id, cleaned_content, embedding[0], metadata)
+        
+        logger.info(f"Stored email vector for {email_id} (thread {thread_id}, version {slot.version})")
+        return not already_stored, embedding[0]
+
+    def _email_metadata(self, email_content: str, cleaned_content: str, sender_info: str, date_time: str,
+                        email_id: str, additional_metadata: Dict[str, Any], thread_id: str) -> Dict[str, Any]:
+        metadata = {
+            'sender_info': sender_info,
+            'date_time': date_time,
+            'email_id': email_id,
+            'content_type': 'email'
+        }
+        metadata.update(additional_metadata)
+        # Undated emails get no timestamp: recency windows skip them and decay treats them as old
+        timestamp = parse_timestamp(date_time)
+        if timestamp is not None:
+            metadata['timestamp'] = timestamp
+        metadata['thread_id'] = thread_id
+        metadata['quoted_text_removed'] = len(cleaned_content) < len(email_content.strip())
+        # Redacted copy used as cross-customer business context, computed once here
+        metadata['scrubbed_content'] = self._scrub_email(cleaned_content, sender_info, metadata)
+        return metadata
+
+    def _store_email_batch(self, slot: EmbeddingSlot, tenant_id: Optional[str],
+                           emails: List[Dict[str, Any]]) -> List[Tuple[bool, Optional[np.ndarray]]]:
+        """Embed and store one tenant's emails (none of them near-duplicates) with one encode and one add"""
+        collections = self.get_collections(tenant_id, slot)
+        doc_ids = [f"email_{email['email_id']}" for email in emails]
+        already_stored = set(collections.emails.get(ids=list(set(doc_ids)), include=[])['ids'])
+        # Re-synced emails and repeats within the batch are not embedded again
+        rows = []
+        for i, doc_id in enumerate(doc_ids):
+            if doc_id not in already_stored:
+                already_stored.add(doc_id)
+                rows.append(i)
+        cleaned = {i: clean_email_body(emails[i]['email_content']) for i in rows}
+        embeddings = dict(zip(rows, self._encode(slot, [cleaned[i] for i in rows]))) if rows else {}
+
+        results: List[Tuple[bool, Optional[np.ndarray]]] = [(False, None)] * len(emails)
+        batch_threads: Dict[str, str] = {}
+        new_rows = []
+        for i in rows:
+            email = emails[i]
+            additional_metadata = dict(email.get('additional_metadata') or {})
+            # A reply to an email earlier in this batch joins its thread; that parent is not in the index yet
+            parent = additional_metadata.get('in_reply_to')
+            if parent in batch_threads and not additional_metadata.get('thread_id') and not additional_metadata.get('references'):
+                thread_id = batch_threads[parent]
+            else:
+                thread_id = self._resolve_thread_id(collections, additional_metadata, email['sender_info'])
+            if additional_metadata.get('message_id'):
+                batch_threads[additional_metadata['message_id']] = thread_id
+            metadata = self._email_metadata(email['email_content'], cleaned[i], email['sender_info'],
+                                            email['date_time'], email['email_id'], additional_metadata, thread_id)
+            new_rows.append((i, metadata))
+            results[i] = (True, embeddings[i])
+
+        if new_rows:
+            collections.emails.add(
+                ids=[doc_ids[i] for i in rows],
+                embeddings=self._index_email_vectors(slot, collections, [doc_ids[i] for i in rows],
+                                                     np.stack([embeddings[i] for i in rows])).tolist(),
+                documents=[emails[i]['email_content'] for i in rows],
+                metadatas=[metadata for _, metadata in new_rows]
+            )
+            for i, metadata in new_rows:
+                self._update_thread_summary(collections, metadata['thread_id'], cleaned[i], embeddings[i], metadata)
+        logger.info(f"Stored {len(new_rows)}/{len(emails)} email vectors for {tenant_id or 'default'} "
+                    f"(version {slot.version})")
+        return results
+
+    def _collapse_duplicate(self, slot: EmbeddingSlot, collections: TenantCollections, duplicate: DuplicateMatch,
+                            email_content: str, sender_info: str, date_time: str, email_id: str,
+                            additional_metadata: Optional[Dict], tenant_id: Optional[str]
+                            ) -> Tuple[bool, Optional[np.ndarray]]:
+        """Count a near-duplicate on its representative and fold it into its own thread, without encoding"""
+        if not duplicate.is_new:
+            return False, None
+        representative = collections.emails.get(ids=[duplicate.representative], include=["metadatas"])
+        if not representative['ids']:
+            # A migration target that has not backfilled the representative yet picks it up then
+            logger.debug(f"Representative {duplicate.representative} not in version {slot.version} yet")
+            return False, None
+
+        scope = self._scope(tenant_id)
+        metadata = dict(representative['metadatas'][0] or {})
+        metadata['duplicate_count'] = self.near_duplicates.member_count(scope, duplicate.representative) + 1
+        metadata['duplicate_ids'] = json.dumps(
+            self.near_duplicates.members(scope, duplicate.representative, self.near_duplicate_listed_ids)
+        )
+        timestamp = parse_timestamp(date_time)
+        if timestamp is not None:
+            metadata['last_duplicate_timestamp'] = timestamp
+        collections.emails.update(ids=[duplicate.representative], metadatas=[metadata])
+
+        # The sender's own thread still records the message, reusing the representative's vector
+        additional_metadata = dict(additional_metadata or {})
+        thread_id = self._resolve_thread_id(collections, additional_metadata, sender_info)
+        vector = self._stored_email_vector(slot, collections, duplicate.representative)
+        if vector is not None:
+            thread_metadata = {**additional_metadata, 'sender_info': sender_info, 'date_time': date_time,
+                               'email_id': email_id}
+            if timestamp is not None:
+                thread_metadata['timestamp'] = timestamp
+            self._update_thread_summary(collections, thread_id, clean_email_body(email_content), vector, thread_metadata)
+
+        logger.info(f"Collapsed email {email_id} into near-duplicate {duplicate.representative} "
+                    f"(similarity {duplicate.similarity:.2f}, {metadata['duplicate_count']} copies)")
+        return True, vector
+
+    def _stored_email_vector(self, slot: EmbeddingSlot, collections: TenantCollections,
+                             doc_id: str) -> Optional[np.ndarray]:
+        """Full-dimension vector of a stored email (from the rescore store when the index is compressed)"""
+        if slot.compressor.enabled:
+            return self.rescore_store.get_many(collections.emails.name, [doc_id]).get(doc_id)
+        stored = collections.emails.get(ids=[doc_id], include=["embeddings"])
+        if not stored['ids'] or stored['embeddings'] is None or not len(stored['embeddings']):
+            return None
+        return np.asarray(stored['embeddings'][0], dtype=np.float32)
+
+    def _index_email_vectors(self, slot: EmbeddingSlot, collections: TenantCollections,
+                             ids: List[str], embeddings: np.ndarray) -> np.ndarray:
+        """Vectors to put in the email index; with compression the full vectors go to the rescore store"""
+        if not slot.compressor.enabled:
+            return np.asarray(embeddings)
+        self.rescore_store.put_many(collections.emails.name, ids, embeddings)
+        return slot.compressor.compress(embeddings)
+
+    def _rescore_emails(self, slot: EmbeddingSlot, collections: TenantCollections, query_embedding: np.ndarray,
+                        results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Re-rank a compressed-index shortlist with full-precision vectors
+
+        Scores are on the index's similarity scale so rescored and uncompressed results stay comparable.
+        """
+        if not slot.compressor.enabled or not results:
+            return results
+        full_vectors = self.rescore_store.get_many(collections.emails.name, [result['id'] for result in results])
+        space = collections.space(collections.emails)
+        for result in results:
+            vector = full_vectors.get(result['id'])
+            if vector is not None:
+                result['similarity_score'] = float(vector_similarity(query_embedding, vector, space))
+        return sorted(results, key=lambda r: r['similarity_score'], reverse=True)
+
+    def _email_candidate_count(self, slot: EmbeddingSlot, n_results: int, half_life_days: float) -> int:
+        candidates = self._candidate_count(n_results, half_life_days)
+        return candidates * self.email_rescore_factor if slot.compressor.enabled else candidates
+
+    def _resolve_thread_id(self, collections: TenantCollections, metadata: Dict[str, Any], sender_info: str) -> str:
+        """Resolve the conversation thread for an email, following In-Reply-To to a stored parent"""
+        if not metadata.get('thread_id') and not metadata.get('references') and metadata.get('in_reply_to'):
+            try:
+                parent = collections.emails.get(
+                    where={"message_id": metadata['in_reply_to']},
+                    limit=1,
+                    include=["metadatas"]
+                )
+                if parent['metadatas'] and parent['metadatas'][0].get('thread_id'):
+                    return parent['metadatas'][0]['thread_id']
+            except Exception as e:
+                logger.warning(f"Parent thread lookup failed: {e}")
+
+        return resolve_thread_id(
+            thread_id=metadata.get('thread_id'),
+            message_id=metadata.get('message_id'),
+            references=metadata.get('references'),
+            subject=metadata.get('subject'),
+            sender_info=sender_info
+        )
+
+    @staticmethod
+    def _scrub_email(cleaned_content: str, sender_info: str, metadata: Dict[str, Any]) -> str:
+        """Redacted copy of an email body for readers other than its sender"""
+        return scrub_text(cleaned_content, known_names=sender_name_hints(sender_info, metadata.get('from_name', '')))
+
+    def _update_thread_summary(self, collections: TenantCollections, thread_id: str, cleaned_content: str,
+                               embedding: np.ndarray, metadata: Dict[str, Any]) -> None:
+        """Fold a message into its thread's rolling summary text and running-mean vector"""
+        record_id = f"thread_{thread_id}"
+        existing = collections.threads.get(ids=[record_id], include=["embeddings", "documents", "metadatas"])
+        sender_info = metadata.get('sender_info', 'unknown')
+        owner = existing['metadatas'][0].get('sender_info', '') if existing['ids'] else sender_info
+        # The summary is the owner's personal context, so other participants' words are redacted
+        author = sender_info
+        if sender_info.strip().lower() != owner.strip().lower():
+            cleaned_content = metadata.get('scrubbed_content') or self._scrub_email(cleaned_content, sender_info, metadata)
+            author = scrub_text(sender_info)
+        entry = f"[{metadata.get('date_time', '')}] {author}: {' '.join(cleaned_content.split())}"
+
+        if existing['ids']:
+            thread_metadata = dict(existing['metadatas'][0])
+            count = int(thread_metadata.get('message_count', 1))
+            previous = np.asarray(existing['embeddings'][0], dtype=np.float32)
+            thread_embedding = (previous * count + embedding) / (count + 1)
+            summary = f"{existing['documents'][0]}\n\n{entry}"
+            participants = set(filter(None, thread_metadata.get('participants', '').split(',')))
+        else:
+            # The first sender owns the thread for personal-context lookups
+            thread_metadata = {
+                'thread_id': thread_id,
+                'sender_info': metadata.get('sender_info', 'unknown'),
+                'subject': metadata.get('subject', ''),
+                'content_type': 'thread'
+            }
+            count = 0
+            thread_embedding = embedding
+            summary = entry
+            participants = set()
+
+        # Keep the most recent messages, dropping whole entries from the front
+        while len(summary) > self.thread_summary_max_chars and '\n\n' in summary:
+            summary = summary.split('\n\n', 1)[1]
+        summary = summary[-self.thread_summary_max_chars:]
+
+        participants.add(metadata.get('sender_info', 'unknown'))
+        thread_metadata.update({
+            'message_count': count + 1,
+            'last_email_id': metadata.get('email_id', ''),
+            'last_date_time': metadata.get('date_time', ''),
+            'last_timestamp': metadata.get('timestamp', 0.0),
+            'participants': ','.join(sorted(participants))
+        })
+
+        collections.threads.upsert(
+            ids=[record_id],
+            embeddings=[np.asarray(thread_embedding, dtype=np.float32).tolist()],
+            documents=[summary],
+            metadatas=[thread_metadata]
+        )
     
-    def search_documents(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Search documents using vector similarity"""
+    def _format_query_results(self, results: Dict[str, Any], query_index: int = 0,
+                              space: str = 'l2') -> List[Dict[str, Any]]:
+        """Format one query's slice of a ChromaDB query result, scoring distances of the collection's space"""
+        formatted_results = []
+        documents = results.get('documents')
+        metadatas = results.get('metadatas')
+        distances = results.get('distances')
+        if documents and documents[query_index] is not None and metadatas and metadatas[query_index] is not None and distances and distances[query_index] is not None:
+            for i in range(len(documents[query_index])):
+                formatted_results.append({
+                    'id': results['ids'][query_index][i],
+                    'content': documents[query_index][i],
+                    'metadata': metadatas[query_index][i],
+                    'similarity_score': distance_to_similarity(distances[query_index][i], space)
+                })
+        return formatted_results
+
+    def encode_query(self, query: str) -> QueryVector:
+        """Embed a query once so several searches (and intent routing) can share it"""
+        self.sync_registry()
+        slot = self.active_slot
+        return QueryVector(slot, self._encode(slot, [query], 'query'))
+
+    def _query_embedding(self, query: str, query_vector: Optional[QueryVector]):
+        # One slot per request so a cutover never pairs one model's query with another's index
+        if query_vector is not None:
+            return query_vector.slot, query_vector.embedding
+        self.sync_registry()
+        slot = self.active_slot
+        return slot, self._encode(slot, [query], 'query')
+
+    def search_documents(self, query: str, n_results: int = 5,
+                         tenant_id: Optional[str] = None,
+                         query_vector: Optional[QueryVector] = None,
+                         mmr_lambda: Optional[float] = None,
+                         ef: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search documents using vector similarity, optionally diversified with MMR"""
         try:
-            query_embedding = self.embedding_model.encode([query])
-            results = self.docs_collection.query(
+            slot, query_embedding = self._query_embedding(query, query_vector)
+            collections = self.find_collections(tenant_id, slot)
+            if collections is None:
+                return []
+            diversify = self._mmr_enabled(mmr_lambda)
+            results = collections.docs.query(
                 query_embeddings=query_embedding.tolist(),
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
+                n_results=self._fetch_count(n_results * self.mmr_fetch_factor if diversify else n_results, ef),
+                include=["documents", "metadatas", "distances"] + (["embeddings"] if diversify else [])
             )
             
             # Format results
-            formatted_results = []
-            documents = results.get('documents')
-            metadatas = results.get('metadatas')
-            distances = results.get('distances')
-            if documents and documents[0] is not None and metadatas and metadatas[0] is not None and distances and distances[0] is not None:
-                for i in range(len(documents[0])):
-                    formatted_results.append({
-                        'content': documents[0][i],
-                        'metadata': metadatas[0][i],
-                        'similarity_score': 1 - distances[0][i]
-                    })
-            else:
+            formatted_results = self._format_query_results(results, space=collections.space(collections.docs))
+            if diversify:
+                formatted_results = self._diversify(formatted_results, results, n_results, mmr_lambda)
+            formatted_results = formatted_results[:n_results]
+            if not formatted_results:
                 logger.warning("No results found for document search query.")
             
             return formatted_results
@@ -154,29 +1089,39 @@ class DocumentProcessor:
             logger.error(f"Document search failed: {str(e)}")
             return []
     
-    def search_emails(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Search emails using vector similarity"""
+    def search_emails(self, query: str, n_results: int = 5,
+                      max_age_days: Optional[float] = None,
+                      decay_half_life_days: Optional[float] = None,
+                      tenant_id: Optional[str] = None,
+                      query_vector: Optional[QueryVector] = None,
+                      mmr_lambda: Optional[float] = None,
+                      ef: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search emails using vector similarity, optionally windowed and decayed by recency and diversified with MMR"""
         try:
-            query_embedding = self.embedding_model.encode([query])
-            results = self.emails_collection.query(
-                query_embeddings=query_embedding.tolist(),
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
+            slot, query_embedding = self._query_embedding(query, query_vector)
+            collections = self.find_collections(tenant_id, slot)
+            if collections is None:
+                return []
+            half_life = self.decay_half_life_days if decay_half_life_days is None else decay_half_life_days
+            diversify = self._mmr_enabled(mmr_lambda)
+            candidates = self._email_candidate_count(slot, n_results, half_life)
+            results = collections.emails.query(
+                query_embeddings=slot.compressor.compress(query_embedding).tolist(),
+                n_results=self._fetch_count(max(candidates, n_results * self.mmr_fetch_factor) if diversify else candidates, ef),
+                where=self._recency_filter(max_age_days),
+                include=["documents", "metadatas", "distances"] + (["embeddings"] if diversify else [])
             )
             
             # Format results
-            formatted_results = []
-            documents = results.get('documents')
-            metadatas = results.get('metadatas')
-            distances = results.get('distances')
-            if documents and documents[0] is not None and metadatas and metadatas[0] is not None and distances and distances[0] is not None:
-                for i in range(len(documents[0])):
-                    formatted_results.append({
-                        'content': documents[0][i],
-                        'metadata': metadatas[0][i],
-                        'similarity_score': 1 - distances[0][i]
-                    })
-            else:
+            formatted_results = self._rescore_emails(
+                slot, collections, query_embedding[0],
+                self._format_query_results(results, space=collections.space(collections.emails))
+            )
+            formatted_results = self._apply_time_decay(formatted_results, half_life)
+            if diversify:
+                formatted_results = self._diversify(formatted_results, results, n_results, mmr_lambda)
+            formatted_results = formatted_results[:n_results]
+            if not formatted_results:
                 logger.warning("No results found for email search query.")
             
             return formatted_results
@@ -184,29 +1129,245 @@ class DocumentProcessor:
         except Exception as e:
             logger.error(f"Email search failed: {str(e)}")
             return []
+
+    def _fetch_count(self, n_results: int, ef: Optional[int] = None) -> int:
+        """Results to request so the index explores at least ef candidates (hnswlib searches with max(ef, k))"""
+        ef = self.query_ef if ef is None else ef
+        return max(n_results, ef or 0)
+
+    @staticmethod
+    def _mmr_enabled(mmr_lambda: Optional[float]) -> bool:
+        return mmr_lambda is not None and 0 <= mmr_lambda < 1
+
+    @staticmethod
+    def _diversify(formatted_results: List[Dict[str, Any]], results: Dict[str, Any], n_results: int,
+                   mmr_lambda: float) -> List[Dict[str, Any]]:
+        """Pick n_results by maximal marginal relevance over the candidates' index vectors"""
+        if len(formatted_results) <= 1:
+            return formatted_results
+        embeddings = results.get('embeddings')
+        if embeddings is None or not len(embeddings) or embeddings[0] is None:
+            return formatted_results[:n_results]
+        vectors = dict(zip(results['ids'][0], embeddings[0]))
+        order = mmr_select(
+            [result['similarity_score'] for result in formatted_results],
+            np.stack([np.asarray(vectors[result['id']], dtype=np.float32) for result in formatted_results]),
+            n_results, mmr_lambda
+        )
+        return [formatted_results[i] for i in order]
+
+    def _recency_filter(self, max_age_days: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Metadata pre-filter restricting email search to the recency window"""
+        window = self.recency_window_days if max_age_days is None else max_age_days
+        if not window or window <= 0:
+            return None
+        return {"timestamp": {"$gte": time.time() - window * 86400}}
+
+    def _candidate_count(self, n_results: int, half_life_days: float) -> int:
+        """Over-fetch when decay re-ranking may promote results from below the top n"""
+        return n_results * 3 if half_life_days and half_life_days > 0 else n_results
+
+    def _apply_time_decay(self, results: List[Dict[str, Any]], half_life_days: float) -> List[Dict[str, Any]]:
+        """Blend exponential recency decay into similarity_score and re-rank"""
+        if not half_life_days or half_life_days <= 0 or not results:
+            return results
+
+        now = time.time()
+        for result in results:
+            timestamp = (result['metadata'] or {}).get('timestamp')
+            if timestamp is None:
+                decay = 0.0
+            else:
+                age_days = max(0.0, (now - float(timestamp)) / 86400)
+                decay = math.exp(-math.log(2) * age_days / half_life_days)
+            # Scaling a negative score would move it up, so decay applies to the clamped score
+            score = max(result['similarity_score'], 0.0)
+            result['similarity_score'] = score * ((1 - self.decay_weight) + self.decay_weight * decay)
+
+        return sorted(results, key=lambda r: r['similarity_score'], reverse=True)
+
+    def backfill_timestamps(self, tenant_id: Optional[str] = None, batch_size: int = 500) -> int:
+        """Add timestamp metadata to emails stored before it existed, parsed from their date_time"""
+        collections = self.get_collections(tenant_id)
+        updated = 0
+        for collection in (collections.emails, collections.emails_cold):
+            for offset in range(0, collection.count(), batch_size):
+                page = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+                ids, metadatas = [], []
+                for email_id, metadata in zip(page['ids'], page['metadatas']):
+                    metadata = dict(metadata or {})
+                    if 'timestamp' in metadata or not metadata.get('date_time'):
+                        continue
+                    timestamp = parse_timestamp(metadata['date_time'])
+                    if timestamp is not None:
+                        metadata['timestamp'] = timestamp
+                        ids.append(email_id)
+                        metadatas.append(metadata)
+                if ids:
+                    collection.update(ids=ids, metadatas=metadatas)
+                    updated += len(ids)
+        if updated:
+            logger.info(f"Backfilled timestamps for {updated} emails ({tenant_id or 'default'})")
+        return updated
+
+    def backfill_sender_profiles(self, tenant_id: Optional[str] = None, batch_size: int = 500) -> int:
+        """Rebuild a tenant's sender profiles from its stored emails and return how many were folded in
+
+        Emails recorded by live writes while this runs are skipped, not counted twice.
+        """
+        if self.sender_profiles is None:
+            return 0
+        slot = self.active_slot
+        scope = self._scope(tenant_id)
+        collections = self.get_collections(tenant_id, slot)
+        self.sender_profiles.reset_scope(scope)
+        recorded = 0
+        for collection in (collections.emails, collections.emails_cold):
+            for offset in range(0, collection.count(), batch_size):
+                page = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+                if slot.compressor.layout != 'none':
+                    # The index holds compressed vectors; centroids are built from full ones
+                    full_vectors = self.rescore_store.get_many(collections.emails.name, page['ids'])
+                    vectors = [full_vectors.get(doc_id) for doc_id in page['ids']]
+                else:
+                    vectors = page['embeddings']
+                for doc_id, document, metadata, vector in zip(page['ids'], page['documents'], page['metadatas'], vectors):
+                    metadata = metadata or {}
+                    if not metadata.get('sender_info'):
+                        continue
+                    date_time = metadata.get('date_time', '')
+                    recorded += self.sender_profiles.record(
+                        scope, metadata['sender_info'], doc_id, clean_email_body(document or ''),
+                        metadata.get('timestamp') or parse_timestamp(date_time) or 0.0, date_time,
+                        metadata.get('subject', ''), vector, slot.version
+                    )
+        logger.info(f"Backfilled sender profiles from {recorded} emails ({tenant_id or 'default'})")
+        return recorded
+
+    def compact_emails(self, max_age_days: float, batch_size: int = 500,
+                       tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Move emails older than max_age_days from the hot collection into the cold collection"""
+        if self.target_slot is not None:
+            # Moving records while they are being re-embedded could drop them from the new version
+            logger.info("Skipping email compaction while an embedding migration is in progress")
+            return {'success': False, 'error': 'embedding migration in progress', 'emails_moved': 0}
+        try:
+            collections = self.get_collections(tenant_id)
+            cutoff = time.time() - max_age_days * 86400
+            moved = 0
+            while True:
+                batch = collections.emails.get(
+                    where={"timestamp": {"$lt": cutoff}},
+                    limit=batch_size,
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                if not batch['ids']:
+                    break
+
+                collections.emails_cold.upsert(
+                    ids=batch['ids'],
+                    embeddings=batch['embeddings'],
+                    documents=batch['documents'],
+                    metadatas=batch['metadatas']
+                )
+                collections.emails.delete(ids=batch['ids'])
+                moved += len(batch['ids'])
+
+            logger.info(f"Compacted {moved} emails older than {max_age_days} days into cold storage")
+            return {
+                'success': True,
+                'emails_moved': moved,
+                'hot_count': collections.emails.count(),
+                'cold_count': collections.emails_cold.count()
+            }
+
+        except Exception as e:
+            logger.error(f"Email compaction failed: {str(e)}")
+            return {'success': False, 'error': str(e), 'emails_moved': 0}
+
+    def search_threads(self, query: str, n_results: int = 3,
+                       sender_info: Optional[str] = None,
+                       tenant_id: Optional[str] = None,
+                       query_vector: Optional[QueryVector] = None,
+                       ef: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search conversation thread summaries, optionally restricted to one sender's threads"""
+        try:
+            slot, query_embedding = self._query_embedding(query, query_vector)
+            collections = self.find_collections(tenant_id, slot)
+            if collections is None:
+                return []
+            results = collections.threads.query(
+                query_embeddings=query_embedding.tolist(),
+                n_results=self._fetch_count(n_results, ef),
+                where={"sender_info": sender_info} if sender_info else None,
+                include=["documents", "metadatas", "distances"]
+            )
+            return self._format_query_results(results, space=collections.space(collections.threads))[:n_results]
+
+        except Exception as e:
+            logger.error(f"Thread search failed: {str(e)}")
+            return []
+
+    def search_context_batch(self, queries: List[str], n_results: int = 5,
+                             include_emails: bool = True,
+                             include_documents: bool = True,
+                             max_age_days: Optional[float] = None,
+                             tenant_id: Optional[str] = None,
+                             ef: Optional[int] = None) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """Search emails and documents for many queries with a single encode pass
+
+        Returns one {'emails': [...], 'documents': [...]} entry per query, in input order.
+        Search errors propagate, so callers never mistake a failure for an empty result.
+        """
+        batch_results = [{'emails': [], 'documents': []} for _ in queries]
+        if not queries:
+            return batch_results
+
+        self.sync_registry()
+        slot = self.active_slot
+        collections = self.find_collections(tenant_id, slot)
+        if collections is None:
+            return batch_results
+        query_embeddings = self._encode(slot, queries, 'query')
+
+        searches = []
+        if include_emails:
+            searches.append(('emails', collections.emails))
+        if include_documents:
+            searches.append(('documents', collections.docs))
+
+        # One query call per collection covers every query in the batch
+        for key, collection in searches:
+            is_email = key == 'emails'
+            half_life = self.decay_half_life_days if is_email else 0
+            results = collection.query(
+                query_embeddings=(slot.compressor.compress(query_embeddings) if is_email else query_embeddings).tolist(),
+                n_results=self._fetch_count(
+                    self._email_candidate_count(slot, n_results, half_life) if is_email else n_results, ef
+                ),
+                where=self._recency_filter(max_age_days) if is_email else None,
+                include=["documents", "metadatas", "distances"]
+            )
+            space = collections.space(collection)
+            for i in range(len(queries)):
+                formatted = self._format_query_results(results, i, space)
+                if is_email:
+                    formatted = self._rescore_emails(slot, collections, query_embeddings[i], formatted)
+                formatted = self._apply_time_decay(formatted, half_life)
+                batch_results[i][key] = formatted[:n_results]
+
+        logger.info(f"Batch context search completed for {len(queries)} queries")
+        return batch_results
     
-    def process_uploaded_document(self, content: str, filename: str) -> bool:
+    def process_uploaded_document(self, content: str, filename: str,
+                                  tenant_id: Optional[str] = None) -> bool:
         """Process uploaded document content and store in vector database"""
         try:
             # Simple chunking by paragraphs
-            chunks = [chunk.strip() for chunk in content.split('\n\n') if chunk.strip()]
+            chunks, ids, metadatas = chunk_sections(Path(filename).stem, filename, [(None, content)])
 
             # Generate embeddings and store
-            for i, chunk in enumerate(chunks):
-                embedding = self.embedding_model.encode([chunk])
-
-                self.docs_collection.add(
-                    ids=[f"{Path(filename).stem}_chunk_{i}"],
-                    embeddings=embedding.tolist(),
-                    documents=[chunk],
-                    metadatas=[{
-                        "source": Path(filename).stem,
-                        "chunk_id": i,
-                        "filename": filename,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    }]
-                )
+            self._store_document_chunks(tenant_id, chunks, ids, metadatas)
 
             logger.info(f"Processed {len(chunks)} chunks from uploaded file: {filename}")
             return True
@@ -215,19 +1376,416 @@ class DocumentProcessor:
             logger.error(f"Failed to process uploaded document: {str(e)}")
             return False
 
-    def get_stats(self) -> Dict[str, Any]:
-        """Get collection statistics"""
-        try:
-            return {
-                'documents_count': self.docs_collection.count(),
-                'emails_count': self.emails_collection.count(),
-                'embedding_model': self.embedding_model_name
+    def export_snapshot(self, path: str, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Dump a tenant's collections (ids, vectors, documents, metadata) to a snapshot file"""
+        slot = self.active_slot
+        return vector_snapshot.export_snapshot(
+            self.get_collections(tenant_id, slot), path, slot.model_name,
+            email_index=slot.compressor.layout, rescore_store=self.rescore_store
+        )
+
+    def restore_snapshot(self, path: str, tenant_id: Optional[str] = None, replace: bool = True) -> Dict[str, Any]:
+        """Bulk-load a snapshot built with the same embedding model; nothing is re-embedded"""
+        slot = self.active_slot
+        return vector_snapshot.restore_snapshot(
+            self.get_collections(tenant_id, slot), path, slot.model_name, replace=replace,
+            email_index=slot.compressor.layout, rescore_store=self.rescore_store
+        )
+
+    def fit_email_projection(self, sample_size: int = 20000, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Fit the PCA email projection from stored full vectors and rebuild every email index with it
+
+        The new projection only serves queries once the rebuild has finished.
+        """
+        self.sync_registry(max_age_seconds=0)
+        with self._migration_lock:
+            if self.target_slot is not None:
+                raise MigrationError("Cannot refit the email projection during an embedding migration")
+            slot = self.active_slot
+            if slot.compressor.method != 'pca':
+                raise ValueError(f"Email index layout is {slot.compressor.layout}, not pca")
+
+            namespace = self.get_collections(tenant_id, slot).emails.name
+            sample = [vectors for _, vectors in self.rescore_store.iter_vectors(namespace, limit=sample_size)]
+            compressor = VectorCompressor(slot.compressor.method, slot.compressor.dims, slot.compressor.projection_path)
+            result = compressor.fit(np.concatenate(sample) if sample else np.empty((0, 0), dtype=np.float32))
+
+            rebuilt = 0
+            for tenant in [None] + self.list_tenants(slot):
+                rebuilt += self._rebuild_email_index(self.get_collections(tenant, slot), compressor)
+            slot.compressor = compressor
+            if self.embedding_registry is not None:
+                # Other workers reload the projection when they see the registry change
+                self._projection_fitted_at = datetime.now().isoformat()
+                self.embedding_registry.state['active']['projection_fitted_at'] = self._projection_fitted_at
+                self.embedding_registry.save()
+
+        result.update({'email_index': compressor.layout, 'reindexed_emails': rebuilt})
+        logger.info(f"Fitted email projection {compressor.layout}: {result}")
+        return result
+
+    def _rebuild_email_index(self, collections: TenantCollections, compressor: VectorCompressor,
+                             batch_size: int = 1000) -> int:
+        """Recompute index vectors from the rescore store; nothing is re-embedded"""
+        namespace = collections.emails.name
+        rebuilt = 0
+        for collection in (collections.emails, collections.emails_cold):
+            for offset in range(0, collection.count(), batch_size):
+                ids = collection.get(limit=batch_size, offset=offset, include=[])['ids']
+                full_vectors = self.rescore_store.get_many(namespace, ids)
+                ids = [email_id for email_id in ids if email_id in full_vectors]
+                if ids:
+                    compressed = compressor.compress(np.stack([full_vectors[email_id] for email_id in ids]))
+                    collection.update(ids=ids, embeddings=compressed.tolist())
+                    rebuilt += len(ids)
+        return rebuilt
+
+    def email_recall_report(self, n_results: int = 10, sample_size: int = 100,
+                            queries: Optional[List[str]] = None,
+                            tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Recall@k and latency of the compressed email index, with and without rescoring
+
+        Ground truth is an exact scan over the full-precision vectors of the hot email
+        collection, in the collection's distance space. Without explicit queries, stored
+        email vectors are used as queries.
+        """
+        if not 1 <= sample_size <= MAX_RECALL_SAMPLE_SIZE:
+            raise ValueError(f"sample_size must be between 1 and {MAX_RECALL_SAMPLE_SIZE}")
+        if queries and len(queries) > MAX_RECALL_SAMPLE_SIZE:
+            raise ValueError(f"At most {MAX_RECALL_SAMPLE_SIZE} queries are supported")
+        if n_results < 1:
+            raise ValueError("n_results must be at least 1")
+        slot = self.active_slot
+        if not slot.compressor.enabled:
+            raise ValueError("Email index is not compressed; recall is exact")
+        collections = self.find_collections(tenant_id, slot)
+        if collections is None:
+            raise ValueError(f"Unknown tenant: {tenant_id}")
+        namespace = collections.emails.name
+
+        hot_ids = set()
+        for offset in range(0, collections.emails.count(), 1000):
+            hot_ids.update(collections.emails.get(limit=1000, offset=offset, include=[])['ids'])
+        if not hot_ids:
+            raise ValueError("No emails stored")
+
+        if queries:
+            query_vectors = np.asarray(self._encode(slot, queries, 'query'), dtype=np.float32)
+        else:
+            sample = [v for _, v in self.rescore_store.iter_vectors(namespace, limit=sample_size)]
+            query_vectors = np.concatenate(sample)
+        k = min(n_results, len(hot_ids))
+
+        # Exact top-k in the collection's space, streamed over the store and merged per block
+        space = collections.space(collections.emails)
+        best_ids = np.empty((len(query_vectors), 0), dtype=object)
+        best_score = np.empty((len(query_vectors), 0), dtype=np.float32)
+        exact_start = time.perf_counter()
+        for ids, vectors in self.rescore_store.iter_vectors(namespace):
+            keep = [i for i, email_id in enumerate(ids) if email_id in hot_ids]
+            if not keep:
+                continue
+            index, score = exact_top_k(query_vectors, vectors[keep], k, space)
+            block_ids = np.asarray([ids[i] for i in keep], dtype=object)[index]
+            merged_ids = np.concatenate([best_ids, block_ids], axis=1)
+            merged_score = np.concatenate([best_score, score], axis=1)
+            top = np.argsort(-merged_score, axis=1)[:, :k]
+            best_ids = np.take_along_axis(merged_ids, top, axis=1)
+            best_score = np.take_along_axis(merged_score, top, axis=1)
+        exact_ms = (time.perf_counter() - exact_start) * 1000 / len(query_vectors)
+
+        compressed_hits = rescored_hits = 0
+        compressed_ms = rescored_ms = 0.0
+        for q, query_vector in enumerate(query_vectors):
+            truth = set(best_ids[q].tolist())
+            compressed_query = slot.compressor.compress(query_vector).tolist()
+
+            start = time.perf_counter()
+            results = collections.emails.query(query_embeddings=compressed_query, n_results=k, include=[])
+            compressed_ms += (time.perf_counter() - start) * 1000
+            compressed_hits += len(truth & set(results['ids'][0]))
+
+            start = time.perf_counter()
+            results = collections.emails.query(
+                query_embeddings=compressed_query, n_results=k * self.email_rescore_factor,
+                include=["documents", "metadatas", "distances"]
+            )
+            rescored = self._rescore_emails(
+                slot, collections, query_vector,
+                self._format_query_results(results, space=collections.space(collections.emails))
+            )[:k]
+            rescored_ms += (time.perf_counter() - start) * 1000
+            rescored_hits += len(truth & {result['id'] for result in rescored})
+
+        full_dims = int(query_vectors.shape[1])
+        index_bytes = min(slot.compressor.dims, full_dims) * 4
+        rescore_bytes = full_dims * (1 if self.rescore_store.dtype == 'int8' else np.dtype(self.rescore_store.dtype).itemsize)
+        if self.rescore_store.dtype == 'int8':
+            rescore_bytes += 4
+        total = len(query_vectors) * k
+        return {
+            'email_index': slot.compressor.layout,
+            'pca_fitted': slot.compressor.fitted,
+            'rescore_dtype': self.rescore_store.dtype,
+            'rescore_factor': self.email_rescore_factor,
+            'queries': len(query_vectors),
+            'k': k,
+            'emails': len(hot_ids),
+            'recall_compressed': round(compressed_hits / total, 4),
+            'recall_rescored': round(rescored_hits / total, 4),
+            'latency_ms': {
+                'exact_scan': round(exact_ms, 3),
+                'compressed': round(compressed_ms / len(query_vectors), 3),
+                'rescored': round(rescored_ms / len(query_vectors), 3)
+            },
+            # Raw vector payload only; HNSW graph links add the same overhead in every layout
+            'bytes_per_vector': {
+                'uncompressed_index': full_dims * 4,
+                'compressed_index': index_bytes,
+                'rescore_store_on_disk': rescore_bytes
+            },
+            'index_mb_per_million_emails': {
+                'uncompressed': round(full_dims * 4 * 1e6 / 2 ** 20, 1),
+                'compressed': round(index_bytes * 1e6 / 2 ** 20, 1)
             }
+        }
+
+    def begin_migration(self, target_model: str, auto_cutover: bool = True) -> Dict[str, Any]:
+        """Load target_model into a new collection version and start dual-writing to it
+
+        The re-embedding of existing records is driven by EmbeddingMigrator.
+        """
+        self.sync_registry(max_age_seconds=0)
+        registry = self.embedding_registry
+        if registry is None:
+            raise MigrationError("Embedding migrations need a registry_path")
+        with self._migration_lock:
+            migration = registry.migration
+            if migration and migration['status'] in ('running', 'ready'):
+                raise MigrationError(f"Migration to {migration['target_model']} is already {migration['status']}")
+            if target_model == self.embedding_model_name and self.email_index_layout == self.active_slot.compressor.layout:
+                raise MigrationError(f"{target_model} with a {self.email_index_layout} email index is already active")
+
+            version = registry.state['next_version']
+            target_slot = self._make_slot(target_model, version, self.email_index_layout)
+            registry.state['next_version'] = version + 1
+            now = datetime.now().isoformat()
+            registry.state['migration'] = {
+                'source_model': self.active_slot.model_name,
+                'source_version': self.active_slot.version,
+                'target_model': target_model,
+                'target_version': version,
+                'target_email_index': self.email_index_layout,
+                'status': 'running',
+                'auto_cutover': auto_cutover,
+                'started_at': now,
+                'updated_at': now,
+                'finished_at': None,
+                'steps': [],
+                'processed': 0,
+                'backfill_seconds': 0.0,
+                'error': None
+            }
+            self.target_slot = target_slot
+            self.dual_write_errors = 0
+            registry.save()
+            logger.info(f"Started embedding migration {self.active_slot.model_name} -> {target_model} (version {version})")
+            return copy.deepcopy(registry.state['migration'])
+
+    def migrate_batch(self, tenant_id: Optional[str], key: str, offset: int, limit: int) -> int:
+        """Re-embed one page of an active collection into the migration target; returns records read"""
+        target_slot = self.target_slot
+        if target_slot is None:
+            raise MigrationError("No embedding migration in progress")
+        source = getattr(self.get_collections(tenant_id), key)
+        target_collections = self.get_collections(tenant_id, target_slot)
+
+        page = source.get(limit=limit, offset=offset, include=["documents", "metadatas"])
+        if not page['ids']:
+            return 0
+        documents = [document or '' for document in page['documents']]
+        if key == 'threads':
+            embeddings = self._thread_embeddings(target_collections, target_slot, page['metadatas'], documents)
+        elif key in ('emails', 'emails_cold'):
+            # Email documents are raw bodies; like at ingest only the newly written text is embedded
+            embeddings = self._index_email_vectors(
+                target_slot, target_collections, page['ids'],
+                self._encode(target_slot, [clean_email_body(document) for document in documents])
+            )
+        else:
+            embeddings = self._encode(target_slot, documents)
+
+        getattr(target_collections, key).upsert(
+            ids=page['ids'],
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=page['metadatas']
+        )
+        return len(page['ids'])
+
+    def _thread_embeddings(self, collections: TenantCollections, slot: EmbeddingSlot,
+                           metadatas: List[Dict[str, Any]], summaries: List[str]) -> np.ndarray:
+        """Thread vectors as the mean of their already re-embedded emails, like the running mean at ingest"""
+        thread_ids = [(metadata or {}).get('thread_id') for metadata in metadatas]
+        vectors: Dict[str, List[np.ndarray]] = {}
+        wanted = [thread_id for thread_id in thread_ids if thread_id]
+        if wanted:
+            for collection in (collections.emails, collections.emails_cold):
+                found = collection.get(where={"thread_id": {"$in": wanted}}, include=["embeddings", "metadatas"])
+                # Compressed index vectors live in a different space; use the full copies
+                full_vectors = self.rescore_store.get_many(collections.emails.name, found['ids']) \
+                    if slot.compressor.enabled else {}
+                for email_id, embedding, metadata in zip(found['ids'], found['embeddings'], found['metadatas']):
+                    vector = full_vectors.get(email_id, embedding)
+                    vectors.setdefault(metadata.get('thread_id'), []).append(np.asarray(vector, dtype=np.float32))
+
+        # Threads whose emails are gone fall back to embedding the summary text
+        missing = [i for i, thread_id in enumerate(thread_ids) if not vectors.get(thread_id)]
+        fallback = self._encode(slot, [summaries[i] for i in missing]) if missing else []
+        fallback_by_index = dict(zip(missing, fallback))
+        return np.stack([
+            fallback_by_index[i] if i in fallback_by_index else np.mean(vectors[thread_id], axis=0)
+            for i, thread_id in enumerate(thread_ids)
+        ])
+
+    def migration_mismatches(self) -> List[Dict[str, Any]]:
+        """Collections whose migration target holds fewer records than the active version"""
+        target_slot = self.target_slot
+        if target_slot is None:
+            return []
+        mismatches = []
+        for tenant_id in [None] + self.list_tenants():
+            source = self.get_collections(tenant_id)
+            target = self.get_collections(tenant_id, target_slot)
+            for key in MIGRATION_ORDER:
+                source_count, target_count = getattr(source, key).count(), getattr(target, key).count()
+                if target_count < source_count:
+                    mismatches.append({'tenant_id': tenant_id, 'collection': key,
+                                       'active_count': source_count, 'target_count': target_count})
+        return mismatches
+
+    def cutover_migration(self, force: bool = False) -> Dict[str, Any]:
+        """Atomically switch reads to the migrated version once its backfill is complete"""
+        self.sync_registry(max_age_seconds=0)
+        registry = self.embedding_registry
+        with self._migration_lock:
+            migration = registry.migration if registry else None
+            if not migration or migration['status'] != 'ready' or self.target_slot is None:
+                raise MigrationError("No completed migration backfill to cut over to")
+            mismatches = self.migration_mismatches()
+            if mismatches and not force:
+                raise MigrationError(f"Migration target is missing records: {mismatches}")
+
+            previous = self.active_slot
+            # A single reference swap: each request sees either the old or the new version, never a mix
+            self.active_slot = self.target_slot
+            self.target_slot = None
+            registry.state['previous'] = {'model': previous.model_name, 'version': previous.version,
+                                          'email_index': previous.compressor.layout}
+            registry.state['active'] = {'model': self.active_slot.model_name, 'version': self.active_slot.version,
+                                        'email_index': self.active_slot.compressor.layout}
+            migration['status'] = 'completed'
+            migration['cutover_at'] = datetime.now().isoformat()
+            migration['dual_write_errors'] = self.dual_write_errors
+            registry.save()
+            self._forget_version(previous.version)
+
+        logger.info(f"Embedding cutover complete: reads now use {self.active_slot.model_name} "
+                    f"(version {self.active_slot.version})")
+        return registry.snapshot()
+
+    def abort_migration(self) -> Dict[str, Any]:
+        """Stop dual-writing and delete the partially built target version"""
+        self.sync_registry(max_age_seconds=0)
+        registry = self.embedding_registry
+        with self._migration_lock:
+            migration = registry.migration if registry else None
+            if not migration or migration['status'] not in ('running', 'ready', 'failed'):
+                raise MigrationError("No embedding migration to abort")
+            self.target_slot = None
+            migration['status'] = 'cancelled'
+            migration['finished_at'] = datetime.now().isoformat()
+            registry.save()
+            self._forget_version(migration['target_version'])
+            dropped = self._drop_version_collections(migration['target_version'])
+        logger.info(f"Embedding migration to {migration['target_model']} aborted, dropped {dropped} collections")
+        return registry.snapshot()
+
+    def drop_previous_version(self) -> Dict[str, Any]:
+        """Delete the collections of the version replaced by the last cutover"""
+        self.sync_registry(max_age_seconds=0)
+        registry = self.embedding_registry
+        with self._migration_lock:
+            previous = registry.state.get('previous') if registry else None
+            if not previous:
+                raise MigrationError("No previous embedding version to drop")
+            dropped = self._drop_version_collections(previous['version'])
+            registry.state['previous'] = None
+            registry.save()
+        logger.info(f"Dropped {dropped} collections of {previous['model']} (version {previous['version']})")
+        return {'dropped_collections': dropped, 'model': previous['model'], 'version': previous['version']}
+
+    def _forget_version(self, version: int) -> None:
+        """Release cached collection handles of a version that no longer serves reads or writes"""
+        with self._tenant_lock:
+            self._default_collections.pop(version, None)
+            for key in [key for key in self._tenant_collections if key[0] == version]:
+                del self._tenant_collections[key]
+
+    def _drop_version_collections(self, version: int) -> int:
+        base_names = [versioned_collection_name(name, version) for name in self.collection_names.values()]
+        dropped = 0
+        for collection in self.chroma_client.list_collections():
+            name = getattr(collection, 'name', collection)
+            if any(name == base or name.startswith(f"{base}{TENANT_SEPARATOR}") for base in base_names):
+                self.chroma_client.delete_collection(name)
+                self.rescore_store.drop_namespace(name)
+                dropped += 1
+        return dropped
+
+    def get_stats(self, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get collection statistics, for one tenant or for every tenant on disk"""
+        try:
+            collections = self.find_collections(tenant_id)
+            if tenant_id:
+                stats = collections.counts() if collections is not None else self._existing_counts(tenant_id)
+                stats['tenant_id'] = tenant_id
+            else:
+                stats = self.default_collections.counts()
+                # Count without going through the LRU (or creating missing collections) so stats don't evict hot tenants
+                stats['tenants'] = {tenant: self._existing_counts(tenant) for tenant in self.list_tenants()}
+            stats['embedding_model'] = self.embedding_model_name
+            stats['embedding_version'] = self.active_slot.version
+            stats['email_index'] = self.active_slot.compressor.layout
+            stats['migration_target'] = self.target_slot.model_name if self.target_slot else None
+            stats['open_tenants'] = len(self._tenant_collections)
+            stats['index'] = {'configured': self.index_metadata, 'query_ef': self.query_ef,
+                              'spaces': collections.spaces if collections is not None else {}}
+            if self.near_duplicates is not None:
+                stats['near_duplicates'] = self.near_duplicates.stats()
+            if self.sender_profiles is not None:
+                stats['sender_profiles'] = self.sender_profiles.count()
+            return stats
         except Exception as e:
             logger.error(f"Failed to get stats: {str(e)}")
             return {'error': str(e)}
 
 
+def parse_timestamp(date_time: str) -> Optional[float]:
+    """Parse an email date string into epoch seconds (None if it cannot be parsed)"""
+    try:
+        parsed = datetime.fromisoformat(str(date_time).replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except (TypeError, ValueError):
+        try:
+            return parsedate_to_datetime(str(date_time)).timestamp()
+        except (TypeError, ValueError):
+            logger.warning(f"Unparseable email date '{date_time}', storing it without a timestamp")
+            return None
+
+
 # Convenience function
 def create_simple_processor(embedding_model: str = "all-MiniLM-L6-v2") -> DocumentProcessor:
     """Create a SimpleDocumentProcessor instance"""
@@ -1,59 +1,168 @@
 """Simple Email Fetcher for LangGraph Service"""
 import logging
 import asyncio
+import codecs
+import json
+import re
 import aiohttp
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 
+from src.services.email_threading import parse_references
+
 logger = logging.getLogger(__name__)
 
+EMAILS_ARRAY_PATTERN = re.compile(r'"emails"\s*:\s*\[')
+
+
+class _EmailArrayStreamParser:
+    """Incrementally decode the 'emails' array of a {success, emails: [...], ...} page
+
+    Items are decoded as soon as they are complete; the remaining top-level fields
+    are parsed once the stream ends.
+    """
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.prefix: Optional[str] = None
+        self.array_closed = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add a chunk of text and return any emails completed by it"""
+        self.buffer += chunk
+        items = []
+
+        if self.prefix is None:
+            match = EMAILS_ARRAY_PATTERN.search(self.buffer)
+            if not match:
+                return items
+            self.prefix = self.buffer[:match.start()]
+            self.buffer = self.buffer[match.end():]
+            self.position = 0
+
+        while not self.array_closed:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n,':
+                self.position += 1
+            if self.position >= len(self.buffer):
+                break
+            if self.buffer[self.position] == ']':
+                self.array_closed = True
+                self.position += 1
+                break
+            try:
+                item, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                break  # Item not complete yet
+            items.append(item)
+            self.position = end
+
+        # Drop consumed text so the buffer only holds the incomplete tail
+        if not self.array_closed and self.position:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        return items
+
+    def metadata(self) -> Dict[str, Any]:
+        """Top-level fields other than 'emails' (call after the stream ends)"""
+        if self.prefix is None:
+            return json.loads(self.buffer)
+        if not self.array_closed:
+            raise ValueError("Truncated backend response: emails array not closed")
+        data = json.loads(f"{self.prefix}\"emails\": []{self.buffer[self.position:]}")
+        data.pop('emails', None)
+        return data
+
+
 class SimpleEmailFetcher:
     """Simple email fetcher that connects to Backend API"""
 
-    def __init__(self, backend_url: str = "http://localhost:4000", document_processor=None):
+    def __init__(self, backend_url: str = "http://localhost:4000", document_processor=None,
+                 tenant_field: Optional[str] = None, page_size: int = 200,
+                 fetch_concurrency: int = 4, page_timeout: float = 60, page_retries: int = 2,
+                 stream_threshold_bytes: int = 1024 * 1024, stream_batch_size: int = 50,
+                 ingestion_queue=None, queue_poll_seconds: float = 1.0):
         self.backend_url = backend_url.rstrip('/')
         self.document_processor = document_processor
+        # Backend email field that selects the tenant collections (e.g. 'emailAccountId')
+        self.tenant_field = tenant_field
+
+        # Pagination and streaming settings
+        self.page_size = page_size
+        self.fetch_concurrency = fetch_concurrency
+        self.page_timeout = page_timeout
+        self.page_retries = page_retries
+        self.stream_threshold_bytes = stream_threshold_bytes
+        self.stream_batch_size = stream_batch_size
+
+        # Optional durable queue; when set, emails are enqueued instead of embedded inline
+        self.ingestion_queue = ingestion_queue
+        self.queue_poll_seconds = queue_poll_seconds
+
+        # Long-lived keep-alive session, created on first use inside the event loop
+        self._session: Optional[aiohttp.ClientSession] = None
         
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.fetch_concurrency * 2, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """Close the pooled HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     async def fetch_and_vectorize_emails(self) -> Dict[str, Any]:
         """
         Fetch new emails from Backend API and vectorize them
         
+        Pages are vectorized as they arrive while later pages are still downloading.
+
         Returns:
             Summary of fetching and vectorization results
         """
         try:
             logger.info("Starting automatic email fetch and vectorization...")
             
-            # Step 1: Fetch emails from Backend API
-            emails = await self._fetch_emails_from_backend()
-            
-            if not emails:
+            emails_fetched = 0
+            vectorized_count = 0
+            page_stats = {'pages_fetched': 0, 'pages_failed': 0}
+
+            async for batch in self.iter_email_batches(page_stats):
+                emails_fetched += len(batch)
+                for email in batch:
+                    try:
+                        success = await self._vectorize_email(email)
+                        if success:
+                            vectorized_count += 1
+                    except Exception as e:
+                        logger.error(f"Failed to vectorize email {email.get('_id', 'unknown')}: {str(e)}")
+                        continue
+
+            if not emails_fetched:
                 logger.info("No new emails found")
                 return {
-                    'success': True,
+                    'success': page_stats['pages_failed'] == 0,
                     'emails_fetched': 0,
                     'emails_vectorized': 0,
+                    **page_stats,
                     'message': 'No new emails to process'
                 }
 
-            logger.info(f"Fetched {len(emails)} emails from Backend")
-            
-            # Step 2: Vectorize emails using simple processor
-            vectorized_count = 0
-            for email in emails:
-                try:
-                    success = await self._vectorize_email(email)
-                    if success:
-                        vectorized_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to vectorize email {email.get('_id', 'unknown')}: {str(e)}")
-                    continue
-
+            message = (f"{'Queued' if self.ingestion_queue is not None else 'Processed'} "
+                       f"{vectorized_count}/{emails_fetched} emails")
+            if page_stats['pages_failed']:
+                message += f"; {page_stats['pages_failed']} pages failed and were skipped"
             result = {
-                'success': True,
-                'emails_fetched': len(emails),
+                'success': page_stats['pages_failed'] == 0,
+                'emails_fetched': emails_fetched,
                 'emails_vectorized': vectorized_count,
-                'message': f'Successfully processed {vectorized_count}/{len(emails)} emails'
+                'queued': self.ingestion_queue is not None,
+                **page_stats,
+                'message': message
             }
 
             logger.info(f"Email processing complete: {result['message']}")
@@ -67,34 +176,143 @@ class SimpleEmailFetcher:
                 'emails_fetched': 0,
                 'emails_vectorized': 0
             }
-    
-    async def _fetch_emails_from_backend(self) -> List[Dict[str, Any]]:
-        """Fetch emails from Backend API"""
+
+    async def iter_email_batches(self, page_stats: Optional[Dict[str, int]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield batches of emails as pages (or parts of large pages) arrive"""
+        page_stats = page_stats if page_stats is not None else {'pages_fetched': 0, 'pages_failed': 0}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.fetch_concurrency * 2)
+        producer = asyncio.create_task(self._produce_pages(queue, page_stats))
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.backend_url}/api/v1/emails/"  # Use correct endpoint
-                timeout = aiohttp.ClientTimeout(total=30)
-                async with session.get(url, timeout=timeout) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Handle the correct response format: {success: true, emails: [...]}
-                        if isinstance(data, dict) and data.get('success') and 'emails' in data:
-                            emails = data['emails']
-                            logger.info(f"Backend returned {len(emails)} emails (source: {data.get('source', 'unknown')})")
-                            return emails if isinstance(emails, list) else []
-                        else:
-                            logger.warning(f"Unexpected response format from backend: {type(data)}")
-                            return []
-                    else:
-                        logger.warning(f"Backend API returned status {response.status}")
-                        return []
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                yield batch
+        finally:
+            if not producer.done():
+                producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    async def _produce_pages(self, queue: asyncio.Queue, page_stats: Dict[str, int]) -> None:
+        """Fetch page 1, then the remaining pages concurrently within a bounded window"""
+        try:
+            first = await self._fetch_page_with_retries(1, queue, page_stats)
+            if first is None:
+                return
+
+            total_pages = first.get('totalPages') or first.get('total_pages')
+            has_more = first.get('hasMore', first.get('has_more'))
+            if total_pages is None and has_more is None:
+                # Backend does not paginate; page 1 was the whole mailbox
+                return
+
+            semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+            async def bounded_fetch(page: int) -> Optional[Dict[str, Any]]:
+                async with semaphore:
+                    return await self._fetch_page_with_retries(page, queue, page_stats)
+
+            if total_pages is not None:
+                await asyncio.gather(*(bounded_fetch(page) for page in range(2, int(total_pages) + 1)))
+                return
+
+            # Unknown page count: fetch windows of pages while any page in the window reports more;
+            # a page that failed after its retries is counted in pages_failed, not taken as the end
+            next_page = 2
+            while has_more:
+                window = range(next_page, next_page + self.fetch_concurrency)
+                results = await asyncio.gather(*(bounded_fetch(page) for page in window))
+                next_page += self.fetch_concurrency
+                has_more = any(
+                    result is not None and result.get('hasMore', result.get('has_more')) and result.get('_count', 0) > 0
+                    for result in results
+                )
+        finally:
+            await queue.put(None)
+
+    async def _fetch_page_with_retries(self, page: int, queue: asyncio.Queue,
+                                       page_stats: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """_fetch_page, retried with backoff; a retried page may re-queue emails, which stores skip"""
+        for attempt in range(self.page_retries + 1):
+            if attempt:
+                await asyncio.sleep(min(2 ** (attempt - 1), 10))
+                logger.info(f"Retrying backend page {page} (attempt {attempt + 1})")
+            metadata = await self._fetch_page(page, queue, page_stats)
+            if metadata is not None:
+                return metadata
+        page_stats['pages_failed'] += 1
+        return None
+
+    async def _fetch_page(self, page: int, queue: asyncio.Queue,
+                          page_stats: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """Fetch one page, pushing its emails to the queue; returns the page's metadata"""
+        url = f"{self.backend_url}/api/v1/emails/"  # Use correct endpoint
+        params = {'page': page, 'limit': self.page_size}
+        try:
+            session = await self._get_session()
+            timeout = aiohttp.ClientTimeout(total=self.page_timeout)
+            async with session.get(url, params=params, timeout=timeout) as response:
+                if response.status != 200:
+                    logger.warning(f"Backend API returned status {response.status} for page {page}")
+                    return None
+
+                content_length = response.content_length
+                if content_length is not None and content_length < self.stream_threshold_bytes:
+                    data = await response.json()
+                    # Handle the correct response format: {success: true, emails: [...]}
+                    if not (isinstance(data, dict) and data.get('success') and isinstance(data.get('emails'), list)):
+                        logger.warning(f"Unexpected response format from backend: {type(data)}")
+                        return None
+                    emails = data.pop('emails')
+                    for start in range(0, len(emails), self.stream_batch_size):
+                        await queue.put(emails[start:start + self.stream_batch_size])
+                    metadata = data
+                    count = len(emails)
+                else:
+                    metadata, count = await self._stream_page(response, queue)
+                    if not metadata.get('success'):
+                        logger.warning(f"Backend page {page} streamed without success flag")
+
+            page_stats['pages_fetched'] += 1
+            metadata['_count'] = count
+            logger.info(f"Backend page {page}: {count} emails (source: {metadata.get('source', 'unknown')})")
+            return metadata
+
         except aiohttp.ClientError as e:
             logger.warning(f"Could not connect to Backend API: {str(e)}")
-            return []
+        except asyncio.TimeoutError:
+            logger.warning(f"Backend page {page} timed out after {self.page_timeout}s")
         except Exception as e:
-            logger.error(f"Error fetching emails from Backend: {str(e)}")
-            return []
+            logger.error(f"Error fetching emails from Backend (page {page}): {str(e)}")
+        return None
+
+    async def _stream_page(self, response: aiohttp.ClientResponse, queue: asyncio.Queue):
+        """Decode a large page incrementally, queueing emails in batches as they complete"""
+        parser = _EmailArrayStreamParser()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        pending: List[Dict[str, Any]] = []
+        count = 0
+
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            for email in parser.feed(decoder.decode(chunk)):
+                pending.append(email)
+                if len(pending) >= self.stream_batch_size:
+                    await queue.put(pending)
+                    count += len(pending)
+                    pending = []
+        parser.feed(decoder.decode(b'', final=True))
+
+        if pending:
+            await queue.put(pending)
+            count += len(pending)
+        return parser.metadata(), count
     
+    async def _wait_for_queue_capacity(self) -> None:
+        """Backpressure: pause fetching while the ingestion queue is full"""
+        while self.ingestion_queue.is_full():
+            logger.info("Ingestion queue full, pausing email fetch")
+            await asyncio.sleep(self.queue_poll_seconds)
+
     async def _vectorize_email(self, email: Dict[str, Any]) -> bool:
         """Vectorize a single email using the simple processor"""
         try:
@@ -103,10 +321,14 @@ class SimpleEmailFetcher:
             sender_info = email.get('from', 'unknown@example.com')
             date_time = email.get('receivedAt', email.get('createdAt', datetime.now().isoformat()))  # Backend uses 'receivedAt'
             email_id = email.get('id', email.get('_id', f"email_{datetime.now().timestamp()}"))  # Backend uses 'id'
+            tenant_id = email.get(self.tenant_field) if self.tenant_field else None
             additional_metadata = {
                 'subject': email.get('subject', ''),
                 'to': email.get('to', ''),
                 'message_id': email.get('messageId', ''),  # Backend uses 'messageId'
+                'thread_id': email.get('threadId') or '',
+                'in_reply_to': email.get('inReplyTo') or '',
+                'references': ' '.join(parse_references(email.get('references'))),
                 'from_name': email.get('fromName', ''),
                 'priority': email.get('priority', 'normal'),
                 'read': email.get('read', False),
@@ -117,15 +339,26 @@ class SimpleEmailFetcher:
                 logger.warning(f"Skipping email {email_id}: empty content")
                 return False
 
+            payload = {
+                'email_content': email_content,
+                'sender_info': sender_info,
+                'date_time': date_time,
+                'email_id': email_id,
+                'additional_metadata': additional_metadata,
+                'tenant_id': tenant_id
+            }
+
+            # Hand off to the durable queue when configured; its consumers do the embedding
+            if self.ingestion_queue is not None:
+                await self._wait_for_queue_capacity()
+                self.ingestion_queue.enqueue(payload)
+                logger.info(f"Queued email for vectorization: {email_id} from {sender_info}")
+                return True
+
             # Use document processor to store email if available
             if self.document_processor:
-                success = self.document_processor.store_email_vector(
-                    email_content=email_content,
-                    sender_info=sender_info,
-                    date_time=date_time,
-                    email_id=email_id,
-                    additional_metadata=additional_metadata
-                )
+                # Embedding is CPU/GPU bound; keep it off the event loop
+                success = await asyncio.to_thread(self.document_processor.store_email_vector, **payload)
             else:
                 logger.warning("No document processor available for vectorization")
                 success = False
@@ -138,55 +371,6 @@ class SimpleEmailFetcher:
         except Exception as e:
             logger.error(f"Error vectorizing email: {str(e)}")
             return False
-    
-    def fetch_and_vectorize_emails_sync(self) -> Dict[str, Any]:
-        """Synchronous wrapper for async email fetching"""
-        try:
-            import asyncio
-            import threading
-
-            # Check if we're already in an event loop
-            try:
-                loop = asyncio.get_running_loop()
-                # If we're in an event loop, run in a thread
-                result = None
-                exception = None
-
-                def run_in_thread():
-                    nonlocal result, exception
-                    try:
-                        new_loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(new_loop)
-                        result = new_loop.run_until_complete(self.fetch_and_vectorize_emails())
-                        new_loop.close()
-                    except Exception as e:
-                        exception = e
-
-                thread = threading.Thread(target=run_in_thread)
-                thread.start()
-                thread.join()
-
-                if exception:
-                    raise exception
-                return result
-
-            except RuntimeError:
-                # No event loop running, we can create one
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    return loop.run_until_complete(self.fetch_and_vectorize_emails())
-                finally:
-                    loop.close()
-
-        except Exception as e:
-            logger.error(f"Sync email fetch failed: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'emails_fetched': 0,
-                'emails_vectorized': 0
-            }
 
 
 def create_email_fetcher(backend_url: str = "http://localhost:4000", simple_processor=None) -> SimpleEmailFetcher:
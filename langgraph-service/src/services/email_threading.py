@@ -0,0 +1,113 @@
+"""
+Email Threading Utilities
+Quoted-text/signature stripping and conversation thread resolution
+"""
+
+import re
+from typing import Optional, List
+
+# Reply headers that introduce quoted history ("On Mon, ... wrote:", Outlook blocks)
+QUOTE_HEADER_PATTERNS = [
+    # Clients wrap long headers, so "wrote:" may end the next line, but never further down
+    re.compile(r'^[ \t]*On[ \t][^\n]{0,200}?(?:\n[^\n]{0,200}?)?wrote:[ \t]*$', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^\s*-{2,}\s*Original Message\s*-{2,}\s*$', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^\s*-{2,}\s*Forwarded message\s*-{2,}\s*$', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^\s*From:\s.+\n\s*(Sent|Date):\s.+$', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^\s*_{10,}\s*$', re.MULTILINE),
+]
+
+# Lines that can start a signature block: the "-- " delimiter and mobile footers
+SIGNATURE_PATTERNS = [
+    re.compile(r'^--\s*$'),
+    re.compile(r'^\s*Sent from my \w+.*$', re.IGNORECASE),
+    re.compile(r'^\s*Get Outlook for \w+.*$', re.IGNORECASE),
+]
+
+# Sign-offs start a signature too, but never on the first line
+SIGN_OFF_PATTERN = re.compile(
+    r'^\s*(best regards|kind regards|warm regards|regards|best|thanks|thank you|cheers|sincerely)[,!.]?\s*$',
+    re.IGNORECASE
+)
+# A signature is a short trailing block (name, title, company, phone, links)
+SIGNATURE_MAX_LINES = 6
+# Lines that are still the customer writing: questions, postscripts and full sentences
+SIGNATURE_CONTENT_PATTERN = re.compile(r'\?|^\s*P\.?\s?S\b|\S+(?:\s+\S+){4,}[.!:]\s*$|(?:\S+\s+){8,}\S', re.IGNORECASE)
+
+SUBJECT_PREFIX_PATTERN = re.compile(r'^\s*((re|fw|fwd|aw|sv)\s*(\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+MESSAGE_ID_PATTERN = re.compile(r'<[^<>\s]+>')
+
+
+def strip_quoted_text(text: str) -> str:
+    """Remove quoted reply history, keeping only the newly written part"""
+    cut = len(text)
+    for pattern in QUOTE_HEADER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            cut = min(cut, match.start())
+    text = text[:cut]
+
+    # Drop '>' quoted lines that survive without a reply header
+    lines = [line for line in text.split('\n') if not line.lstrip().startswith('>')]
+    return '\n'.join(lines).strip()
+
+
+def _is_signature_block(lines: List[str]) -> bool:
+    content = [line for line in lines if line.strip()]
+    return len(content) <= SIGNATURE_MAX_LINES and not any(SIGNATURE_CONTENT_PATTERN.search(line) for line in content)
+
+
+def strip_signature(text: str) -> str:
+    """Remove a trailing signature block
+
+    A delimiter, footer or sign-off line only starts a signature when everything after it
+    is a short block without questions or sentences, so text written after one is kept.
+    """
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if any(pattern.match(line) for pattern in SIGNATURE_PATTERNS) or (i > 0 and SIGN_OFF_PATTERN.match(line)):
+            if _is_signature_block(lines[i + 1:]):
+                return '\n'.join(lines[:i]).strip()
+    return text.strip()
+
+
+def clean_email_body(text: str) -> str:
+    """Strip quoted history and signatures; falls back to the original text if nothing remains"""
+    if not text:
+        return ''
+    cleaned = strip_signature(strip_quoted_text(text.replace('\r\n', '\n')))
+    return cleaned if cleaned else text.strip()
+
+
+def normalize_subject(subject: Optional[str]) -> str:
+    """Lower-case subject with Re:/Fwd: prefixes removed"""
+    if not subject:
+        return ''
+    return SUBJECT_PREFIX_PATTERN.sub('', subject).strip().lower()
+
+
+def parse_references(references) -> List[str]:
+    """Parse a References header (string or list) into message ids, oldest first"""
+    if not references:
+        return []
+    if isinstance(references, (list, tuple)):
+        references = ' '.join(str(ref) for ref in references)
+    ids = MESSAGE_ID_PATTERN.findall(references)
+    return ids if ids else references.split()
+
+
+def resolve_thread_id(thread_id: Optional[str] = None, message_id: Optional[str] = None,
+                      references=None, subject: Optional[str] = None,
+                      sender_info: Optional[str] = None) -> str:
+    """Resolve a stable conversation id for an email
+
+    Priority: explicit thread id, root of the References chain, the message's own id,
+    then a normalized subject + sender key.
+    """
+    if thread_id:
+        return str(thread_id)
+    reference_ids = parse_references(references)
+    if reference_ids:
+        return reference_ids[0]
+    if message_id:
+        return str(message_id)
+    return f"subject:{normalize_subject(subject)}|{(sender_info or '').lower()}"
@@ -0,0 +1,207 @@
+"""
+Embedding Migration
+Versioned collections per embedding model, with a background re-embedding job that
+fills the new version while writes go to both, followed by an atomic read cutover.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Threads are rebuilt last, from the already re-embedded email vectors
+MIGRATION_ORDER = ('docs', 'emails', 'emails_cold', 'threads')
+
+
+class MigrationError(Exception):
+    """Raised when a migration action is not valid in the current migration state"""
+
+
+def versioned_collection_name(base_name: str, version: int) -> str:
+    """Collection name for a model version; version 0 keeps the original unversioned names"""
+    return base_name if version == 0 else f"{base_name}_v{version}"
+
+
+class EmbeddingRegistry:
+    """JSON record of the model version serving reads and any migration in progress"""
+
+    def __init__(self, path: str, initial_model: str, initial_email_index: str = 'none'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        if os.path.exists(path):
+            self.reload_if_changed()
+        else:
+            # Existing unversioned collections belong to the model the service was deployed with
+            self.state = {
+                'active': {'model': initial_model, 'version': 0, 'email_index': initial_email_index},
+                'previous': None,
+                'next_version': 1,
+                'migration': None
+            }
+            self.save()
+
+    @property
+    def active(self) -> Dict[str, Any]:
+        return self.state['active']
+
+    @property
+    def migration(self) -> Optional[Dict[str, Any]]:
+        return self.state.get('migration')
+
+    def save(self) -> None:
+        """Write the registry atomically"""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def reload_if_changed(self) -> bool:
+        """Re-read the registry if another process saved it; True when the state changed"""
+        with self._lock:
+            try:
+                mtime_ns = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime_ns == self._mtime_ns:
+                return False
+            with open(self.path, encoding='utf-8') as f:
+                self.state = json.load(f)
+            self._mtime_ns = mtime_ns
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self.state)
+
+
+class EmbeddingMigrator:
+    """Background re-embedding job driving DocumentProcessor's pending migration"""
+
+    def __init__(self, document_processor, batch_size: int = 256):
+        self.document_processor = document_processor
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def registry(self) -> EmbeddingRegistry:
+        return self.document_processor.embedding_registry
+
+    def start(self) -> None:
+        """Run (or resume after a restart) the backfill of a running migration"""
+        migration = self.registry.migration
+        if self._task is not None and not self._task.done():
+            return
+        if not migration or migration['status'] != 'running':
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Embedding migration to {migration['target_model']} running in background")
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def progress(self) -> Dict[str, Any]:
+        """Migration state with overall completion, throughput and ETA"""
+        state = self.registry.snapshot()
+        migration = state.get('migration')
+        progress = {
+            'active_model': state['active']['model'],
+            'active_version': state['active']['version'],
+            'previous': state.get('previous'),
+            'migration': migration,
+            'backfill_running': self._task is not None and not self._task.done()
+        }
+        if migration and migration.get('steps'):
+            total = sum(step['total'] for step in migration['steps'])
+            done = sum(min(step['done'], step['total']) for step in migration['steps'])
+            elapsed = max(1e-6, migration.get('backfill_seconds', 0.0))
+            rate = migration.get('processed', 0) / elapsed
+            progress.update({
+                'total_records': total,
+                'migrated_records': done,
+                'percent_complete': round(100.0 * done / total, 2) if total else 100.0,
+                'records_per_second': round(rate, 2),
+                'eta_seconds': round((total - done) / rate, 1) if rate > 0 else None
+            })
+        return progress
+
+    def _plan(self, migration: Dict[str, Any]) -> None:
+        """One step per tenant collection, sized from the active version"""
+        processor = self.document_processor
+        steps = []
+        for tenant_id in [None] + processor.list_tenants():
+            collections = processor.get_collections(tenant_id)
+            for key in MIGRATION_ORDER:
+                steps.append({
+                    'tenant_id': tenant_id,
+                    'collection': key,
+                    'total': getattr(collections, key).count(),
+                    'done': 0
+                })
+        migration['steps'] = steps
+        self.registry.save()
+
+    async def _run(self) -> None:
+        migration = self.registry.migration
+        try:
+            if not migration.get('steps'):
+                await asyncio.to_thread(self._plan, migration)
+
+            for step in migration['steps']:
+                while step['done'] < step['total']:
+                    batch_start = time.perf_counter()
+                    read = await asyncio.to_thread(
+                        self.document_processor.migrate_batch,
+                        step['tenant_id'], step['collection'], step['done'], self.batch_size
+                    )
+                    if read == 0:
+                        step['total'] = step['done']
+                        break
+                    step['done'] += read
+                    migration['processed'] = migration.get('processed', 0) + read
+                    migration['backfill_seconds'] = migration.get('backfill_seconds', 0.0) + time.perf_counter() - batch_start
+                    migration['updated_at'] = datetime.now().isoformat()
+                    self.registry.save()
+
+            # Writes that raced the start of dual-writing are caught by one full re-scan
+            for mismatch in await asyncio.to_thread(self.document_processor.migration_mismatches):
+                logger.info(f"Re-scanning {mismatch} before cutover")
+                offset = 0
+                while True:
+                    read = await asyncio.to_thread(
+                        self.document_processor.migrate_batch,
+                        mismatch['tenant_id'], mismatch['collection'], offset, self.batch_size
+                    )
+                    if read == 0:
+                        break
+                    offset += read
+
+            migration['status'] = 'ready'
+            migration['finished_at'] = datetime.now().isoformat()
+            self.registry.save()
+            logger.info(f"Embedding migration backfill complete ({migration.get('processed', 0)} records)")
+
+            if migration.get('auto_cutover'):
+                await asyncio.to_thread(self.document_processor.cutover_migration)
+
+        except asyncio.CancelledError:
+            # Progress is saved per batch; the backfill resumes on the next start()
+            raise
+        except Exception as e:
+            logger.error(f"Embedding migration failed: {str(e)}")
+            migration['status'] = 'failed'
+            migration['error'] = str(e)
+            self.registry.save()
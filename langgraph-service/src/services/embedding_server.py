@@ -0,0 +1,256 @@
+"""
+Embedding Server
+Sidecar process that holds the embedding models once for every API worker. Workers send
+texts over a Unix socket and get float32 vectors back; concurrent requests for the same
+model are merged into one encode call.
+
+Usage (from langgraph-service/):
+    python -m src.services.embedding_server [--socket PATH] [--device cpu|cuda]
+
+Wire format: every message is a 4-byte big-endian length followed by a JSON header;
+responses append the raw float32 matrix described by the header's shape.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# encode() options forwarded to the server; everything else is client-side only
+FORWARDED_ENCODE_OPTIONS = ('batch_size', 'normalize_embeddings')
+
+
+def _frame(header: Dict[str, Any], payload: bytes = b'') -> bytes:
+    encoded = json.dumps(header).encode('utf-8')
+    return struct.pack('>I', len(encoded)) + encoded + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Embedding server closed the connection")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+class EmbeddingServerError(Exception):
+    """Raised when the embedding server rejects or fails a request"""
+
+
+class RemoteEmbeddingModel:
+    """Drop-in for SentenceTransformer.encode backed by the embedding server"""
+
+    def __init__(self, socket_path: str, model_name: str, timeout: float = 120):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.timeout = timeout
+        # One connection per thread; requests on a connection are strictly sequential
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _request(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                sock.sendall(_frame(header))
+                (length,) = struct.unpack('>I', _recv_exact(sock, 4))
+                response = json.loads(_recv_exact(sock, length).decode('utf-8'))
+                payload = _recv_exact(sock, response.get('payload_bytes', 0))
+                break
+            except (ConnectionError, BrokenPipeError, socket.timeout, OSError):
+                # A server restart invalidates pooled connections; reconnect once
+                sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+        if response.get('error'):
+            raise EmbeddingServerError(response['error'])
+        return response, payload
+
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        options = {key: kwargs[key] for key in FORWARDED_ENCODE_OPTIONS if key in kwargs}
+        response, payload = self._request({'op': 'encode', 'model': self.model_name, 'texts': texts, 'options': options})
+        vectors = np.frombuffer(payload, dtype=np.float32).reshape(response['shape'])
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._request({'op': 'info', 'model': self.model_name})[0]['dimension']
+
+
+def wait_for_server(socket_path: str, timeout: float = 300) -> None:
+    """Block until the server accepts connections (model loading can take minutes)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(socket_path)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Embedding server at {socket_path} did not start within {timeout}s")
+            time.sleep(0.2)
+
+
+class EmbeddingServer:
+    """Serves encode requests for lazily loaded models, merging concurrent requests per model"""
+
+    def __init__(self, socket_path: str, device: str = "cpu", preload: Optional[List[str]] = None,
+                 max_batch_texts: int = 256, max_wait_ms: float = 2.0, encode_threads: int = 1):
+        self.socket_path = socket_path
+        self.device = device
+        self.preload = preload or []
+        self.max_batch_texts = max_batch_texts
+        self.max_wait_seconds = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=encode_threads, thread_name_prefix="embed")
+        self._models: Dict[str, Any] = {}
+        self._model_lock = threading.Lock()
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self.stats = {'requests': 0, 'texts': 0, 'encode_calls': 0}
+
+    def _model(self, model_name: str):
+        with self._model_lock:
+            if model_name not in self._models:
+                from sentence_transformers import SentenceTransformer
+                try:
+                    self._models[model_name] = SentenceTransformer(model_name, device=self.device)
+                except Exception as e:
+                    logger.warning(f"Failed to load {model_name} on {self.device}, falling back to CPU: {e}")
+                    self._models[model_name] = SentenceTransformer(model_name, device="cpu")
+                logger.info(f"Embedding server loaded {model_name}")
+            return self._models[model_name]
+
+    def _encode(self, model_name: str, texts: List[str], options: Dict[str, Any]) -> np.ndarray:
+        return np.asarray(self._model(model_name).encode(texts, **options), dtype=np.float32)
+
+    async def _batch_loop(self, model_name: str, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait_seconds
+            while sum(len(item[0]) for item in batch) < self.max_batch_texts:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests with different encode options cannot share a call
+            groups: Dict[str, List[Tuple[List[str], Dict[str, Any], asyncio.Future]]] = {}
+            for item in batch:
+                groups.setdefault(json.dumps(item[1], sort_keys=True), []).append(item)
+            for items in groups.values():
+                texts = [text for item in items for text in item[0]]
+                try:
+                    vectors = await loop.run_in_executor(self._executor, self._encode, model_name, texts, items[0][1])
+                    self.stats['encode_calls'] += 1
+                except Exception as e:
+                    for item in items:
+                        if not item[2].done():
+                            item[2].set_exception(e)
+                    continue
+                offset = 0
+                for item_texts, _, future in items:
+                    if not future.done():
+                        future.set_result(vectors[offset:offset + len(item_texts)])
+                    offset += len(item_texts)
+
+    async def encode(self, model_name: str, texts: List[str], options: Dict[str, Any]) -> np.ndarray:
+        queue = self._queues.get(model_name)
+        if queue is None:
+            queue = self._queues[model_name] = asyncio.Queue()
+            asyncio.create_task(self._batch_loop(model_name, queue))
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((texts, options, future))
+        return await future
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    (length,) = struct.unpack('>I', await reader.readexactly(4))
+                except asyncio.IncompleteReadError:
+                    return
+                request = json.loads((await reader.readexactly(length)).decode('utf-8'))
+                try:
+                    if request.get('op') == 'info':
+                        model = await asyncio.get_running_loop().run_in_executor(
+                            self._executor, self._model, request['model']
+                        )
+                        writer.write(_frame({'dimension': model.get_sentence_embedding_dimension()}))
+                    elif request.get('op') == 'stats':
+                        writer.write(_frame({**self.stats, 'models': list(self._models)}))
+                    else:
+                        self.stats['requests'] += 1
+                        self.stats['texts'] += len(request['texts'])
+                        vectors = await self.encode(request['model'], request['texts'], request.get('options', {}))
+                        payload = np.ascontiguousarray(vectors, dtype=np.float32).tobytes()
+                        writer.write(_frame({'shape': list(vectors.shape), 'payload_bytes': len(payload)}, payload))
+                except Exception as e:
+                    logger.error(f"Embedding request failed: {str(e)}")
+                    writer.write(_frame({'error': str(e)}))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        for model_name in self.preload:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._model, model_name)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        logger.info(f"Embedding server listening on {self.socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+def _main(argv=None) -> int:
+    import argparse
+    import config
+
+    parser = argparse.ArgumentParser(description="Serve embeddings to API workers over a Unix socket")
+    parser.add_argument("--socket", default=config.EMBEDDING_SERVER_SOCKET or "./embedding_server.sock")
+    parser.add_argument("--device", default=config.TORCH_DEVICE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    server = EmbeddingServer(
+        args.socket, device=args.device, preload=[config.EMBEDDING_MODEL],
+        max_batch_texts=config.EMBEDDING_SERVER_MAX_BATCH, max_wait_ms=config.EMBEDDING_SERVER_MAX_WAIT_MS
+    )
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,208 @@
+"""
+Encode Executor
+Bounded thread or process pools for embedding encodes, so CPU-bound work runs in
+parallel off the asyncio event loop. Process pools load the model once per child and
+return vectors through shared memory instead of pickling them.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ('inline', 'thread', 'process')
+
+# Per-child state of a process pool
+_worker_config: Dict[str, Any] = {}
+_worker_models: Dict[str, Any] = {}
+
+
+def _set_torch_threads(torch_threads: int) -> None:
+    if torch_threads > 0:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+
+def _init_process_worker(torch_threads: int, device: str, embedding_server_socket: Optional[str]) -> None:
+    _set_torch_threads(torch_threads)
+    _worker_config.update(device=device, embedding_server_socket=embedding_server_socket)
+
+
+def _worker_model(model_name: str):
+    if model_name not in _worker_models:
+        if _worker_config.get('embedding_server_socket'):
+            from src.services.embedding_server import RemoteEmbeddingModel
+            _worker_models[model_name] = RemoteEmbeddingModel(_worker_config['embedding_server_socket'], model_name)
+        else:
+            from sentence_transformers import SentenceTransformer
+            _worker_models[model_name] = SentenceTransformer(model_name, device=_worker_config.get('device', 'cpu'))
+    return _worker_models[model_name]
+
+
+def _encode_in_worker(model_name: str, texts: List[str], out_name: Optional[str] = None,
+                      out_offset: int = 0) -> Tuple[str, Tuple[int, ...]]:
+    """Encode in a pool child and write the vectors into shared memory; returns (block name, shape)"""
+    vectors = np.ascontiguousarray(_worker_model(model_name).encode(texts), dtype=np.float32)
+    if out_name is not None:
+        # Attaching re-registers the caller's block with the shared tracker, which is a no-op
+        block = SharedMemory(name=out_name)
+    else:
+        block = SharedMemory(create=True, size=max(1, vectors.nbytes))
+        # The parent unlinks the block once it has copied the vectors out
+        _untrack(block)
+        out_offset = 0
+    np.ndarray(vectors.shape, dtype=np.float32, buffer=block.buf, offset=out_offset * vectors.itemsize)[:] = vectors
+    name = block.name
+    block.close()
+    return name, vectors.shape
+
+
+def _untrack(block: SharedMemory) -> None:
+    # Only the creating side should unlink; keep the resource tracker from cleaning up early
+    try:
+        resource_tracker.unregister(block._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+class SharedVectorBuffer:
+    """Float32 matrix in shared memory that pool workers can encode straight into"""
+
+    def __init__(self, rows: int, dims: int):
+        self._block = SharedMemory(create=True, size=max(1, rows * dims * 4))
+        self.array = np.ndarray((rows, dims), dtype=np.float32, buffer=self._block.buf)
+
+    @property
+    def name(self) -> str:
+        return self._block.name
+
+    def close(self) -> None:
+        del self.array
+        self._block.close()
+        self._block.unlink()
+
+    def __enter__(self) -> "SharedVectorBuffer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class EncodePool:
+    """One named pool of encode workers with its own torch intra-op thread count
+
+    In 'thread' mode torch's thread count is process-wide, so the last pool created sets it;
+    'process' mode gives each pool (and each child) its own.
+    """
+
+    def __init__(self, name: str, mode: str = 'thread', workers: int = 1, torch_threads: int = 0,
+                 device: str = 'cpu', embedding_server_socket: Optional[str] = None):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown encode pool mode {mode!r}")
+        self.name = name
+        self.mode = mode
+        self.workers = workers
+        self.torch_threads = torch_threads
+        if mode == 'process':
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process_worker,
+                initargs=(torch_threads, device, embedding_server_socket)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix=f"encode-{name}",
+                initializer=_set_torch_threads,
+                initargs=(torch_threads,)
+            )
+        self._lock = threading.Lock()
+        self._stats = {'tasks': 0, 'texts': 0, 'in_flight': 0, 'encode_seconds': 0.0}
+
+    def encode(self, model_name: str, texts: List[str], model=None,
+               out: Optional[SharedVectorBuffer] = None, out_row: int = 0) -> np.ndarray:
+        """Encode texts on the pool, blocking the calling thread (never the event loop's)
+
+        Thread pools use the caller's loaded model; process pools load model_name in each
+        child. With out, vectors are written into rows out_row.. of that shared buffer.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._stats['in_flight'] += 1
+        try:
+            if self.mode == 'thread':
+                vectors = np.asarray(self._executor.submit(model.encode, texts).result(), dtype=np.float32)
+                if out is not None:
+                    out.array[out_row:out_row + len(vectors)] = vectors
+                    vectors = out.array[out_row:out_row + len(vectors)]
+            elif out is not None:
+                dims = out.array.shape[1]
+                _, shape = self._executor.submit(
+                    _encode_in_worker, model_name, texts, out.name, out_row * dims
+                ).result()
+                vectors = out.array[out_row:out_row + shape[0]]
+            else:
+                name, shape = self._executor.submit(_encode_in_worker, model_name, texts).result()
+                block = SharedMemory(name=name)
+                try:
+                    vectors = np.ndarray(shape, dtype=np.float32, buffer=block.buf).copy()
+                finally:
+                    block.close()
+                    block.unlink()
+        finally:
+            with self._lock:
+                self._stats['in_flight'] -= 1
+        with self._lock:
+            self._stats['tasks'] += 1
+            self._stats['texts'] += len(texts)
+            self._stats['encode_seconds'] += time.perf_counter() - start
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({'mode': self.mode, 'workers': self.workers, 'torch_threads': self.torch_threads})
+        stats['encode_seconds'] = round(stats['encode_seconds'], 3)
+        return stats
+
+    def shutdown(self) -> None:
+        # Queued encodes are dropped; running ones finish so children exit cleanly
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class PooledEmbeddingModel:
+    """Model handle for process pools: the parent never loads weights, children do"""
+
+    def __init__(self, pool: EncodePool, model_name: str):
+        self.pool = pool
+        self.model_name = model_name
+
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        vectors = self.pool.encode(self.model_name, [sentences] if single else list(sentences))
+        return vectors[0] if single else vectors
+
+
+def create_encode_pools(mode: str, query_workers: int = 2, query_torch_threads: int = 0,
+                        ingest_workers: int = 1, ingest_torch_threads: int = 0, device: str = 'cpu',
+                        embedding_server_socket: Optional[str] = None) -> Dict[str, EncodePool]:
+    """A latency-sensitive 'query' pool and a bulk 'ingest' pool; none in 'inline' mode"""
+    if mode not in EXECUTOR_MODES:
+        raise ValueError(f"Unknown encode executor {mode!r}, expected one of {EXECUTOR_MODES}")
+    if mode == 'inline':
+        return {}
+    pools = {
+        'query': EncodePool('query', mode, query_workers, query_torch_threads, device, embedding_server_socket),
+        'ingest': EncodePool('ingest', mode, ingest_workers, ingest_torch_threads, device, embedding_server_socket)
+    }
+    logger.info(f"Encode pools ({mode}): query x{query_workers}, ingest x{ingest_workers}")
+    return pools
@@ -0,0 +1,260 @@
+"""
+Ingestion Queue
+SQLite-backed durable queue between email receipt and vectorization
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at max depth and cannot accept more work"""
+
+
+class IngestionQueue:
+    """Durable work queue with retries, dead-lettering and crash recovery"""
+
+    def __init__(self, db_path: str = "./ingestion_queue.db", max_depth: int = 10000,
+                 max_attempts: int = 5, retry_backoff_seconds: float = 5):
+        self.db_path = db_path
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email_id TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                enqueued_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_status ON ingestion_jobs (status, available_at)"
+        )
+        logger.info(f"Ingestion queue opened at {db_path}")
+
+    def depth(self) -> int:
+        """Jobs not yet finished (pending + processing)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM ingestion_jobs WHERE status IN ('pending', 'processing')"
+            ).fetchone()
+        return row[0]
+
+    def is_full(self) -> bool:
+        return self.depth() >= self.max_depth
+
+    def enqueue(self, payload: Dict[str, Any]) -> int:
+        """Add one email to the queue; raises QueueFullError when at max depth"""
+        return self.enqueue_many([payload])[0]
+
+    def enqueue_many(self, payloads: List[Dict[str, Any]]) -> List[int]:
+        """Add emails to the queue in one transaction"""
+        now = time.time()
+        with self._lock:
+            depth = self._conn.execute(
+                "SELECT COUNT(*) FROM ingestion_jobs WHERE status IN ('pending', 'processing')"
+            ).fetchone()[0]
+            if depth + len(payloads) > self.max_depth:
+                raise QueueFullError(f"Ingestion queue full ({depth}/{self.max_depth})")
+
+            job_ids = []
+            self._conn.execute("BEGIN")
+            try:
+                for payload in payloads:
+                    cursor = self._conn.execute(
+                        "INSERT INTO ingestion_jobs (email_id, payload, enqueued_at, available_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (str(payload.get('email_id', '')), json.dumps(payload), now, now, now)
+                    )
+                    job_ids.append(cursor.lastrowid)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_ids
+
+    def claim_batch(self, batch_size: int) -> List[Dict[str, Any]]:
+        """Mark up to batch_size ready jobs as processing and return them"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payload, attempts FROM ingestion_jobs "
+                    "WHERE status = 'pending' AND available_at <= ? ORDER BY id LIMIT ?",
+                    (now, batch_size)
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE ingestion_jobs SET status = 'processing', updated_at = ? WHERE id = ?",
+                        [(now, row[0]) for row in rows]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [{'id': row[0], 'payload': json.loads(row[1]), 'attempts': row[2]} for row in rows]
+
+    def complete(self, job_ids: List[int]) -> None:
+        """Remove finished jobs"""
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM ingestion_jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def fail(self, job_id: int, error: str) -> str:
+        """Record a failed attempt; retries with backoff, or dead-letters after max_attempts"""
+        now = time.time()
+        with self._lock:
+            attempts = self._conn.execute(
+                "SELECT attempts FROM ingestion_jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0] + 1
+            status = 'dead' if attempts >= self.max_attempts else 'pending'
+            available_at = now + self.retry_backoff_seconds * (2 ** (attempts - 1))
+            self._conn.execute(
+                "UPDATE ingestion_jobs SET status = ?, attempts = ?, last_error = ?, available_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (status, attempts, error[:1000], available_at, now, job_id)
+            )
+        return status
+
+    def recover(self) -> int:
+        """Return jobs left 'processing' by a crashed process to the pending queue"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ingestion_jobs SET status = 'pending', updated_at = ? WHERE status = 'processing'",
+                (time.time(),)
+            )
+        if cursor.rowcount:
+            logger.info(f"Recovered {cursor.rowcount} in-flight ingestion jobs for replay")
+        return cursor.rowcount
+
+    def list_dead(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, email_id, attempts, last_error, updated_at FROM ingestion_jobs "
+                "WHERE status = 'dead' ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            {'id': row[0], 'email_id': row[1], 'attempts': row[2], 'last_error': row[3], 'failed_at': row[4]}
+            for row in rows
+        ]
+
+    def requeue_dead(self) -> int:
+        """Move every dead-lettered job back to pending with a fresh attempt count"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ingestion_jobs SET status = 'pending', attempts = 0, available_at = ?, updated_at = ? "
+                "WHERE status = 'dead'", (now, now)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), MIN(enqueued_at) FROM ingestion_jobs GROUP BY status"
+            ).fetchall()
+        counts = {status: count for status, count, _ in rows}
+        oldest = min((oldest for status, _, oldest in rows if status == 'pending'), default=None)
+        return {
+            'pending': counts.get('pending', 0),
+            'processing': counts.get('processing', 0),
+            'dead': counts.get('dead', 0),
+            'depth': counts.get('pending', 0) + counts.get('processing', 0),
+            'max_depth': self.max_depth,
+            'oldest_pending_age_seconds': time.time() - oldest if oldest else 0.0
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class IngestionWorker:
+    """Batch consumer that drains the queue into DocumentProcessor.store_email_vector"""
+
+    def __init__(self, queue: IngestionQueue, document_processor, batch_size: int = 32,
+                 concurrency: int = 1, idle_sleep_seconds: float = 1.0):
+        self.queue = queue
+        self.document_processor = document_processor
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.idle_sleep_seconds = idle_sleep_seconds
+
+        self.processed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._consume(i)) for i in range(self.concurrency)]
+        logger.info(f"Started {self.concurrency} ingestion consumer(s)")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'consumers': len(self._tasks),
+            'processed': self.processed,
+            'failed_attempts': self.failed,
+            'dead_lettered': self.dead_lettered
+        }
+
+    async def _consume(self, worker_index: int) -> None:
+        while True:
+            try:
+                jobs = await asyncio.to_thread(self.queue.claim_batch, self.batch_size)
+                if not jobs:
+                    await asyncio.sleep(self.idle_sleep_seconds)
+                    continue
+                await asyncio.to_thread(self._process_batch, jobs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion consumer {worker_index} error: {str(e)}")
+                await asyncio.sleep(self.idle_sleep_seconds)
+
+    def _process_batch(self, jobs: List[Dict[str, Any]]) -> None:
+        # One encode pass and one index write per tenant for the whole batch
+        try:
+            errors = self.document_processor.store_email_vectors([job['payload'] for job in jobs])
+        except Exception as e:
+            errors = [str(e)] * len(jobs)
+
+        completed = []
+        for job, error in zip(jobs, errors):
+            if error is None:
+                completed.append(job['id'])
+                self.processed += 1
+            else:
+                self.failed += 1
+                if self.queue.fail(job['id'], error) == 'dead':
+                    self.dead_lettered += 1
+                    logger.error(f"Email {job['payload'].get('email_id')} dead-lettered: {error}")
+        self.queue.complete(completed)
+        logger.info(f"Ingested {len(completed)}/{len(jobs)} queued emails")
@@ -0,0 +1,148 @@
+"""
+Intent Router
+Classifies an email from the query embedding retrieval already computes and answers
+high-confidence known intents with cached, document-grounded templated replies,
+so only the remaining traffic reaches the LLM generation and critique loop.
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from src.prompts.intents import INTENT_DEFINITIONS, render_fast_path_reply
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class IntentRouter:
+    """Nearest-example intent classifier with a per-tenant cache of grounded answers"""
+
+    def __init__(self, document_processor, intents: Optional[List[Dict[str, Any]]] = None,
+                 confidence_threshold: float = 0.8, margin: float = 0.05,
+                 answer_ttl_seconds: float = 3600, min_doc_score: float = 0.6,
+                 max_facts: int = 5):
+        self.document_processor = document_processor
+        self.intents = {intent['name']: intent for intent in (intents or INTENT_DEFINITIONS)}
+        self.confidence_threshold = confidence_threshold
+        self.margin = margin
+        self.answer_ttl_seconds = answer_ttl_seconds
+        self.min_doc_score = min_doc_score
+        self.max_facts = max_facts
+
+        self._lock = threading.Lock()
+        # Example embeddings per model version; a cutover re-embeds them on first use
+        self._examples: Dict[int, Tuple[np.ndarray, List[str]]] = {}
+        # (model version, tenant, intent) -> (expires_at, answer or None when not grounded)
+        self._answers: Dict[Tuple[int, Optional[str], str], Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self.counters = {'classified': 0, 'fast_path': 0, 'low_confidence': 0, 'ungrounded': 0}
+
+    def _example_matrix(self, slot) -> Tuple[np.ndarray, List[str]]:
+        with self._lock:
+            cached = self._examples.get(slot.version)
+        if cached is not None:
+            return cached
+        labels = [name for name, intent in self.intents.items() for _ in intent['examples']]
+        examples = [example for intent in self.intents.values() for example in intent['examples']]
+        matrix = _normalize(slot.model.encode(examples))
+        with self._lock:
+            self._examples = {slot.version: (matrix, labels)}
+        return matrix, labels
+
+    def classify(self, query_vector) -> Dict[str, Any]:
+        """Best intent by nearest example, with its confidence and margin over the runner-up intent"""
+        matrix, labels = self._example_matrix(query_vector.slot)
+        similarities = matrix @ _normalize(query_vector.embedding)[0]
+        best: Dict[str, float] = {}
+        for label, similarity in zip(labels, similarities.tolist()):
+            best[label] = max(best.get(label, -1.0), similarity)
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        return {'intent': ranked[0][0], 'confidence': ranked[0][1], 'margin': ranked[0][1] - runner_up}
+
+    def _extract_facts(self, intent: Dict[str, Any], documents: List[Dict[str, Any]]) -> List[str]:
+        """Document lines mentioning the intent's keywords, in retrieval order"""
+        keywords = [keyword.lower() for keyword in intent['keywords']]
+        facts, seen = [], set()
+        for document in documents:
+            for line in re.split(r'\n+|(?<=[.!?])\s+', document['content']):
+                fact = line.strip().lstrip('-*• ').strip()
+                if len(fact) < 12 or fact.endswith(':') or fact.lower() in seen:
+                    continue
+                if any(keyword in fact.lower() for keyword in keywords):
+                    seen.add(fact.lower())
+                    facts.append(fact)
+                    if len(facts) >= self.max_facts:
+                        return facts
+        return facts
+
+    def _build_answer(self, intent: Dict[str, Any], tenant_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        documents = self.document_processor.search_documents(intent['doc_query'], n_results=3, tenant_id=tenant_id)
+        documents = [document for document in documents if document['similarity_score'] >= self.min_doc_score]
+        facts = self._extract_facts(intent, documents)
+        if not facts:
+            return None
+        return {'reply': render_fast_path_reply(intent['topic'], facts), 'documents': documents}
+
+    def answer(self, intent_name: str, slot, tenant_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Cached templated answer for an intent, or None when the documents don't cover it"""
+        key = (slot.version, tenant_id, intent_name)
+        now = time.time()
+        with self._lock:
+            cached = self._answers.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        answer = self._build_answer(self.intents[intent_name], tenant_id)
+        with self._lock:
+            self._answers[key] = (now + self.answer_ttl_seconds, answer)
+        return answer
+
+    def route(self, query_vector, tenant_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Fast-path answer for a confidently classified email, or None to run the full workflow"""
+        match = self.classify(query_vector)
+        with self._lock:
+            self.counters['classified'] += 1
+        if match['confidence'] < self.confidence_threshold or match['margin'] < self.margin:
+            with self._lock:
+                self.counters['low_confidence'] += 1
+            return None
+
+        answer = self.answer(match['intent'], query_vector.slot, tenant_id)
+        with self._lock:
+            self.counters['fast_path' if answer else 'ungrounded'] += 1
+        if answer is None:
+            logger.info(f"Intent {match['intent']} has no grounding documents, using the full workflow")
+            return None
+        return {**match, **answer}
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        """Drop cached answers, e.g. after documents change; all tenants when tenant_id is None"""
+        with self._lock:
+            if tenant_id is None:
+                self._answers.clear()
+            else:
+                for key in [key for key in self._answers if key[1] == tenant_id]:
+                    del self._answers[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            cached_answers = len(self._answers)
+        classified = counters['classified']
+        return {
+            **counters,
+            'fast_path_rate': round(counters['fast_path'] / classified, 4) if classified else 0.0,
+            'cached_answers': cached_answers,
+            'intents': list(self.intents),
+            'confidence_threshold': self.confidence_threshold,
+            'margin': self.margin
+        }
@@ -0,0 +1,360 @@
+"""
+LLM Router
+Provider-agnostic chat completions for the reply workflow. Each node asks for its own
+model ("provider:model"), requests are duplicated to a second target when the first is
+slower than its recent p95 (hedging), and providers that keep failing are skipped by a
+per-provider circuit breaker until they recover.
+
+Every provider is reached through its OpenAI-compatible chat completions endpoint, so
+a local stand-in server (benchmarks/stand_in_server.py) can replace any of them by
+overriding its base URL.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_BASE_URLS = {
+    'groq': 'https://api.groq.com/openai/v1',
+    'openai': 'https://api.openai.com/v1',
+    'anthropic': 'https://api.anthropic.com/v1',
+    'google': 'https://generativelanguage.googleapis.com/v1beta/openai'
+}
+
+
+class LLMProviderError(Exception):
+    """Raised when a provider returns an error response"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def provider_fault(self) -> bool:
+        # Rejected requests (bad model name, oversized prompt) say nothing about provider health
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+
+class LLMUnavailableError(Exception):
+    """Raised when every target for a request is circuit-open or has failed"""
+
+
+def parse_model_spec(spec: str, default_provider: str) -> Tuple[str, str]:
+    """'provider:model' -> (provider, model); a bare model name uses default_provider"""
+    provider, separator, model = spec.partition(':')
+    if separator and provider in PROVIDER_BASE_URLS:
+        return provider, model
+    return default_provider, spec
+
+
+class OpenAICompatibleProvider:
+    """Chat completions over HTTP with a pooled connection per provider"""
+
+    def __init__(self, name: str, base_url: str, api_key: str, timeout: float = 30):
+        self.name = name
+        self.base_url = base_url
+        self._client = httpx.Client(
+            base_url=base_url.rstrip('/') + '/',
+            timeout=timeout,
+            headers={'Authorization': f"Bearer {api_key}"} if api_key else {}
+        )
+
+    def complete(self, model: str, messages: List[Dict[str, str]], temperature: float,
+                 max_tokens: int, **kwargs):
+        response = self._client.post('chat/completions', json={
+            'model': model, 'messages': messages, 'temperature': temperature, 'max_tokens': max_tokens, **kwargs
+        })
+        if response.status_code >= 400:
+            raise LLMProviderError(
+                f"{self.name} returned {response.status_code}: {response.text[:200]}", response.status_code
+            )
+        data = response.json()
+        usage = data.get('usage') or {}
+        # Shaped like the Groq/OpenAI SDK response the workflow nodes already read
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=data['choices'][0]['message']['content']))],
+            usage=SimpleNamespace(
+                prompt_tokens=usage.get('prompt_tokens'),
+                completion_tokens=usage.get('completion_tokens'),
+                total_tokens=usage.get('total_tokens')
+            ),
+            model=data.get('model', model),
+            provider=self.name
+        )
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class CircuitBreaker:
+    """closed -> open after failure_threshold consecutive failures; one probe after cooldown"""
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Reserve a call; in half-open state only one probe is let through at a time"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                    return False
+                self.state = 'half_open'
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                    logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures, 'trips': self.trips}
+
+
+class LatencyWindow:
+    """Recent successful call latencies for one target"""
+
+    def __init__(self, size: int = 256):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
+class LLMRouter:
+    """Drop-in for the Groq client: chat.completions.create(model=spec, ...)
+
+    model is a "provider:model" spec chosen per workflow node. The spec's target is tried
+    first, then fallback_models in order. When a call has not answered within its
+    target's recent hedge_percentile latency, a duplicate goes to the next available
+    target (or the same one) and the first success wins; failures fail over immediately.
+    """
+
+    def __init__(self, default_provider: str, api_keys: Dict[str, str],
+                 base_urls: Optional[Dict[str, str]] = None, fallback_models: Optional[List[str]] = None,
+                 timeout: float = 30, hedge_enabled: bool = True, hedge_percentile: float = 95,
+                 hedge_initial_delay_ms: float = 0, hedge_min_delay_ms: float = 50,
+                 hedge_min_samples: int = 20, breaker_failures: int = 5,
+                 breaker_cooldown_seconds: float = 30, max_concurrency: int = 32):
+        self.default_provider = default_provider
+        self.api_keys = api_keys
+        self.base_urls = {**PROVIDER_BASE_URLS, **(base_urls or {})}
+        self.fallback_models = [parse_model_spec(spec, default_provider) for spec in (fallback_models or [])]
+        self.timeout = timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_initial_delay = hedge_initial_delay_ms / 1000
+        self.hedge_min_delay = hedge_min_delay_ms / 1000
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown_seconds = breaker_cooldown_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._providers: Dict[str, OpenAICompatibleProvider] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[Tuple[str, str], LatencyWindow] = {}
+        self.counters = {
+            'requests': 0, 'hedges': 0, 'hedge_wins': 0, 'failovers': 0, 'errors': 0, 'rejected': 0
+        }
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _provider(self, name: str) -> OpenAICompatibleProvider:
+        with self._lock:
+            if name not in self._providers:
+                if name not in self.base_urls:
+                    raise LLMProviderError(f"Unknown LLM provider {name!r}")
+                self._providers[name] = OpenAICompatibleProvider(
+                    name, self.base_urls[name], self.api_keys.get(name, ''), self.timeout
+                )
+            return self._providers[name]
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker(self.breaker_failures, self.breaker_cooldown_seconds)
+            return self._breakers[provider]
+
+    def _latency(self, target: Tuple[str, str]) -> LatencyWindow:
+        with self._lock:
+            if target not in self._latencies:
+                self._latencies[target] = LatencyWindow()
+            return self._latencies[target]
+
+    def hedge_delay(self, target: Tuple[str, str]) -> Optional[float]:
+        """Seconds to wait on target before hedging: its recent percentile latency
+
+        None (never hedge) until the window holds hedge_min_samples, unless an initial delay is set.
+        """
+        window = self._latency(target)
+        if len(window) < self.hedge_min_samples:
+            return self.hedge_initial_delay or None
+        return max(self.hedge_min_delay, window.percentile(self.hedge_percentile))
+
+    def _call(self, target: Tuple[str, str], messages, temperature, max_tokens, kwargs):
+        provider, model = target
+        start = time.perf_counter()
+        try:
+            response = self._provider(provider).complete(model, messages, temperature, max_tokens, **kwargs)
+        except LLMProviderError as e:
+            if e.provider_fault:
+                self.breaker(provider).record_failure()
+            else:
+                self.breaker(provider).record_success()
+            raise
+        except Exception:
+            # Timeouts and connection errors
+            self.breaker(provider).record_failure()
+            raise
+        self.breaker(provider).record_success()
+        self._latency(target).add(time.perf_counter() - start)
+        return response
+
+    def _dispatch(self, targets: List[Tuple[str, str]], start: int, messages, temperature,
+                  max_tokens, kwargs, allow_repeat: Optional[Tuple[str, str]] = None):
+        """Submit to the first target from index start whose breaker admits a call"""
+        for index in range(start, len(targets)):
+            if self.breaker(targets[index][0]).allow():
+                future = self._executor.submit(self._call, targets[index], messages, temperature, max_tokens, kwargs)
+                return index, targets[index], future
+        # Hedge against the same target when it is the only healthy one
+        if allow_repeat is not None and self.breaker(allow_repeat[0]).state == 'closed':
+            future = self._executor.submit(self._call, allow_repeat, messages, temperature, max_tokens, kwargs)
+            return len(targets), allow_repeat, future
+        return None
+
+    def create(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7,
+               max_tokens: int = 500, **kwargs):
+        primary = parse_model_spec(model, self.default_provider)
+        targets = [primary] + [target for target in self.fallback_models if target != primary]
+        with self._lock:
+            self.counters['requests'] += 1
+
+        dispatched = self._dispatch(targets, 0, messages, temperature, max_tokens, kwargs)
+        if dispatched is None:
+            with self._lock:
+                self.counters['rejected'] += 1
+            raise LLMUnavailableError(f"Every LLM provider for {model} is circuit-open")
+
+        next_index, first_target, future = dispatched
+        next_index += 1
+        pending = {future: first_target}
+        hedge_futures = set()
+        hedged = False
+        last_error: Optional[Exception] = None
+        while pending:
+            timeout = None if hedged or not self.hedge_enabled else self.hedge_delay(first_target)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slower than this target's recent p95: duplicate the request once
+                hedged = True
+                dispatched = self._dispatch(targets, next_index, messages, temperature, max_tokens, kwargs,
+                                            allow_repeat=first_target)
+                if dispatched is not None:
+                    next_index, hedge_target, hedge_future = dispatched
+                    next_index += 1
+                    pending[hedge_future] = hedge_target
+                    hedge_futures.add(hedge_future)
+                    with self._lock:
+                        self.counters['hedges'] += 1
+                continue
+
+            for finished in done:
+                target = pending.pop(finished)
+                try:
+                    response = finished.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"LLM call to {target[0]}:{target[1]} failed: {str(e)}")
+                    continue
+                if finished in hedge_futures:
+                    with self._lock:
+                        self.counters['hedge_wins'] += 1
+                # The losing duplicate finishes in the background and only updates the stats
+                return response
+
+            if not pending:
+                # Fail over to the next target right away instead of waiting for a hedge
+                dispatched = self._dispatch(targets, next_index, messages, temperature, max_tokens, kwargs)
+                if dispatched is not None:
+                    next_index, failover_target, failover_future = dispatched
+                    next_index += 1
+                    pending[failover_future] = failover_target
+                    with self._lock:
+                        self.counters['failovers'] += 1
+
+        with self._lock:
+            self.counters['errors'] += 1
+        raise last_error or LLMUnavailableError(f"No LLM target answered for {model}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            breakers = dict(self._breakers)
+            latencies = dict(self._latencies)
+        targets = {}
+        for (provider, model), window in latencies.items():
+            delay = self.hedge_delay((provider, model))
+            targets[f"{provider}:{model}"] = {
+                'samples': len(window),
+                'p50_ms': round((window.percentile(50) or 0) * 1000, 1),
+                'p95_ms': round((window.percentile(95) or 0) * 1000, 1),
+                'hedge_delay_ms': None if delay is None else round(delay * 1000, 1)
+            }
+        return {
+            **counters,
+            'hedge_rate': round(counters['hedges'] / counters['requests'], 4) if counters['requests'] else 0.0,
+            'providers': {name: breaker.snapshot() for name, breaker in breakers.items()},
+            'targets': targets
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for provider in self._providers.values():
+                provider.close()
@@ -0,0 +1,255 @@
+"""
+Near-Duplicate Detection
+MinHash signatures with an LSH band index in SQLite, consulted before an email is
+embedded so bulk notifications, auto-replies and pasted complaints collapse into one
+representative. Also holds the MMR re-ranker retrieval uses to diversify results.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+# Mersenne prime above the 32-bit shingle hashes; a * x + b stays below 2**64
+MERSENNE_PRIME = (1 << 61) - 1
+SHINGLE_WORDS = 3
+
+_URL = re.compile(r'https?://\S+|www\.\S+')
+_DIGITS = re.compile(r'\d+')
+_NON_WORD = re.compile(r'[^\w#]+')
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[str]:
+    """Word shingles of normalized text; numbers and URLs are masked so templated mail matches"""
+    words = _NON_WORD.sub(' ', _DIGITS.sub('#', _URL.sub(' url ', text.lower()))).split()
+    if len(words) <= size:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+class MinHasher:
+    """num_perm universal hash permutations over 32-bit shingle hashes"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = generator.randint(1, 1 << 28, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 28, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        tokens = set(shingles(text))
+        if not tokens:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest(), 'little') for token in tokens),
+            dtype=np.uint64, count=len(tokens)
+        )
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % np.uint64(MERSENNE_PRIME)
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+def estimated_jaccard(left: np.ndarray, right: np.ndarray) -> float:
+    return float(np.mean(left == right))
+
+
+class DuplicateMatch:
+    """A representative an incoming item collapses into"""
+
+    def __init__(self, representative: str, similarity: float, is_new: bool, signature: np.ndarray):
+        self.representative = representative
+        self.similarity = similarity
+        # False when this item was already collapsed earlier (a re-sync); counts must not change
+        self.is_new = is_new
+        self.signature = signature
+
+
+class NearDuplicateIndex:
+    """Representatives' MinHash signatures and LSH buckets per scope (tenant), in SQLite
+
+    Items whose estimated Jaccard similarity to a representative reaches threshold become
+    its members; everything else becomes a new representative.
+    """
+
+    def __init__(self, db_path: str, threshold: float = 0.8, num_perm: int = 128, bands: int = 32,
+                 max_candidates: int = 50):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_candidates = max_candidates
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS near_dup_signatures (
+                scope TEXT NOT NULL,
+                id TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                PRIMARY KEY (scope, id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS near_dup_bands (
+                scope TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (scope, band, bucket, id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS near_dup_members (
+                scope TEXT NOT NULL,
+                id TEXT NOT NULL,
+                representative TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (scope, id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS near_dup_members_representative
+                ON near_dup_members (scope, representative, added_at);
+        """)
+
+    def _buckets(self, signature: np.ndarray) -> List[str]:
+        return [
+            hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    def _register(self, scope: str, item_id: str, signature: np.ndarray) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO near_dup_signatures (scope, id, signature) VALUES (?, ?, ?)",
+            (scope, item_id, signature.tobytes())
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO near_dup_bands (scope, band, bucket, id) VALUES (?, ?, ?, ?)",
+            [(scope, band, bucket, item_id) for band, bucket in enumerate(self._buckets(signature))]
+        )
+
+    def _best_candidate(self, scope: str, signature: np.ndarray):
+        clauses = ' OR '.join('(band = ? AND bucket = ?)' for _ in range(self.bands))
+        params = [value for band, bucket in enumerate(self._buckets(signature)) for value in (band, bucket)]
+        rows = self._conn.execute(
+            f"SELECT s.id, s.signature FROM near_dup_signatures s JOIN ("
+            f"  SELECT id, COUNT(*) AS shared FROM near_dup_bands WHERE scope = ? AND ({clauses})"
+            f"  GROUP BY id ORDER BY shared DESC LIMIT ?"
+            f") c ON s.id = c.id WHERE s.scope = ?",
+            [scope, *params, self.max_candidates, scope]
+        ).fetchall()
+        best, best_similarity = None, 0.0
+        for candidate_id, blob in rows:
+            similarity = estimated_jaccard(signature, np.frombuffer(blob, dtype=np.uint32))
+            if similarity > best_similarity:
+                best, best_similarity = candidate_id, similarity
+        return best, best_similarity
+
+    def assign(self, scope: str, item_id: str, text: str) -> Optional[DuplicateMatch]:
+        """Representative for item_id if it is a near-duplicate; otherwise it becomes one (returns None)"""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                member = self._conn.execute(
+                    "SELECT representative FROM near_dup_members WHERE scope = ? AND id = ?", (scope, item_id)
+                ).fetchone()
+                if member:
+                    match = DuplicateMatch(member[0], 1.0, False, signature)
+                elif self._conn.execute(
+                    "SELECT 1 FROM near_dup_signatures WHERE scope = ? AND id = ?", (scope, item_id)
+                ).fetchone():
+                    # Re-storing a representative
+                    match = None
+                else:
+                    best, similarity = self._best_candidate(scope, signature)
+                    if best is not None and similarity >= self.threshold:
+                        self._conn.execute(
+                            "INSERT INTO near_dup_members (scope, id, representative, added_at) VALUES (?, ?, ?, ?)",
+                            (scope, item_id, best, time.time())
+                        )
+                        match = DuplicateMatch(best, similarity, True, signature)
+                    else:
+                        self._register(scope, item_id, signature)
+                        match = None
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return match
+
+    def promote(self, scope: str, stale_representative: str, item_id: str, signature: np.ndarray) -> None:
+        """Replace a representative that no longer exists in the store with item_id"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table in ('near_dup_signatures', 'near_dup_bands'):
+                    self._conn.execute(f"DELETE FROM {table} WHERE scope = ? AND id = ?", (scope, stale_representative))
+                self._conn.execute(
+                    "DELETE FROM near_dup_members WHERE scope = ? AND (representative = ? OR id = ?)",
+                    (scope, stale_representative, item_id)
+                )
+                self._register(scope, item_id, signature)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def members(self, scope: str, representative: str, limit: Optional[int] = None) -> List[str]:
+        """Member ids of a representative, most recent first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM near_dup_members WHERE scope = ? AND representative = ? "
+                "ORDER BY added_at DESC LIMIT ?",
+                (scope, representative, -1 if limit is None else limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def member_count(self, scope: str, representative: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM near_dup_members WHERE scope = ? AND representative = ?", (scope, representative)
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            representatives = self._conn.execute("SELECT COUNT(*) FROM near_dup_signatures").fetchone()[0]
+            collapsed = self._conn.execute("SELECT COUNT(*) FROM near_dup_members").fetchone()[0]
+        return {
+            'representatives': representatives,
+            'collapsed': collapsed,
+            'threshold': self.threshold,
+            'bands': self.bands,
+            'rows_per_band': self.rows
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def mmr_select(relevance: List[float], vectors: np.ndarray, k: int, relevance_weight: float = 0.7) -> List[int]:
+    """Maximal marginal relevance: indices of k items trading relevance against redundancy
+
+    vectors are compared by cosine similarity; relevance_weight 1 keeps the relevance order.
+    """
+    if not len(relevance):
+        return []
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1, norms)
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    selected: List[int] = [int(np.argmax(relevance))]
+    redundancy = unit @ unit[selected[0]]
+    while len(selected) < min(k, len(relevance)):
+        scores = relevance_weight * relevance - (1 - relevance_weight) * redundancy
+        scores[selected] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        redundancy = np.maximum(redundancy, unit @ unit[chosen])
+    return selected
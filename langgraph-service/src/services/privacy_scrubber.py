@@ -0,0 +1,121 @@
+"""
+Privacy Scrubber
+Compiled PII redaction applied once at ingest, before text can reach cross-customer context
+"""
+
+import re
+from typing import List, Dict, Optional, Iterable
+
+# Capitalized words that follow "Dear"/"This is"/"Thanks" without being a name
+COMMON_WORDS = (
+    'A', 'All', 'An', 'And', 'Any', 'Are', 'As', 'Awesome', 'Bad', 'But', 'Customer', 'Customers', 'Everyone',
+    'Folks', 'For', 'Friend', 'Friends', 'Glad', 'Good', 'Great', 'Happy', 'He', 'Hello', 'Here', 'Hi', 'How',
+    'I', 'If', 'In', 'Is', 'It', 'Just', 'Let', 'Looking', 'Madam', 'Much', 'My', 'New', 'Nexus', 'No', 'Not',
+    'Now', 'Okay', 'On', 'Our', 'Please', 'Really', 'Regards', 'Sad', 'See', 'She', 'Sir', 'So', 'Sorry',
+    'Still', 'Support', 'Sure', 'Team', 'Thank', 'Thanks', 'That', 'The', 'There', 'They', 'This', 'To',
+    'Unfortunately', 'Urgent', 'We', 'What', 'When', 'Will', 'With', 'Yes', 'You', 'Your'
+)
+# A capitalized word that is not a common word, optionally followed by a second one
+_NAME = r'(?!(?:' + '|'.join(COMMON_WORDS) + r')\b)[A-Z][a-z]+(?:\s+(?!(?:' + '|'.join(COMMON_WORDS) + r')\b)[A-Z][a-z]+)?'
+
+# Between a label and its value: an optional "no."/"number"/"id", then an optional connector
+# ("order number is 12345", "invoice no. is INV-88231", "order id = A-1234", "order #12345")
+_LABEL_TAIL = r'\s*(?:no\.?|number|num|id)?\s*(?:(?:is|was)\b|[:=])?\s*[#-]?\s*'
+# Labelled values must contain a digit, so "order was shipped" keeps its words
+_LABELLED_VALUE = r'(?=[A-Za-z0-9-]*\d)[A-Za-z0-9][A-Za-z0-9-]{3,}'
+
+# (kind, prefix kept in the output, value that is redacted, placeholder)
+# Prefixes keep the sentence readable ("Order #[ORDER_ID]", "Dear [NAME]").
+PII_RULES = [
+    ('email', r'', r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}', '[EMAIL]'),
+    ('order', r'(?i:\b(?:order|tracking|ticket|case|rma)\b' + _LABEL_TAIL + ')', _LABELLED_VALUE, '[ORDER_ID]'),
+    ('serial', r'(?i:\b(?:serial|s/n|sn|imei)\b' + _LABEL_TAIL + ')', _LABELLED_VALUE, '[SERIAL_NUMBER]'),
+    ('bill', r'(?i:\b(?:bill|invoice|receipt)\b' + _LABEL_TAIL + ')', _LABELLED_VALUE, '[BILL_NUMBER]'),
+    # Other labelled account identifiers; unlabelled codes are usually SKUs and model numbers
+    ('identifier', r'(?i:\b(?:account|customer|member(?:ship)?|reference|ref|warranty|claim|booking)\b'
+     + _LABEL_TAIL + ')', _LABELLED_VALUE, '[ID]'),
+    ('phone', r'(?<![\w+])', r'\+?\(?\d[\d\s().-]{5,}\d(?!\w)', '[PHONE]'),
+    ('salutation_name', r'\b(?:Dear|Hi|Hello|Hey|Mr\.?|Mrs\.?|Ms\.?|Dr\.?)\s+', _NAME, '[NAME]'),
+    # "This is" introduces far more sentences than names, so only explicit introductions count
+    ('intro_name', r'(?i:\b(?:my name is|i am|i\'m)\s+)', _NAME + r'(?=\s*(?:[,.!]|$|\n|\s+(?:from|with|at|and)\b))',
+     '[NAME]'),
+    # A name signing off stands alone on the line after the sign-off
+    ('signoff_name', r'(?i:\b(?:regards|thanks|thank you|sincerely|cheers|best)\b)[,!.]?[ \t]*\n\s*',
+     _NAME + r'(?=[ \t]*[,.]?[ \t]*(?:\n|$))', '[NAME]'),
+]
+
+PLACEHOLDERS = {kind: placeholder for kind, _, _, placeholder in PII_RULES}
+
+# One alternation so each text is scanned in a single pass
+PII_PATTERN = re.compile('|'.join(
+    f'(?P<{kind}>{prefix}(?P<{kind}_value>{value}))' for kind, prefix, value, _ in PII_RULES
+))
+
+PHONE_MIN_DIGITS = 7
+PHONE_MAX_DIGITS = 15
+# Dates look like phone numbers but are business context (restock/launch dates)
+DATE_PATTERN = re.compile(r'\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}')
+
+
+def _redact(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == 'phone':
+        digits = sum(ch.isdigit() for ch in match.group(kind))
+        if not PHONE_MIN_DIGITS <= digits <= PHONE_MAX_DIGITS or DATE_PATTERN.fullmatch(match.group(kind).strip()):
+            return match.group(0)
+    prefix_length = match.start(f'{kind}_value') - match.start(kind)
+    return match.group(kind)[:prefix_length] + PLACEHOLDERS[kind]
+
+
+# Mailbox names that are roles, not people; redacting them would hit "support", "sales" etc. in the text
+ROLE_MAILBOXES = frozenset((
+    'accounts', 'admin', 'billing', 'care', 'contact', 'customer', 'customercare', 'customerservice',
+    'enquiries', 'feedback', 'hello', 'help', 'helpdesk', 'info', 'mail', 'marketing', 'no-reply',
+    'noreply', 'office', 'orders', 'sales', 'service', 'shop', 'store', 'support', 'team', 'webmaster'
+))
+_COMMON_WORDS_LOWER = frozenset(word.lower() for word in COMMON_WORDS)
+
+
+def sender_name_hints(sender_info: str, from_name: str = '') -> List[str]:
+    """Known names of a sender: the display name and a personal mailbox local part"""
+    local_part = (sender_info or '').split('@')[0].strip().lower()
+    hints = [from_name or '']
+    if local_part and local_part not in ROLE_MAILBOXES:
+        hints.append(local_part)
+    return hints
+
+
+def _known_names_pattern(known_names: Iterable[str]) -> Optional[re.Pattern]:
+    """Pattern for names known from metadata (e.g. the sender's display name)"""
+    parts = set()
+    for name in known_names:
+        for part in re.split(r'[\s._-]+', (name or '').strip()):
+            lowered = part.lower()
+            if len(part) >= 3 and part.isalpha() and lowered not in ROLE_MAILBOXES and lowered not in _COMMON_WORDS_LOWER:
+                parts.add(re.escape(part))
+    if not parts:
+        return None
+    return re.compile(r'\b(?:' + '|'.join(sorted(parts, key=len, reverse=True)) + r')\b', re.IGNORECASE)
+
+
+def scrub_text(text: str, known_names: Optional[Iterable[str]] = None) -> str:
+    """Redact emails, phone numbers, order/serial/bill identifiers and names from text"""
+    if not text:
+        return ''
+    scrubbed = PII_PATTERN.sub(_redact, text)
+    names_pattern = _known_names_pattern(known_names or [])
+    if names_pattern:
+        scrubbed = names_pattern.sub(PLACEHOLDERS['salutation_name'], scrubbed)
+    return scrubbed
+
+
+def extract_identifiers(text: str, kinds: Iterable[str] = ('order', 'serial', 'bill')) -> Dict[str, List[str]]:
+    """Identifier values the redaction rules would replace, by kind, in order of appearance"""
+    found: Dict[str, List[str]] = {kind: [] for kind in kinds}
+    for match in PII_PATTERN.finditer(text or ''):
+        kind = match.lastgroup
+        if kind in found:
+            value = match.group(f'{kind}_value')
+            if value not in found[kind]:
+                found[kind].append(value)
+    return found
@@ -0,0 +1,308 @@
+"""
+Request Profiler
+Opt-in sampling profiler for single requests. A profiled request runs a workflow built
+with node_hook=RequestProfiler.node_hook, so every sample is tagged with the LangGraph
+node (or "runtime" between nodes) its thread was executing. On the event loop thread,
+labels belong to asyncio tasks, so a sample only counts while one of the request's own
+tasks is running there, not while the loop serves other requests. Profiles are written as
+collapsed stacks (.folded, for flamegraph.pl / speedscope / inferno), a flamegraph .svg
+and a .json summary of node spans. Requests that are not profiled run the normal
+workflows, so the hook costs nothing when disabled.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import html
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+PROFILE_FORMATS = ('folded', 'svg', 'json')
+TRUTHY = ('1', 'true', 'yes', 'on')
+
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    'active_request_profile', default=None
+)
+
+
+def _frame_label(code, cache: Dict[str, str]) -> str:
+    filename = code.co_filename
+    short = cache.get(filename)
+    if short is None:
+        marker = filename.rfind('site-packages' + os.sep)
+        if marker >= 0:
+            short = filename[marker + len('site-packages') + 1:]
+        elif filename.startswith(os.getcwd() + os.sep):
+            short = os.path.relpath(filename)
+        else:
+            short = os.path.basename(filename)
+        cache[filename] = short
+    # ';' separates frames in collapsed stacks (the count follows the last space)
+    return f"{code.co_name} ({short}:{code.co_firstlineno})".replace(';', ':')
+
+
+class RequestProfile:
+    """Samples and node spans of one profiled request"""
+
+    def __init__(self, profile_id: str, request_id: str, workflow: str):
+        self.profile_id = profile_id
+        self.request_id = request_id
+        self.workflow = workflow
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.samples = 0
+        # thread ident -> stack of labels; the innermost label tags that thread's samples
+        self._threads: Dict[int, List[str]] = {}
+        # asyncio task -> (loop, loop thread ident, stack of labels) for code on an event loop
+        self._tasks: Dict[asyncio.Task, Tuple[asyncio.AbstractEventLoop, int, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _running_task() -> Optional[asyncio.Task]:
+        try:
+            return asyncio.current_task()
+        except RuntimeError:
+            return None
+
+    def enter(self, label: str) -> None:
+        task = self._running_task()
+        with self._lock:
+            if task is None:
+                self._threads.setdefault(threading.get_ident(), []).append(label)
+            else:
+                entry = self._tasks.setdefault(task, (task.get_loop(), threading.get_ident(), []))
+                entry[2].append(label)
+
+    def exit(self) -> None:
+        task = self._running_task()
+        with self._lock:
+            if task is None:
+                owners, key = self._threads, threading.get_ident()
+                labels = owners.get(key)
+            else:
+                owners, key = self._tasks, task
+                labels = owners[key][2] if key in owners else None
+            if labels:
+                labels.pop()
+                if not labels:
+                    del owners[key]
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        self.enter(f"node:{name}")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.exit()
+            self.spans.append({
+                'node': name,
+                'thread': threading.current_thread().name,
+                'start_ms': round((start - self.start) * 1000, 2),
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2)
+            })
+
+    def sample(self, frames: Dict[int, Any], label_cache: Dict[str, str]) -> None:
+        with self._lock:
+            threads = [(ident, labels[-1]) for ident, labels in self._threads.items()]
+            tasks = [(task, loop, ident, labels[-1]) for task, (loop, ident, labels) in self._tasks.items()]
+        for task, loop, ident, label in tasks:
+            # The loop thread is shared with other requests; only sample it while it runs this task
+            if asyncio.current_task(loop) is task:
+                threads.append((ident, label))
+        for ident, label in threads:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code, label_cache))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[';'.join([self.workflow, label] + stack)] += 1
+        self.samples += 1
+
+    def summary(self, interval_seconds: float) -> Dict[str, Any]:
+        nodes: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            entry = nodes.setdefault(span['node'], {'calls': 0, 'total_ms': 0.0})
+            entry['calls'] += 1
+            entry['total_ms'] = round(entry['total_ms'] + span['duration_ms'], 2)
+        return {
+            'profile_id': self.profile_id,
+            'request_id': self.request_id,
+            'workflow': self.workflow,
+            'started_at': self.started_at,
+            'wall_ms': round((time.perf_counter() - self.start) * 1000, 2),
+            'interval_ms': interval_seconds * 1000,
+            'samples': self.samples,
+            'nodes': nodes,
+            'spans': self.spans
+        }
+
+
+class RequestProfiler:
+    """Selects requests to profile, samples their threads and keeps the newest profiles on disk"""
+
+    def __init__(self, directory: str, interval_seconds: float = 0.005, sample_rate: float = 0.0,
+                 max_profiles: int = 50, max_concurrent: int = 2):
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self.max_concurrent = max_concurrent
+        self._active: List[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._label_cache: Dict[str, str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def should_profile(self, header_value: Optional[str] = None) -> bool:
+        """Explicitly requested by header, or picked by the sample rate while few profiles run"""
+        if header_value is not None and header_value.strip().lower() in TRUTHY:
+            return True
+        return self.sample_rate > 0 and len(self._active) < self.max_concurrent and random.random() < self.sample_rate
+
+    @contextlib.contextmanager
+    def session(self, request_id: str, workflow: str):
+        """Profile everything the current request does until the block exits"""
+        profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{re.sub(r'[^A-Za-z0-9]', '', request_id)[:12]}"
+        profile = RequestProfile(profile_id, request_id, workflow)
+        token = _active_profile.set(profile)
+        # Time in the calling task (or thread) outside any node is the LangGraph runtime and request handling
+        profile.enter('runtime')
+        with self._lock:
+            self._active.append(profile)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+        try:
+            yield profile
+        finally:
+            profile.exit()
+            _active_profile.reset(token)
+            with self._lock:
+                self._active.remove(profile)
+            try:
+                self._write(profile)
+            except Exception as e:
+                logger.warning(f"Failed to write profile {profile_id}: {e}")
+
+    @contextlib.contextmanager
+    def node_hook(self, name: str):
+        """node_hook for the workflow builders: a span in the request's profile, if it has one"""
+        profile = _active_profile.get()
+        if profile is None:
+            yield
+            return
+        with profile.span(name):
+            yield
+
+    def _sample_loop(self) -> None:
+        while True:
+            with self._lock:
+                profiles = list(self._active)
+                if not profiles:
+                    self._sampler = None
+                    return
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames, self._label_cache)
+            del frames
+            time.sleep(self.interval_seconds)
+
+    def _write(self, profile: RequestProfile) -> None:
+        base = os.path.join(self.directory, profile.profile_id)
+        folded = '\n'.join(f"{stack} {count}" for stack, count in sorted(profile.stacks.items()))
+        with open(f"{base}.folded", 'w', encoding='utf-8') as f:
+            f.write(folded + '\n' if folded else '')
+        with open(f"{base}.svg", 'w', encoding='utf-8') as f:
+            f.write(render_flamegraph(profile.stacks, f"{profile.workflow} {profile.request_id}"))
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump(profile.summary(self.interval_seconds), f, indent=2)
+        logger.info(f"Saved request profile {profile.profile_id} ({profile.samples} samples)")
+        self._prune()
+
+    def _prune(self) -> None:
+        profiles = self.list_profiles()
+        for stale in profiles[self.max_profiles:]:
+            for fmt in PROFILE_FORMATS:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.directory, f"{stale['profile_id']}.{fmt}"))
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Saved profiles, newest first, without their span lists"""
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop('spans', None)
+            profiles.append(summary)
+        return sorted(profiles, key=lambda summary: summary.get('started_at', ''), reverse=True)
+
+    def profile_path(self, profile_id: str, fmt: str) -> Optional[str]:
+        if fmt not in PROFILE_FORMATS or not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{fmt}")
+        return path if os.path.isfile(path) else None
+
+
+def render_flamegraph(stacks: Counter, title: str, width: int = 1200, row_height: int = 16) -> str:
+    """Minimal standalone flamegraph SVG (root at the bottom, hover for frame and samples)"""
+    root: Dict[str, Any] = {'count': 0, 'children': {}}
+    for stack, count in stacks.items():
+        node = root
+        node['count'] += count
+        for frame in stack.split(';'):
+            node = node['children'].setdefault(frame, {'count': 0, 'children': {}})
+            node['count'] += count
+
+    rects = []
+
+    def layout(node: Dict[str, Any], depth: int, x: float) -> int:
+        deepest = depth
+        for frame, child in sorted(node['children'].items()):
+            child_width = child['count'] / root['count'] * width
+            if child_width >= 0.5:
+                rects.append((frame, child['count'], x, depth, child_width))
+                deepest = max(deepest, layout(child, depth + 1, x))
+            x += child_width
+        return deepest
+
+    depth = layout(root, 0, 0.0) if root['count'] else 0
+    height = (depth + 1) * row_height + 40
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="16">{html.escape(title)} ({root["count"]} samples)</text>'
+    ]
+    for frame, count, x, level, rect_width in rects:
+        y = height - (level + 1) * row_height
+        hue = zlib.crc32(frame.split(' (')[0].encode('utf-8')) % 60
+        label = html.escape(frame)
+        percent = count / root['count'] * 100
+        text = label[:int(rect_width / 7)] if rect_width > 21 else ''
+        parts.append(
+            f'<g><title>{label} ({count} samples, {percent:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{rect_width:.1f}" height="{row_height - 1}" '
+            f'fill="hsl({hue},90%,60%)"/><text x="{x + 2:.1f}" y="{y + 11}">{text}</text></g>'
+        )
+    parts.append('</svg>')
+    return '\n'.join(parts)
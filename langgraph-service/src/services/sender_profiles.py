@@ -0,0 +1,196 @@
+"""
+Sender Profiles
+Per-sender context kept up to date as emails are stored: recent messages, order, serial
+and device identifiers, last interaction time and a running centroid embedding. Personal
+context for a reply is then one key lookup instead of a similarity scan.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from src.services.privacy_scrubber import extract_identifiers
+
+IDENTIFIER_KINDS = ('order', 'serial', 'bill', 'device')
+DEFAULT_DEVICE_PATTERN = r'\bNexus(?:Book|Tab|Pad)\b(?:\s+(?:Pro|Air|Studio|Mini|\d{1,2}(?:\.\d)?)\b)*'
+
+
+def sender_key(sender_info: str) -> str:
+    return (sender_info or '').strip().lower()
+
+
+class SenderProfileStore:
+    """Sender profiles per scope (tenant) in SQLite, updated incrementally on each stored email"""
+
+    def __init__(self, db_path: str, recent_messages: int = 5, excerpt_chars: int = 600,
+                 max_identifiers: int = 20, device_pattern: str = DEFAULT_DEVICE_PATTERN):
+        self.recent_messages = recent_messages
+        self.excerpt_chars = excerpt_chars
+        self.max_identifiers = max_identifiers
+        self.device_pattern = re.compile(device_pattern, re.IGNORECASE) if device_pattern else None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sender_profiles (
+                scope TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                profile TEXT NOT NULL,
+                centroid BLOB,
+                centroid_version INTEGER,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (scope, sender)
+            ) WITHOUT ROWID
+        """)
+        # Emails already folded into a profile, so the backfill and live writes never count one twice
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sender_profile_emails (
+                scope TEXT NOT NULL,
+                email_id TEXT NOT NULL,
+                PRIMARY KEY (scope, email_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sender_profile_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._backfilled = False
+
+    def identifiers(self, text: str) -> Dict[str, List[str]]:
+        found = extract_identifiers(text, IDENTIFIER_KINDS[:-1])
+        devices = []
+        if self.device_pattern is not None:
+            for match in self.device_pattern.finditer(text or ''):
+                device = ' '.join(match.group(0).split())
+                if device.lower() not in (seen.lower() for seen in devices):
+                    devices.append(device)
+        found['device'] = devices
+        return found
+
+    def record(self, scope: str, sender_info: str, email_id: str, content: str, timestamp: float,
+               date_time: str = '', subject: str = '', vector: Optional[np.ndarray] = None,
+               version: int = 0) -> bool:
+        """Fold one newly stored email into its sender's profile; False if it was already recorded"""
+        sender = sender_key(sender_info)
+        found = self.identifiers(content)
+        message = {
+            'id': email_id,
+            'timestamp': timestamp,
+            'date_time': date_time,
+            'subject': subject,
+            'excerpt': ' '.join(content.split())[:self.excerpt_chars]
+        }
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._conn.execute(
+                    "INSERT OR IGNORE INTO sender_profile_emails (scope, email_id) VALUES (?, ?)", (scope, email_id)
+                ).rowcount:
+                    self._conn.execute("COMMIT")
+                    return False
+                row = self._conn.execute(
+                    "SELECT profile, centroid, centroid_version FROM sender_profiles WHERE scope = ? AND sender = ?",
+                    (scope, sender)
+                ).fetchone()
+                profile = json.loads(row[0]) if row else {
+                    'sender': sender, 'message_count': 0, 'last_timestamp': 0.0, 'last_date_time': '',
+                    'recent': [], 'identifiers': {kind: [] for kind in IDENTIFIER_KINDS}, 'centroid_count': 0
+                }
+
+                profile['message_count'] += 1
+                if timestamp >= profile['last_timestamp']:
+                    profile['last_timestamp'] = timestamp
+                    profile['last_date_time'] = date_time
+                # Newest first; a late-synced older email only enters if it is among the newest
+                recent = [entry for entry in profile['recent'] if entry['id'] != email_id] + [message]
+                profile['recent'] = sorted(recent, key=lambda entry: entry['timestamp'], reverse=True)[:self.recent_messages]
+                for kind, values in found.items():
+                    known = [value for value in profile['identifiers'].get(kind, []) if value not in values]
+                    profile['identifiers'][kind] = (values + known)[:self.max_identifiers]
+
+                centroid = np.frombuffer(row[1], dtype=np.float32) if row and row[1] is not None else None
+                if vector is not None:
+                    vector = np.asarray(vector, dtype=np.float32).ravel()
+                    # A new embedding version (or dimension) starts the centroid over
+                    if centroid is None or row[2] != version or centroid.shape != vector.shape:
+                        centroid, profile['centroid_count'] = vector, 1
+                    else:
+                        count = profile['centroid_count']
+                        centroid = (centroid * count + vector) / (count + 1)
+                        profile['centroid_count'] = count + 1
+                else:
+                    version = row[2] if row else None
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sender_profiles (scope, sender, profile, centroid, centroid_version, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (scope, sender, json.dumps(profile),
+                     None if centroid is None else centroid.astype(np.float32).tobytes(), version, time.time())
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def reset_scope(self, scope: str) -> None:
+        """Drop a scope's profiles so the backfill can rebuild them from stored emails"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM sender_profiles WHERE scope = ?", (scope,))
+                self._conn.execute("DELETE FROM sender_profile_emails WHERE scope = ?", (scope,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def is_backfilled(self) -> bool:
+        """Whether profiles also cover the emails stored before they were introduced"""
+        if not self._backfilled:
+            with self._lock:
+                row = self._conn.execute("SELECT 1 FROM sender_profile_meta WHERE key = 'backfilled_at'").fetchone()
+            self._backfilled = row is not None
+        return self._backfilled
+
+    def mark_backfilled(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sender_profile_meta (key, value) VALUES ('backfilled_at', ?)", (str(time.time()),)
+            )
+        self._backfilled = True
+
+    def get(self, scope: str, sender_info: str, include_centroid: bool = False) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT profile, centroid, centroid_version FROM sender_profiles WHERE scope = ? AND sender = ?",
+                (scope, sender_key(sender_info))
+            ).fetchone()
+        if not row:
+            return None
+        profile = json.loads(row[0])
+        profile['centroid_version'] = row[2]
+        if include_centroid and row[1] is not None:
+            profile['centroid'] = np.frombuffer(row[1], dtype=np.float32).copy()
+        return profile
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sender_profiles").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def profile_summary(profile: Dict[str, Any]) -> str:
+    """One-paragraph prompt text for a sender's identifiers and history"""
+    labels = {'order': 'Orders', 'serial': 'Serial numbers', 'bill': 'Invoices', 'device': 'Devices'}
+    parts = [f"{labels[kind]}: {', '.join(values)}" for kind, values in profile['identifiers'].items() if values]
+    parts.append(f"{profile['message_count']} previous emails, last on {profile['last_date_time'] or 'unknown date'}")
+    return '. '.join(parts) + '.'
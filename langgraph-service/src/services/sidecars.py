@@ -0,0 +1,84 @@
+"""
+Sidecars
+Multi-worker deployment helpers: start the shared embedding and Chroma servers that
+API workers call, and elect one worker to run background jobs.
+"""
+
+import fcntl
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from src.services.embedding_server import wait_for_server
+
+logger = logging.getLogger(__name__)
+
+
+def acquire_leader_lock(path: str):
+    """Non-blocking exclusive lock held for the life of the process; None if another worker holds it
+
+    The leader runs the singleton background jobs (sync, ingestion consumers, compaction,
+    migration backfill); the lock is released by the OS when the process exits.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handle = open(path, 'a+')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
+
+def wait_for_chroma(host: str, port: int, timeout: float = 60) -> None:
+    import chromadb
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            chromadb.HttpClient(host=host, port=port).heartbeat()
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Chroma server at {host}:{port} did not start within {timeout}s")
+            time.sleep(0.5)
+
+
+def start_sidecars(embedding_socket: Optional[str], chroma_host: Optional[str], chroma_port: int,
+                   chroma_path: str) -> List[subprocess.Popen]:
+    """Launch the embedding server and Chroma server and wait until both accept requests"""
+    processes = []
+    try:
+        if chroma_host:
+            processes.append(subprocess.Popen([
+                "chroma", "run", "--path", chroma_path, "--host", chroma_host, "--port", str(chroma_port)
+            ]))
+            wait_for_chroma(chroma_host, chroma_port)
+            logger.info(f"Chroma server running on {chroma_host}:{chroma_port} (pid {processes[-1].pid})")
+        if embedding_socket:
+            processes.append(subprocess.Popen([
+                sys.executable, "-m", "src.services.embedding_server", "--socket", embedding_socket
+            ]))
+            wait_for_server(embedding_socket)
+            logger.info(f"Embedding server running on {embedding_socket} (pid {processes[-1].pid})")
+    except Exception:
+        stop_sidecars(processes)
+        raise
+    return processes
+
+
+def stop_sidecars(processes: List[subprocess.Popen], timeout: float = 10) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,123 @@
+"""
+Email Sync Scheduler
+Runs email fetch + vectorization in the background on an interval, one run at a time
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EmailSyncScheduler:
+    """Periodic, single-flight background sync for SimpleEmailFetcher"""
+
+    def __init__(self, email_fetcher, interval_seconds: float = 300, max_job_history: int = 50):
+        self.email_fetcher = email_fetcher
+        self.interval_seconds = interval_seconds
+        self.max_job_history = max_job_history
+
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.current_job_id: Optional[str] = None
+        self.last_job_id: Optional[str] = None
+        self.total_runs = 0
+        self.total_failures = 0
+        self.total_emails_vectorized = 0
+
+        self._current_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the periodic loop (no-op when the interval is 0)"""
+        if self.interval_seconds <= 0 or self._loop_task is not None:
+            return
+        self._loop_task = asyncio.create_task(self._periodic_loop())
+        logger.info(f"Email sync scheduler started (every {self.interval_seconds}s)")
+
+    async def stop(self) -> None:
+        """Cancel the periodic loop and wait for any in-flight run"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        if self._current_task is not None and not self._current_task.done():
+            await asyncio.gather(self._current_task, return_exceptions=True)
+
+    def trigger(self, reason: str = "manual") -> Dict[str, Any]:
+        """Start a sync run, or join the one already in progress
+
+        Returns the job record; 'coalesced' is True when an existing run was reused.
+        """
+        if self.current_job_id is not None:
+            logger.info(f"Sync already running, coalescing {reason} trigger into {self.current_job_id}")
+            return {**self.jobs[self.current_job_id], 'coalesced': True}
+
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = {
+            'job_id': job_id,
+            'status': 'running',
+            'reason': reason,
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'duration_seconds': None,
+            'result': None
+        }
+        while len(self.jobs) > self.max_job_history:
+            self.jobs.popitem(last=False)
+
+        self.current_job_id = job_id
+        self._current_task = asyncio.create_task(self._run_job(job_id))
+        return {**self.jobs[job_id], 'coalesced': False}
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def status(self) -> Dict[str, Any]:
+        """Scheduler state and last-run metrics"""
+        return {
+            'running': self.current_job_id is not None,
+            'current_job_id': self.current_job_id,
+            'interval_seconds': self.interval_seconds,
+            'periodic_enabled': self._loop_task is not None,
+            'last_run': self.jobs.get(self.last_job_id) if self.last_job_id else None,
+            'total_runs': self.total_runs,
+            'total_failures': self.total_failures,
+            'total_emails_vectorized': self.total_emails_vectorized
+        }
+
+    async def _run_job(self, job_id: str) -> None:
+        job = self.jobs[job_id]
+        start_time = time.perf_counter()
+        try:
+            result = await self.email_fetcher.fetch_and_vectorize_emails()
+        except Exception as e:
+            logger.error(f"Sync job {job_id} failed: {str(e)}")
+            result = {'success': False, 'error': str(e), 'emails_fetched': 0, 'emails_vectorized': 0}
+
+        job['result'] = result
+        if result.get('success'):
+            job['status'] = 'completed'
+        else:
+            # Some pages failed but the rest were processed
+            job['status'] = 'partial' if result.get('pages_failed') and result.get('emails_fetched') else 'failed'
+        job['finished_at'] = datetime.now().isoformat()
+        job['duration_seconds'] = time.perf_counter() - start_time
+
+        self.total_runs += 1
+        if not result.get('success'):
+            self.total_failures += 1
+        self.total_emails_vectorized += result.get('emails_vectorized', 0)
+        self.last_job_id = job_id
+        self.current_job_id = None
+        logger.info(f"Sync job {job_id} {job['status']} in {job['duration_seconds']:.2f}s")
+
+    async def _periodic_loop(self) -> None:
+        while True:
+            self.trigger(reason="scheduled")
+            if self._current_task is not None:
+                await asyncio.gather(self._current_task, return_exceptions=True)
+            await asyncio.sleep(self.interval_seconds)
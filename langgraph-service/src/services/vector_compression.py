@@ -0,0 +1,175 @@
+"""
+Vector Compression
+Compact email index vectors (Matryoshka-style truncation or PCA projection) with a
+full-precision copy kept on disk, outside the in-memory index, for shortlist rescoring.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Optional, Iterator, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_METHODS = ('none', 'truncate', 'pca')
+RESCORE_DTYPES = ('float32', 'float16', 'int8')
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorCompressor:
+    """Maps full embeddings to the reduced vectors stored in the email index
+
+    'truncate' keeps the leading dims (Matryoshka-trained models put most signal there);
+    'pca' projects onto components fitted from stored vectors, falling back to truncation
+    until a projection has been fitted. Outputs are L2-normalized.
+    """
+
+    def __init__(self, method: str = 'none', dims: int = 256, projection_path: Optional[str] = None):
+        if method not in COMPRESSION_METHODS:
+            raise ValueError(f"Unknown compression method {method!r}, expected one of {COMPRESSION_METHODS}")
+        self.method = method
+        self.dims = dims
+        self.projection_path = projection_path
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        if method == 'pca' and projection_path and os.path.exists(projection_path):
+            with np.load(projection_path) as projection:
+                self.mean = projection['mean']
+                self.components = projection['components']
+
+    @classmethod
+    def from_layout(cls, layout: str, projection_path: Optional[str] = None) -> "VectorCompressor":
+        """Build from a layout string such as 'none', 'truncate:256' or 'pca:256'"""
+        method, _, dims = layout.partition(':')
+        return cls(method, int(dims) if dims else 0, projection_path)
+
+    @property
+    def layout(self) -> str:
+        return 'none' if self.method == 'none' else f"{self.method}:{self.dims}"
+
+    @property
+    def enabled(self) -> bool:
+        return self.method != 'none'
+
+    @property
+    def fitted(self) -> bool:
+        return self.components is not None
+
+    def compress(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if not self.enabled or vectors.shape[1] <= self.dims:
+            return vectors
+        if self.method == 'pca' and self.fitted:
+            return _normalize((vectors - self.mean) @ self.components.T)
+        return _normalize(vectors[:, :self.dims])
+
+    def fit(self, vectors: np.ndarray) -> Dict[str, float]:
+        """Fit PCA components on a sample of full vectors and save them"""
+        if self.method != 'pca':
+            raise ValueError("Only the 'pca' method is fitted")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < self.dims:
+            raise ValueError(f"Need at least {self.dims} vectors to fit {self.dims} components, got {len(vectors)}")
+        mean = vectors.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        self.mean, self.components = mean, vt[:self.dims].astype(np.float32)
+        variance = singular_values ** 2
+        explained = float(variance[:self.dims].sum() / variance.sum()) if variance.sum() else 1.0
+        if self.projection_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.projection_path)), exist_ok=True)
+            with open(f"{self.projection_path}.tmp", 'wb') as f:
+                np.savez(f, mean=self.mean, components=self.components)
+            os.replace(f"{self.projection_path}.tmp", self.projection_path)
+        return {'explained_variance': explained, 'sample_size': len(vectors)}
+
+
+class RescoreVectorStore:
+    """Full-precision email vectors in SQLite, read only for search shortlists"""
+
+    def __init__(self, db_path: str, dtype: str = 'float16'):
+        if dtype not in RESCORE_DTYPES:
+            raise ValueError(f"Unknown rescore dtype {dtype!r}, expected one of {RESCORE_DTYPES}")
+        self.db_path = db_path
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rescore_vectors (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (namespace, id)
+            ) WITHOUT ROWID
+        """)
+
+    def _encode(self, vector: np.ndarray) -> bytes:
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.dtype == 'int8':
+            # Symmetric per-vector scale, stored as a float32 prefix
+            scale = float(np.abs(vector).max()) / 127 or 1.0
+            return np.float32(scale).tobytes() + np.round(vector / scale).astype(np.int8).tobytes()
+        return vector.astype(self.dtype).tobytes()
+
+    def _decode(self, blob: bytes) -> np.ndarray:
+        if self.dtype == 'int8':
+            scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+            return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+        return np.frombuffer(blob, dtype=self.dtype).astype(np.float32)
+
+    def put_many(self, namespace: str, ids: List[str], vectors: np.ndarray) -> None:
+        rows = [(namespace, vector_id, self._encode(vector)) for vector_id, vector in zip(ids, vectors)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rescore_vectors (namespace, id, vector) VALUES (?, ?, ?)", rows
+            )
+
+    def get_many(self, namespace: str, ids: List[str]) -> Dict[str, np.ndarray]:
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, vector FROM rescore_vectors WHERE namespace = ? AND id IN ({placeholders})",
+                [namespace, *ids]
+            ).fetchall()
+        return {vector_id: self._decode(blob) for vector_id, blob in rows}
+
+    def iter_vectors(self, namespace: str, batch_size: int = 1000,
+                     limit: Optional[int] = None) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """(ids, vectors) batches in id order"""
+        last_id, seen = '', 0
+        while limit is None or seen < limit:
+            size = batch_size if limit is None else min(batch_size, limit - seen)
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, vector FROM rescore_vectors WHERE namespace = ? AND id > ? ORDER BY id LIMIT ?",
+                    (namespace, last_id, size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id, seen = rows[-1][0], seen + len(rows)
+            yield [row[0] for row in rows], np.stack([self._decode(row[1]) for row in rows])
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM rescore_vectors WHERE namespace = ?", (namespace,)
+            ).fetchone()[0]
+
+    def drop_namespace(self, namespace: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM rescore_vectors WHERE namespace = ?", (namespace,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,310 @@
+"""
+Vector Snapshot
+Export a tenant's Chroma collections to one columnar NumPy file and bulk-load them
+back without re-embedding. Snapshots are versioned by embedding model.
+
+Usage (from langgraph-service/, configured through the same environment as the service):
+    python -m src.services.vector_snapshot export [--tenant-id T] [--path FILE]
+    python -m src.services.vector_snapshot import [--tenant-id T] [--path FILE] [--merge]
+    python -m src.services.vector_snapshot list
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+COLLECTION_KEYS = ('docs', 'emails', 'threads', 'emails_cold')
+DEFAULT_BATCH_SIZE = 5000
+# Snapshot file names: the default namespace's, and the prefix of tenant ones (followed by the tenant suffix)
+DEFAULT_SNAPSHOT_NAME = 'default'
+TENANT_SNAPSHOT_PREFIX = 'tenant__'
+
+
+class SnapshotError(Exception):
+    """Raised for unreadable snapshots or snapshots built with a different embedding model"""
+
+
+def model_slug(embedding_model: str) -> str:
+    """Directory-safe form of an embedding model name (BAAI/bge-large-en-v1.5 -> BAAI--bge-large-en-v1.5)"""
+    return re.sub(r'[^A-Za-z0-9._-]', '-', embedding_model.replace('/', '--'))
+
+
+def snapshot_path(snapshot_dir: str, embedding_model: str, tenant_id: Optional[str] = None) -> str:
+    """Default location of a tenant's snapshot: <dir>/<model>/tenant__<tenant suffix>.npz
+
+    The tenant's collection suffix is injective, so distinct tenants never share a file.
+    The default namespace uses <dir>/<model>/default.npz.
+    """
+    from src.services.document_processor import tenant_suffix
+
+    name = f"{TENANT_SNAPSHOT_PREFIX}{tenant_suffix(tenant_id)}" if tenant_id else DEFAULT_SNAPSHOT_NAME
+    return os.path.join(snapshot_dir, model_slug(embedding_model), f"{name}.npz")
+
+
+def list_snapshots(snapshot_dir: str) -> List[Dict[str, Any]]:
+    """Manifests of every snapshot under snapshot_dir, across embedding models"""
+    snapshots = []
+    if not os.path.isdir(snapshot_dir):
+        return snapshots
+    for model_dir in sorted(os.listdir(snapshot_dir)):
+        model_path = os.path.join(snapshot_dir, model_dir)
+        if not os.path.isdir(model_path):
+            continue
+        for filename in sorted(os.listdir(model_path)):
+            if filename.endswith('.npz'):
+                path = os.path.join(model_path, filename)
+                try:
+                    snapshots.append({'path': path, 'size_bytes': os.path.getsize(path), **read_manifest(path)})
+                except SnapshotError as e:
+                    logger.warning(f"Skipping unreadable snapshot {path}: {e}")
+    return snapshots
+
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate strings into one UTF-8 byte column plus end offsets"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    starts = np.concatenate(([0], offsets[:-1])) if len(offsets) else offsets
+    return [raw[start:end].decode('utf-8') for start, end in zip(starts.tolist(), offsets.tolist())]
+
+
+def _read_collection(collection, page_size: int) -> Dict[str, Any]:
+    """All records of a collection, paged so large collections are not fetched in one call"""
+    ids, embeddings, documents, metadatas = [], [], [], []
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        page = collection.get(
+            limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"]
+        )
+        ids.extend(page['ids'])
+        embeddings.extend(page['embeddings'])
+        documents.extend(document or '' for document in page['documents'])
+        metadatas.extend(metadata or {} for metadata in page['metadatas'])
+    return {'ids': ids, 'embeddings': embeddings, 'documents': documents, 'metadatas': metadatas}
+
+
+def export_snapshot(collections, path: str, embedding_model: str,
+                    page_size: int = DEFAULT_BATCH_SIZE, email_index: str = 'none',
+                    rescore_store=None) -> Dict[str, Any]:
+    """Write every collection of a TenantCollections to path and return the manifest
+
+    With a compressed email index the full-precision rescoring vectors are included.
+    """
+    start_time = time.perf_counter()
+    arrays: Dict[str, np.ndarray] = {}
+    counts = {}
+    dimension = None
+
+    for key in COLLECTION_KEYS:
+        records = _read_collection(getattr(collections, key), page_size)
+        counts[key] = len(records['ids'])
+        vectors = np.asarray(records['embeddings'], dtype=np.float32)
+        if counts[key]:
+            dimension = dimension or int(vectors.shape[1])
+        else:
+            vectors = vectors.reshape(0, dimension or 0)
+        arrays[f'{key}_embeddings'] = vectors
+        arrays[f'{key}_ids'], arrays[f'{key}_ids_offsets'] = _pack_strings(records['ids'])
+        arrays[f'{key}_documents'], arrays[f'{key}_documents_offsets'] = _pack_strings(records['documents'])
+        arrays[f'{key}_metadatas'], arrays[f'{key}_metadatas_offsets'] = _pack_strings(
+            [json.dumps(metadata, separators=(',', ':')) for metadata in records['metadatas']]
+        )
+        if email_index != 'none' and rescore_store is not None and key in ('emails', 'emails_cold'):
+            full_vectors = rescore_store.get_many(collections.emails.name, records['ids'])
+            arrays[f'{key}_full_ids'], arrays[f'{key}_full_ids_offsets'] = _pack_strings(list(full_vectors))
+            arrays[f'{key}_full_embeddings'] = np.asarray(list(full_vectors.values()), dtype=np.float32)
+
+    manifest = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'embedding_model': embedding_model,
+        'embedding_dimension': dimension,
+        'email_index': email_index,
+        'tenant_id': collections.tenant_id,
+        'counts': counts,
+        'created_at': datetime.now().isoformat()
+    }
+    arrays['manifest'] = np.frombuffer(json.dumps(manifest).encode('utf-8'), dtype=np.uint8)
+
+    # Write beside the target and rename so readers never see a partial file
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+    manifest['export_seconds'] = time.perf_counter() - start_time
+    logger.info(f"Exported snapshot {path}: {counts} in {manifest['export_seconds']:.2f}s")
+    return manifest
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with np.load(path) as snapshot:
+            return json.loads(snapshot['manifest'].tobytes().decode('utf-8'))
+    except (OSError, KeyError, ValueError) as e:
+        raise SnapshotError(f"Cannot read snapshot {path}: {e}") from e
+
+
+def _bulk_upsert(collection, ids: List[str], embeddings: np.ndarray, documents: List[str],
+                 metadatas: List[Dict[str, Any]], batch_size: int) -> None:
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.upsert(
+            ids=ids[start:end],
+            embeddings=embeddings[start:end].tolist(),
+            documents=documents[start:end],
+            metadatas=[metadata or None for metadata in metadatas[start:end]]
+        )
+
+
+def _delete_missing(collection, keep_ids: List[str], page_size: int) -> int:
+    """Delete records that are not part of the snapshot"""
+    keep = set(keep_ids)
+    stale = []
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        stale.extend(i for i in collection.get(limit=page_size, offset=offset, include=[])['ids'] if i not in keep)
+    for start in range(0, len(stale), page_size):
+        collection.delete(ids=stale[start:start + page_size])
+    return len(stale)
+
+
+def restore_snapshot(collections, path: str, embedding_model: str, replace: bool = True,
+                     batch_size: int = DEFAULT_BATCH_SIZE, email_index: str = 'none',
+                     rescore_store=None) -> Dict[str, Any]:
+    """Bulk-load a snapshot into a TenantCollections without re-embedding
+
+    With replace, records absent from the snapshot are deleted so the collections
+    match it exactly; otherwise the snapshot is merged over existing data. A snapshot
+    only restores into the tenant it was exported from.
+    """
+    manifest = read_manifest(path)
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    if manifest.get('embedding_model') != embedding_model:
+        raise SnapshotError(
+            f"Snapshot was built with {manifest.get('embedding_model')}, service uses {embedding_model}"
+        )
+    if (manifest.get('tenant_id') or None) != (collections.tenant_id or None):
+        raise SnapshotError(
+            f"Snapshot belongs to tenant {manifest.get('tenant_id') or 'default'}, "
+            f"not {collections.tenant_id or 'default'}"
+        )
+    if manifest.get('email_index', 'none') != email_index:
+        raise SnapshotError(
+            f"Snapshot has a {manifest.get('email_index', 'none')} email index, service uses {email_index}"
+        )
+
+    start_time = time.perf_counter()
+    restored, deleted = {}, {}
+    with np.load(path) as snapshot:
+        for key in COLLECTION_KEYS:
+            collection = getattr(collections, key)
+            ids = _unpack_strings(snapshot[f'{key}_ids'], snapshot[f'{key}_ids_offsets'])
+            if replace:
+                deleted[key] = _delete_missing(collection, ids, batch_size)
+            if ids:
+                _bulk_upsert(
+                    collection, ids, snapshot[f'{key}_embeddings'],
+                    _unpack_strings(snapshot[f'{key}_documents'], snapshot[f'{key}_documents_offsets']),
+                    [json.loads(m) for m in _unpack_strings(snapshot[f'{key}_metadatas'], snapshot[f'{key}_metadatas_offsets'])],
+                    batch_size
+                )
+            if rescore_store is not None and f'{key}_full_embeddings' in snapshot.files:
+                rescore_store.put_many(
+                    collections.emails.name,
+                    _unpack_strings(snapshot[f'{key}_full_ids'], snapshot[f'{key}_full_ids_offsets']),
+                    snapshot[f'{key}_full_embeddings']
+                )
+            restored[key] = len(ids)
+
+    result = {
+        'success': True,
+        'path': path,
+        'embedding_model': embedding_model,
+        'snapshot_created_at': manifest.get('created_at'),
+        'restored': restored,
+        'deleted': deleted,
+        'restore_seconds': time.perf_counter() - start_time
+    }
+    logger.info(f"Restored snapshot {path}: {restored} in {result['restore_seconds']:.2f}s")
+    return result
+
+
+def _main(argv=None) -> int:
+    import argparse
+    import chromadb
+    import config
+
+    parser = argparse.ArgumentParser(description="Export or restore the vector store without re-embedding")
+    parser.add_argument("command", choices=["export", "import", "list"])
+    parser.add_argument("--tenant-id", default=None)
+    parser.add_argument("--path", default=None, help="Snapshot file (defaults to SNAPSHOT_DIR/<model>/default.npz or tenant__<tenant suffix>.npz)")
+    parser.add_argument("--merge", action="store_true", help="Import without deleting records missing from the snapshot")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.command == "list":
+        print(json.dumps(list_snapshots(config.SNAPSHOT_DIR), indent=2))
+        return 0
+
+    # Collections are opened directly so no embedding model has to load
+    from src.services.document_processor import TenantCollections, DocumentProcessor, TENANT_SEPARATOR
+    from src.services.embedding_migration import versioned_collection_name
+
+    # The registry, when present, names the model and collection version serving reads
+    embedding_model, version, email_index = config.EMBEDDING_MODEL, 0, 'none'
+    if os.path.exists(config.EMBEDDING_REGISTRY_PATH):
+        with open(config.EMBEDDING_REGISTRY_PATH, encoding='utf-8') as f:
+            active = json.load(f)['active']
+        embedding_model, version = active['model'], active['version']
+        email_index = active.get('email_index', 'none')
+    rescore_store = None
+    if email_index != 'none':
+        from src.services.vector_compression import RescoreVectorStore
+        rescore_store = RescoreVectorStore(
+            os.path.join(config.CHROMA_PERSIST_DIR, "email_rescore_vectors.db"), config.EMAIL_RESCORE_DTYPE
+        )
+
+    names = {
+        'docs_name': versioned_collection_name(config.DOCS_COLLECTION, version),
+        'emails_name': versioned_collection_name(config.EMAIL_COLLECTION, version),
+        'threads_name': versioned_collection_name(config.THREADS_COLLECTION, version),
+        'emails_cold_name': versioned_collection_name(config.EMAIL_COLD_COLLECTION, version)
+    }
+    if args.tenant_id:
+        suffix = DocumentProcessor._tenant_suffix(args.tenant_id)
+        names = {key: f"{name}{TENANT_SEPARATOR}{suffix}" for key, name in names.items()}
+    collections = TenantCollections(chromadb.PersistentClient(path=config.CHROMA_PERSIST_DIR), args.tenant_id, **names)
+    path = args.path or snapshot_path(config.SNAPSHOT_DIR, embedding_model, args.tenant_id)
+
+    try:
+        if args.command == "export":
+            result = export_snapshot(collections, path, embedding_model,
+                                     email_index=email_index, rescore_store=rescore_store)
+        else:
+            result = restore_snapshot(collections, path, embedding_model, replace=not args.merge,
+                                      email_index=email_index, rescore_store=rescore_store)
+    except SnapshotError as e:
+        print(f"Error: {e}")
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())